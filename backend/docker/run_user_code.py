@@ -1,45 +1,129 @@
 import json
+import os
+import select
+import signal
 import sys
+import time
+
+# Run as `python run_user_code.py` it reads data/input.json and writes
+# data/output.json once. Run as `python run_user_code.py --serve [--timeout N]`
+# it is a warm pool worker (see posts_app/sandbox.py): it prints {"ready": true},
+# then answers one JSON line on stdin with one JSON line on stdout, running
+# each job in a forked child that is killed after N seconds.
+
+DEFAULT_TIMEOUT = 10
+
+
+def run(data):
+    code = data["code"]
+    func_name = data["function_name"]
+    test_cases = data["test_cases"]
+
+    exec_env = {}
+    exec(code, exec_env)
+
+    if func_name not in exec_env:
+        raise Exception(f"Function `{func_name}` not defined.")
+
+    func = exec_env[func_name]
+
+    results = []
+    for idx, case in enumerate(test_cases):
+        try:
+            result = func(*case["input"])
+            if result != case["expected"]:
+                results.append({
+                    "status": "fail",
+                    "input": case["input"],
+                    "expected": case["expected"],
+                    "got": result
+                })
+            else:
+                results.append({"status": "pass"})
+        except Exception as e:
+            results.append({"status": "error", "message": str(e)})
+    return {"results": results}
+
 
 def main():
     try:
         with open("data/input.json") as f:
             data = json.load(f)
-        
-        code = data["code"]
-        func_name = data["function_name"]
-        test_cases = data["test_cases"]
-
-        exec_env = {}
-        exec(code, exec_env)
-
-        if func_name not in exec_env:
-            raise Exception(f"Function `{func_name}` not defined.")
-
-        func = exec_env[func_name]
-
-        results = []
-        for idx, case in enumerate(test_cases):
-            try:
-                result = func(*case["input"])
-                if result != case["expected"]:
-                    results.append({
-                        "status": "fail",
-                        "input": case["input"],
-                        "expected": case["expected"],
-                        "got": result
-                    })
-                else:
-                    results.append({"status": "pass"})
-            except Exception as e:
-                results.append({"status": "error", "message": str(e)})
-    
-        with open("data/output.json", "w") as f:
-            json.dump({"results": results}, f)
-
+        output = run(data)
     except Exception as e:
-        with open("data/output.json", "w") as f:
-            json.dump({"error": str(e)}, f)
+        output = {"error": str(e)}
+
+    with open("data/output.json", "w") as f:
+        json.dump(output, f)
+
+
+def run_isolated(job, timeout):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        # The job must not read later jobs off stdin or write into the replies.
+        devnull = os.open(os.devnull, os.O_RDWR)
+        os.dup2(devnull, 0)
+        os.dup2(devnull, 1)
+        try:
+            output = run(job)
+        except BaseException as e:
+            output = {"error": str(e)}
+        try:
+            payload = json.dumps(output)
+        except (TypeError, ValueError) as e:
+            payload = json.dumps({"error": f"Unserializable result: {e}"})
+        with os.fdopen(write_fd, "w") as pipe:
+            pipe.write(payload)
+        os._exit(0)
+
+    os.close(write_fd)
+    chunks = []
+    deadline = time.monotonic() + timeout
+    with os.fdopen(read_fd, "rb", buffering=0) as pipe:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([pipe], [], [], remaining)[0]:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                return {"error": "Code execution timed out", "timed_out": True}
+            chunk = pipe.read(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    os.waitpid(pid, 0)
+    try:
+        return json.loads(b"".join(chunks))
+    except ValueError:
+        return {"error": "Code execution was aborted"}
+
+
+def serve(timeout):
+    replies = sys.stdout
+    sys.stdout = sys.stderr
+
+    def reply(message):
+        replies.write(json.dumps(message) + "\n")
+        replies.flush()
+
+    reply({"ready": True})
+    for line in sys.stdin:
+        try:
+            job = json.loads(line)
+        except ValueError:
+            reply({"error": "Malformed job"})
+            continue
+        if job.get("ping"):
+            reply({"pong": True})
+        else:
+            reply(run_isolated(job, timeout))
+
 
 if __name__ == "__main__":
-    main()
+    if "--serve" in sys.argv:
+        args = sys.argv[1:]
+        timeout = float(args[args.index("--timeout") + 1]) if "--timeout" in args else DEFAULT_TIMEOUT
+        serve(timeout)
+    else:
+        main()
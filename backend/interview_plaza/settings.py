@@ -135,5 +135,70 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Cache used by posts_app.response_cache. Generation counters live here too,
+# so with several worker processes use a shared backend (file, memcached,
+# redis) rather than locmem, or workers will serve each other's stale pages.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+
+# Post views are buffered in-process and written out in batches
+# (posts_app.view_counter) by a background thread every this many seconds,
+# or sooner once this many are pending (without the thread, by the request
+# that finds a flush due).
+VIEW_COUNT_FLUSH_INTERVAL = 10
+VIEW_COUNT_FLUSH_THRESHOLD = 100
+VIEW_COUNT_FLUSH_THREAD = True
+
+# Following feed (posts_app.feed): authors with more followers than this are
+# merged in at read time instead of fanned out; a new follow backfills this
+# many recent posts.
+FEED_FANOUT_LIMIT = 5000
+FEED_BACKFILL_SIZE = 50
+
+# Follow suggestions (posts_app.suggestions): each process rebuilds its
+# follow-graph index, and per-user rankings expire, after this many seconds.
+SUGGESTION_INDEX_TTL = 900
+
+# Leaderboards (posts_app.leaderboards) are rebuilt per process once they are
+# this many seconds old.
+LEADERBOARD_TTL = 60
+
+# Code sandbox (posts_app.sandbox): each process keeps this many warm workers,
+# retiring one after SANDBOX_MAX_USES jobs (1 gives every job a fresh
+# container, at the cost of a cold start each time). LocalRunner runs them as
+# plain subprocesses with no isolation, for development only.
+SANDBOX_RUNNER = 'posts_app.sandbox.DockerRunner'
+SANDBOX_IMAGE = 'code-sandbox'
+SANDBOX_POOL_SIZE = 2
+SANDBOX_MAX_USES = 20
+SANDBOX_TIMEOUT = 10
+SANDBOX_HEALTH_INTERVAL = 30
+SANDBOX_ACQUIRE_TIMEOUT = 10
+
+# Code submissions (posts_app.submissions) are queued and run by
+# `manage.py process_submissions`, or, with SUBMISSION_DISPATCH_IN_PROCESS on,
+# by SUBMISSION_WORKERS threads in every process that loads the app. At most
+# SUBMISSION_CONCURRENCY run at once across processes and
+# SUBMISSION_USER_CONCURRENCY per submitter. Past the queue limits clients get
+# a 429 with Retry-After.
+SUBMISSION_DISPATCH_IN_PROCESS = False
+SUBMISSION_WORKERS = 2
+SUBMISSION_CONCURRENCY = 2
+SUBMISSION_USER_CONCURRENCY = 1
+SUBMISSION_QUEUE_LIMIT = 100
+SUBMISSION_USER_QUEUE_LIMIT = 5
+SUBMISSION_RETENTION = 24 * 60 * 60
+
+# Avatar uploads (posts_app.avatars) are rejected past this many bytes or
+# pixels; their thumbnails are made on this many background threads (0 makes
+# them on the request thread).
+AVATAR_MAX_BYTES = 10 * 1024 * 1024
+AVATAR_MAX_PIXELS = 50_000_000
+AVATAR_WORKERS = 2
+
 # Default PK
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
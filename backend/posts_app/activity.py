@@ -0,0 +1,176 @@
+"""
+Daily activity counts behind the profile contribution heatmap.
+
+Creating a post or logging a problem solve upserts the author's ActivityDay
+row for that day in the author's own timezone (UserProfile.timezone), so
+the heatmap is one range read over the (user, date) unique index. Deleting
+one takes it off again.
+
+The current and longest streaks are kept on the user's ProfileStats row.
+A new latest day extends or restarts the current streak in constant time;
+anything else (a day emptied, a day recorded out of order) recomputes both
+from the user's days. A current streak only counts while its last day is
+today or yesterday, which is decided when it is read.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import ActivityDay, Post, ProblemSolveLog, ProfileStats, UserProfile
+
+ACTIVITY_DAYS = 100
+STREAK_FIELDS = ('current_streak', 'longest_streak', 'streak_end')
+
+
+def get_zone(name):
+    """The ZoneInfo called ``name``, or the server's timezone if there is none."""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        return timezone.get_default_timezone()
+
+
+def is_valid_zone(name):
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        return False
+    return True
+
+
+def today_in(zone_name):
+    return timezone.localdate(timezone=get_zone(zone_name))
+
+
+def streaks_of(days):
+    """STREAK_FIELDS values for a user active on ``days`` (sorted dates)."""
+    current = longest = 0
+    previous = None
+    for day in days:
+        current = current + 1 if previous == day - timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = day
+    return {'current_streak': current, 'longest_streak': longest, 'streak_end': previous}
+
+
+def _days_of(user_id):
+    return ActivityDay.objects.filter(user_id=user_id).order_by('date').values_list('date', flat=True)
+
+
+def _days_changed(user_id, added=None, removed=False):
+    with transaction.atomic():
+        stats = ProfileStats.objects.select_for_update().filter(user_id=user_id).only(*STREAK_FIELDS).first()
+        if stats is None:
+            return  # built with its streaks on first read
+        if added is not None and (stats.streak_end is None or added > stats.streak_end):
+            current = stats.current_streak + 1 if stats.streak_end == added - timedelta(days=1) else 1
+            updates = {
+                'current_streak': current, 'longest_streak': max(stats.longest_streak, current), 'streak_end': added,
+            }
+        elif added is not None or removed:
+            updates = streaks_of(list(_days_of(user_id)))
+        else:
+            updates = {}
+        # The heatmap changed either way, and the profile ETag keys on version.
+        ProfileStats.objects.filter(user_id=user_id).update(**updates, version=F('version') + 1)
+
+
+def record(user_id, moment, change):
+    """Add ``change`` to the count of the user's local day of ``moment``."""
+    zone_name = UserProfile.objects.filter(user_id=user_id).values_list('timezone', flat=True).first()
+    day = timezone.localtime(moment, get_zone(zone_name)).date()
+    with transaction.atomic():
+        days = ActivityDay.objects.filter(user_id=user_id, date=day)
+        if change > 0:
+            _, created = ActivityDay.objects.get_or_create(user_id=user_id, date=day, defaults={'count': change})
+            if not created:
+                days.update(count=F('count') + change)
+            _days_changed(user_id, added=day if created else None)
+        else:
+            removed = days.filter(count__lte=-change).delete()[0]
+            if not removed:
+                days.update(count=F('count') + change)
+            _days_changed(user_id, removed=bool(removed))
+
+
+def heatmap(user_id, zone_name, days=ACTIVITY_DAYS):
+    """[{'date', 'count'}] for the last ``days`` days of the user's timezone, oldest first."""
+    today = today_in(zone_name)
+    start = today - timedelta(days=days - 1)
+    counts = dict(
+        ActivityDay.objects.filter(user_id=user_id, date__range=(start, today)).values_list('date', 'count')
+    )
+    return [
+        {'date': day.isoformat(), 'count': counts.get(day, 0)}
+        for day in (start + timedelta(days=offset) for offset in range(days))
+    ]
+
+
+def streaks(stats, zone_name):
+    """{'current', 'longest'} from a ProfileStats row."""
+    yesterday = today_in(zone_name) - timedelta(days=1)
+    live = stats.streak_end is not None and stats.streak_end >= yesterday
+    return {'current': stats.current_streak if live else 0, 'longest': stats.longest_streak}
+
+
+def rebuild(user_ids):
+    """Recompute the ActivityDay rows and streaks of ``user_ids`` from their posts and solves."""
+    user_ids = list(user_ids)
+    zones = defaultdict(list)
+    for user_id, zone_name in UserProfile.objects.filter(user_id__in=user_ids).values_list('user_id', 'timezone'):
+        zones[zone_name].append(user_id)
+    counts = Counter()
+    for zone_name, ids in zones.items():
+        for model, field in ((Post, 'created_at'), (ProblemSolveLog, 'solved_at')):
+            days = (
+                model.objects.filter(user__in=ids).order_by()
+                .annotate(day=TruncDate(field, tzinfo=get_zone(zone_name)))
+                .values_list('user', 'day').annotate(Count('pk'))
+            )
+            for user_id, day, total in days:
+                counts[user_id, day] += total
+
+    active = defaultdict(list)
+    for user_id, day in sorted(counts):
+        active[user_id].append(day)
+    with transaction.atomic():
+        ActivityDay.objects.filter(user__in=user_ids).delete()
+        ActivityDay.objects.bulk_create(
+            [ActivityDay(user_id=user_id, date=day, count=count) for (user_id, day), count in counts.items()],
+            batch_size=1000,
+        )
+        rows = list(ProfileStats.objects.filter(user__in=user_ids).only(*STREAK_FIELDS, 'version'))
+        for row in rows:
+            for field, value in streaks_of(active[row.user_id]).items():
+                setattr(row, field, value)
+            row.version += 1
+        ProfileStats.objects.bulk_update(rows, [*STREAK_FIELDS, 'version'])
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record(instance.user_id, instance.created_at, 1)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    record(instance.user_id, instance.created_at, -1)
+
+
+@receiver(post_save, sender=ProblemSolveLog)
+def solve_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record(instance.user_id, instance.solved_at, 1)
+
+
+@receiver(post_delete, sender=ProblemSolveLog)
+def solve_deleted(sender, instance, **kwargs):
+    record(instance.user_id, instance.solved_at, -1)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class PostsAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts_app'
+
+    def ready(self):
+        # Signal receivers that keep derived tables in sync.
+        from . import activity, facets, feed, profile_stats, response_cache, search, suggestions, trending  # noqa: F401
+        from . import submissions
+
+        # Only with SUBMISSION_DISPATCH_IN_PROCESS on; see posts_app.submissions.
+        submissions.start_on_boot()
@@ -0,0 +1,153 @@
+"""
+A user's personal data archive, streamed as a zip while it is written.
+
+Each section is an NDJSON file fed from a chunked ``.values().iterator()``
+query, and zipfile writes to a sink that is drained after every chunk, so
+neither the rows nor the archive are ever held in memory as a whole.
+
+Entries are stamped with the archive's Last-Modified time, and every list
+in them is explicitly ordered, so the bytes are the same on every request
+while the data is unchanged (the ETag from conditional.archive_validators).
+That is what makes ``Range`` resumption possible: the archive is
+regenerated and the bytes before the requested offset are skipped. A
+ranged response needs the total length up front, so it costs one extra
+pass that only counts bytes.
+"""
+import re
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date
+
+from .bulk_io import POST_FIELDS, ROUND_FIELDS, dumps
+from .models import Comment, Like, Post, ProblemSolveLog
+
+CHUNK_SIZE = 1000
+FLUSH_BYTES = 64 * 1024
+
+SECTIONS = {
+    'posts.ndjson': (
+        Post, [field for field in POST_FIELDS if field != 'user__username']
+        + [f'interview_details__{field}' for field in ROUND_FIELDS],
+    ),
+    'comments.ndjson': (Comment, ['id', 'post_id', 'parent_comment_id', 'content', 'created_at']),
+    'likes.ndjson': (Like, ['post_id', 'post__title', 'created_at']),
+    'problem_solves.ndjson': (ProblemSolveLog, ['problem_id', 'problem__title', 'solved_at', 'passed']),
+}
+
+
+class _Sink:
+    """Write-only file object that hands back what was written since the last drain."""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts, self.size = [], 0
+        return data
+
+
+def _entry(name, modified, compress=True):
+    info = ZipInfo(name, date_time=modified.timetuple()[:6])
+    info.compress_type = ZIP_DEFLATED if compress else ZIP_STORED
+    return info
+
+
+def generate(user, modified):
+    """Yield the archive's bytes in chunks of roughly FLUSH_BYTES."""
+    profile = user.profile
+    sink = _Sink()
+    with ZipFile(sink, 'w') as archive:
+        with archive.open(_entry('profile.json', modified), 'w') as entry:
+            entry.write(dumps({
+                'username': user.username, 'email': user.email, 'date_joined': user.date_joined,
+                'exp': profile.exp, 'posts_count': profile.posts_count, 'total_likes': profile.total_likes,
+                'total_post_views': profile.total_post_views,
+                'following': list(
+                    profile.following.order_by('user__username').values_list('user__username', flat=True).iterator()
+                ),
+            }).encode())
+        yield sink.drain()
+
+        for name, (model, fields) in SECTIONS.items():
+            rows = model.objects.filter(user=user).order_by('pk').values(*fields)
+            # force_zip64: the entry's size isn't known until it is written.
+            with archive.open(_entry(name, modified), 'w', force_zip64=True) as entry:
+                for row in rows.iterator(chunk_size=CHUNK_SIZE):
+                    entry.write(dumps(row).encode())
+                    if sink.size >= FLUSH_BYTES:
+                        yield sink.drain()
+            yield sink.drain()
+
+        if profile.avatar:
+            extension = profile.avatar.name.rsplit('.', 1)[-1] if '.' in profile.avatar.name else 'bin'
+            # Images are already compressed.
+            with profile.avatar.open('rb') as avatar, \
+                    archive.open(_entry(f'avatar.{extension}', modified, compress=False), 'w', force_zip64=True) as entry:
+                for chunk in avatar.chunks():
+                    entry.write(chunk)
+                    if sink.size >= FLUSH_BYTES:
+                        yield sink.drain()
+    # Closing the archive writes the central directory.
+    yield sink.drain()
+
+
+def _skip(chunks, start, end):
+    """The bytes of ``chunks`` from offset ``start`` to ``end`` inclusive."""
+    position = 0
+    for chunk in chunks:
+        chunk_start, position = position, position + len(chunk)
+        if position <= start:
+            continue
+        yield chunk[max(start - chunk_start, 0):end + 1 - chunk_start]
+        if position > end:
+            return
+
+
+def _requested_range(request, etag):
+    """(start, end or None) from a single-range ``Range`` header, or None to send everything."""
+    header = request.headers.get('Range', '')
+    if_range = request.headers.get('If-Range')
+    if if_range is not None and if_range != etag:
+        return None  # the archive changed since the partial download
+    match = re.fullmatch(r'bytes=(\d+)-(\d*)', header.strip())
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2)) if match.group(2) else None
+
+
+def response(request, user, etag, modified):
+    filename = f'{user.username}-archive.zip'
+    requested = _requested_range(request, etag)
+
+    if requested is None:
+        response = StreamingHttpResponse(generate(user, modified), content_type='application/zip')
+    else:
+        total = sum(len(chunk) for chunk in generate(user, modified))
+        start, end = requested
+        end = total - 1 if end is None else min(end, total - 1)
+        if start > end:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{total}'
+            return response
+        response = StreamingHttpResponse(
+            _skip(generate(user, modified), start, end), status=206, content_type='application/zip'
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{total}'
+        response['Content-Length'] = str(end - start + 1)
+
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified.timestamp())
+    return response
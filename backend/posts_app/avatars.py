@@ -0,0 +1,232 @@
+"""
+Avatar uploads and their thumbnails.
+
+AvatarUploadHandler streams the upload to a temporary file and gives up on
+it as soon as it passes AVATAR_MAX_BYTES or its header (read from the first
+chunks, without decoding any pixels) shows a format other than FORMATS or
+more than AVATAR_MAX_PIXELS. store() then saves the original and returns;
+the SIZES px square thumbnails, as WebP and JPEG, are made on a pool of
+AVATAR_WORKERS threads once the transaction commits (Pillow releases the
+GIL while it decodes, resizes and encodes) and recorded in
+UserProfile.avatar_variants. Until they exist, url() falls back to the
+original.
+"""
+import logging
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from . import response_cache
+from .models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+FIELD_NAME = 'avatar'
+SIZES = (32, 64, 256)
+VARIANT_FORMATS = (('webp', 'WEBP'), ('jpeg', 'JPEG'))
+FORMATS = {'JPEG', 'MPO', 'PNG', 'GIF', 'WEBP'}
+HEAD_BYTES = 64 * 1024  # enough for the header of anything in FORMATS
+QUALITY = 85
+
+
+def max_bytes():
+    return getattr(settings, 'AVATAR_MAX_BYTES', 10 * 1024 * 1024)
+
+
+def max_pixels():
+    return getattr(settings, 'AVATAR_MAX_PIXELS', 50_000_000)
+
+
+def workers():
+    return getattr(settings, 'AVATAR_WORKERS', 2)
+
+
+def _storage():
+    return UserProfile._meta.get_field('avatar').storage
+
+
+def inspect(head):
+    """(format, (width, height)) from the start of an image file, or None if it can't be read yet."""
+    try:
+        with Image.open(BytesIO(head)) as image:  # lazy: parses the header only
+            return image.format, image.size
+    except (OSError, SyntaxError, ValueError, EOFError, struct.error):
+        return None
+
+
+def problem(info):
+    """Why an image with ``info`` (see inspect) can't be an avatar, or None if it can."""
+    if info is None or info[0] not in FORMATS:
+        return "Avatars must be JPEG, PNG, GIF or WebP images"
+    width, height = info[1]
+    if width * height > max_pixels():
+        return f"Avatars can be at most {max_pixels():,} pixels"
+    return None
+
+
+class AvatarUploadHandler(FileUploadHandler):
+    """
+    Writes the ``avatar`` file to a temporary file, rejecting it as soon as
+    it is too big or not a supported image. Other files in the request are
+    skipped. After parsing, ``error`` says why the avatar was rejected.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.error = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        if self.field_name != FIELD_NAME:
+            raise SkipFile()
+        self.file = TemporaryUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.head = b''
+        self.checked = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > max_bytes():
+            self.reject(f"Avatars can be at most {max_bytes() // (1024 * 1024)} MB")
+        if not self.checked:
+            self.head += raw_data[:HEAD_BYTES - len(self.head)]
+            info = inspect(self.head)
+            if info is not None or len(self.head) >= HEAD_BYTES:
+                self.checked = True
+                error = problem(info)
+                if error:
+                    self.reject(error)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if not self.checked:
+            self.error = problem(inspect(self.head))
+        if self.error:
+            self.file.close()
+            return None
+        self.file.seek(0)
+        self.file.size = file_size
+        return self.file
+
+    def reject(self, error):
+        self.error = error
+        self.file.close()
+        raise SkipFile(error)
+
+
+def store(profile, upload):
+    """
+    Make ``upload`` the profile's avatar and queue its thumbnails; the old
+    avatar's files are deleted once this commits.
+    """
+    # Read afresh: the thumbnails of the old avatar may have landed since ``profile`` was loaded.
+    name, variants = UserProfile.objects.filter(pk=profile.pk).values_list('avatar', 'avatar_variants').get()
+    old = [name, *variant_names(variants)] if name else []
+    profile.avatar_variants = {}
+    profile.avatar.save(upload.name, upload, save=False)
+    profile.save(update_fields=['avatar', 'avatar_variants'])
+    name = profile.avatar.name
+    transaction.on_commit(lambda: _discard([old_name for old_name in old if old_name != name]))
+    transaction.on_commit(lambda: schedule(profile.pk, name))
+
+
+def variant_names(variants):
+    return [name for formats in variants.values() for name in formats.values()]
+
+
+def _discard(names):
+    storage = _storage()
+    for name in names:
+        storage.delete(name)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def schedule(profile_id, name):
+    """Make the thumbnails of avatar ``name`` on the pool, or right here with AVATAR_WORKERS = 0."""
+    global _pool
+    if workers() <= 0:
+        return make_variants(profile_id, name)
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=workers(), thread_name_prefix='avatars')
+        return _pool.submit(_run, profile_id, name)
+
+
+def _run(profile_id, name):
+    try:
+        return make_variants(profile_id, name)
+    except Exception:
+        logger.exception("Making thumbnails of avatar %s failed", name)
+    finally:
+        connections.close_all()  # this worker thread's connections
+
+
+def _thumbnail(image, size):
+    return ImageOps.fit(image, (size, size), method=Image.Resampling.LANCZOS)
+
+
+def make_variants(profile_id, name):
+    """Write the thumbnails of avatar ``name``; returns the variants, or None if the avatar was replaced meanwhile."""
+    storage = _storage()
+    root = name.rsplit('.', 1)[0]
+    variants = {}
+    try:
+        source = storage.open(name, 'rb')
+    except FileNotFoundError:
+        return None  # replaced, and deleted, before its turn came
+    with source, Image.open(source) as original:
+        # JPEGs can be decoded straight at a fraction of their size.
+        original.draft('RGB', (max(SIZES), max(SIZES)))
+        image = ImageOps.exif_transpose(original)
+        if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+            image = image.convert('RGBA')
+            flat = Image.new('RGB', image.size, 'white')
+            flat.paste(image, mask=image.getchannel('A'))
+            image = flat
+        else:
+            image = image.convert('RGB')
+        # Largest first, each from the previous one.
+        for size in sorted(SIZES, reverse=True):
+            image = _thumbnail(image, size)
+            for extension, image_format in VARIANT_FORMATS:
+                buffer = BytesIO()
+                image.save(buffer, image_format, quality=QUALITY)
+                saved = storage.save(f'{root}-{size}.{extension}', ContentFile(buffer.getvalue()))
+                variants.setdefault(str(size), {})[extension] = saved
+
+    if not UserProfile.objects.filter(pk=profile_id, avatar=name).update(avatar_variants=variants):
+        _discard(variant_names(variants))
+        return None
+    response_cache.bump('profiles')
+    return variants
+
+
+def _absolute(location, request):
+    return request.build_absolute_uri(location) if request is not None else location
+
+
+def url(profile, size, request=None, extension='webp'):
+    """URL of the profile's ``size`` px avatar, the original until its thumbnails exist, or None."""
+    if not profile.avatar:
+        return None
+    name = profile.avatar_variants.get(str(size), {}).get(extension)
+    return _absolute(_storage().url(name) if name else profile.avatar.url, request)
+
+
+def urls(profile, request=None):
+    """{'original', 'ready', '<size>': {'webp', 'jpeg'}} for every size, or None without an avatar."""
+    if not profile.avatar:
+        return None
+    result = {'original': _absolute(profile.avatar.url, request), 'ready': bool(profile.avatar_variants)}
+    for size in SIZES:
+        result[str(size)] = {extension: url(profile, size, request, extension) for extension, _ in VARIANT_FORMATS}
+    return result
@@ -0,0 +1,292 @@
+"""
+NDJSON bulk export/import of users, posts, comments and likes.
+
+Export streams one JSON object per line from ``.iterator()`` queries, so
+memory stays flat however large the database is. Records reference users by
+username and everything else by the source database's ids; import maps
+those ids to the ones it creates, so a dump can be loaded into a database
+that already has data.
+
+Import writes with chunked ``bulk_create``, which skips save() and the
+signal receivers, so the derived data they would have maintained (post and
+profile counters, profile stats, search, trending and facet tables, cached
+responses) is rebuilt once at the end instead of per row.
+"""
+import json
+from collections import defaultdict
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import facets, profile_stats, response_cache, search, trending
+from .models import Comment, InterviewPost, Like, Post, UserProfile
+
+CHUNK_SIZE = 1000
+
+USER_FIELDS = ('username', 'email', 'first_name', 'last_name', 'date_joined')
+POST_FIELDS = (
+    'id', 'user__username', 'post_type', 'title', 'content', 'visibility', 'company', 'position',
+    'interview_date', 'created_at', 'updated_at', 'views',
+)
+ROUND_FIELDS = ('round_number', 'round_type', 'position', 'status')
+COMMENT_FIELDS = ('id', 'post_id', 'user__username', 'parent_comment_id', 'content', 'created_at')
+LIKE_FIELDS = ('post_id', 'user__username', 'created_at')
+
+
+RENAMED = {'user__username': 'user', 'post_id': 'post', 'parent_comment_id': 'parent_comment'}
+POST_DEFAULTS = {'visibility': 'public', 'company': None, 'position': None, 'interview_date': None, 'views': 0}
+
+
+def _record(kind, row):
+    return {'type': kind, **{RENAMED.get(key, key): value for key, value in row.items()}}
+
+
+def export_records(chunk_size=CHUNK_SIZE):
+    """Yield every record as a dict: users, then posts, comments and likes, each in id order."""
+    users = User.objects.filter(
+        Q(pk__in=Post.objects.values('user_id'))
+        | Q(pk__in=Comment.objects.values('user_id'))
+        | Q(pk__in=Like.objects.values('user_id'))
+    ).order_by('pk').values(*USER_FIELDS)
+    for row in users.iterator(chunk_size=chunk_size):
+        yield _record('user', row)
+
+    posts = Post.objects.order_by('pk').values(
+        *POST_FIELDS, *(f'interview_details__{field}' for field in ROUND_FIELDS)
+    )
+    for row in posts.iterator(chunk_size=chunk_size):
+        details = {field: row.pop(f'interview_details__{field}') for field in ROUND_FIELDS}
+        record = _record('post', row)
+        record['interview'] = details if details['round_type'] is not None else None
+        yield record
+
+    for row in Comment.objects.order_by('pk').values(*COMMENT_FIELDS).iterator(chunk_size=chunk_size):
+        yield _record('comment', row)
+
+    for row in Like.objects.order_by('pk').values(*LIKE_FIELDS).iterator(chunk_size=chunk_size):
+        yield _record('like', row)
+
+
+def _encode(value):
+    # Full precision: DjangoJSONEncoder rounds to milliseconds, which would
+    # reorder keyset pages after a round trip.
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(record):
+    """One NDJSON line."""
+    return json.dumps(record, default=_encode) + '\n'
+
+
+def export_lines(chunk_size=CHUNK_SIZE):
+    for record in export_records(chunk_size):
+        yield dumps(record)
+
+
+def _lookup(mapping, key, kind):
+    try:
+        return mapping[key]
+    except KeyError:
+        raise ValueError(f"{kind} {key!r} is not in the import") from None
+
+
+class Importer:
+    """
+    Loads records in export order. Each kind is buffered and written
+    ``chunk_size`` rows at a time; a buffer is flushed before any record
+    that depends on a row still in it.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.users = {}
+        self.post_ids = {}
+        self.comment_ids = {}
+        self.pending = defaultdict(list)
+        self.counts = defaultdict(int)
+        self.touched_users = set()
+        self.like_keys = set()
+
+    def load(self, lines):
+        """Import ``lines`` (str or bytes) atomically; raises ValueError on bad input."""
+        with transaction.atomic():
+            for number, line in enumerate(lines, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                    handler = getattr(self, f"add_{record.pop('type')}")
+                except (ValueError, KeyError, AttributeError, TypeError):
+                    raise ValueError(f"line {number}: not a user, post, comment or like record")
+                try:
+                    handler(record)
+                except KeyError as exc:
+                    raise ValueError(f"line {number} or a record buffered before it is missing {exc}")
+            try:
+                for kind in ('user', 'post', 'comment', 'like'):
+                    self.flush(kind)
+            except KeyError as exc:
+                raise ValueError(f"a record is missing {exc}")
+            self.finish()
+        return dict(self.counts)
+
+    def flush(self, kind):
+        rows, self.pending[kind] = self.pending[kind], []
+        if rows:
+            getattr(self, f'write_{kind}s')(rows)
+            self.counts[f'{kind}s'] += len(rows)
+
+    def queue(self, kind, row):
+        self.pending[kind].append(row)
+        if len(self.pending[kind]) >= self.chunk_size:
+            self.flush(kind)
+
+    def user_id(self, username):
+        if username not in self.users:
+            self.flush('user')
+        return _lookup(self.users, username, 'user')
+
+    def post_id(self, source_id):
+        if source_id not in self.post_ids:
+            self.flush('post')
+        return _lookup(self.post_ids, source_id, 'post')
+
+    def add_user(self, record):
+        self.queue('user', record)
+
+    def write_users(self, records):
+        existing = dict(
+            User.objects.filter(username__in=[r['username'] for r in records]).values_list('username', 'pk')
+        )
+        new = []
+        for record in records:
+            if record['username'] in existing:
+                continue
+            user = User(**{field: record.get(field) or '' for field in USER_FIELDS if field != 'date_joined'})
+            user.date_joined = parse_datetime(record['date_joined'])
+            user.set_unusable_password()
+            new.append(user)
+        created = User.objects.bulk_create(new)
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in created])
+        self.users.update(existing)
+        self.users.update({user.username: user.pk for user in created})
+
+    def add_post(self, record):
+        self.queue('post', record)
+
+    def write_posts(self, records):
+        posts = []
+        for record in records:
+            record = {**POST_DEFAULTS, **record}
+            post = Post(
+                user_id=self.user_id(record['user']),
+                **{field: record[field] for field in ('post_type', 'title', 'content', 'visibility', 'company',
+                                                      'position', 'views')},
+                interview_date=parse_date(record['interview_date']) if record['interview_date'] else None,
+            )
+            posts.append(post)
+        Post.objects.bulk_create(posts)
+        # auto_now_add/auto_now ignore the values given to bulk_create.
+        for post, record in zip(posts, records):
+            post.created_at = parse_datetime(record['created_at'])
+            post.updated_at = parse_datetime(record['updated_at'])
+            self.post_ids[record['id']] = post.pk
+            self.touched_users.add(post.user_id)
+        Post.objects.bulk_update(posts, ['created_at', 'updated_at'])
+        InterviewPost.objects.bulk_create([
+            InterviewPost(post=post, **record['interview'])
+            for post, record in zip(posts, records) if record.get('interview')
+        ])
+
+    def add_comment(self, record):
+        parent = record['parent_comment']
+        if parent is not None and parent not in self.comment_ids:
+            self.flush('comment')
+        self.queue('comment', record)
+
+    def write_comments(self, records):
+        comments = []
+        for record in records:
+            parent = record['parent_comment']
+            parent_id = None if parent is None else _lookup(self.comment_ids, parent, 'parent comment')
+            comment = Comment(
+                post_id=self.post_id(record['post']), user_id=self.user_id(record['user']),
+                parent_comment_id=parent_id, content=record['content'],
+            )
+            comments.append(comment)
+        # Parents are always written before their replies, so their roots are known.
+        roots = dict(Comment.objects.filter(
+            pk__in=[c.parent_comment_id for c in comments if c.parent_comment_id]
+        ).values_list('pk', 'thread_root_id'))
+        for comment in comments:
+            if comment.parent_comment_id:
+                comment.thread_root_id = roots[comment.parent_comment_id] or comment.parent_comment_id
+        Comment.objects.bulk_create(comments)
+        for comment, record in zip(comments, records):
+            comment.created_at = parse_datetime(record['created_at'])
+            self.comment_ids[record['id']] = comment.pk
+        Comment.objects.bulk_update(comments, ['created_at'])
+
+    def add_like(self, record):
+        # Source ids map one-to-one onto new posts, so a repeated (post, user)
+        # pair is the only way to hit Like's unique constraint.
+        key = (record['post'], record['user'])
+        if key in self.like_keys:
+            self.counts['skipped_likes'] += 1
+            return
+        self.like_keys.add(key)
+        self.queue('like', record)
+
+    def write_likes(self, records):
+        likes = [
+            Like(post_id=self.post_id(record['post']), user_id=self.user_id(record['user']))
+            for record in records
+        ]
+        Like.objects.bulk_create(likes)
+        for like, record in zip(likes, records):
+            like.created_at = parse_datetime(record['created_at'])
+        Like.objects.bulk_update(likes, ['created_at'])
+
+    def finish(self):
+        """Rebuild what the skipped save() calls and signal receivers would have maintained."""
+        post_ids = list(self.post_ids.values())
+        for start in range(0, len(post_ids), self.chunk_size):
+            chunk = list(
+                Post.objects.filter(pk__in=post_ids[start:start + self.chunk_size])
+                .with_actual_counts().only('id', 'likes_count', 'comments_count')
+            )
+            for post in chunk:
+                post.likes_count = post.actual_likes_count
+                post.comments_count = post.actual_comments_count
+            Post.objects.bulk_update(chunk, ['likes_count', 'comments_count'])
+
+        totals = (
+            Post.objects.filter(user_id__in=self.touched_users).order_by()
+            .values('user_id').annotate(posts=Count('pk'), likes=Sum('likes_count'))
+        )
+        profiles = {profile.user_id: profile for profile in UserProfile.objects.filter(user_id__in=self.touched_users)}
+        for row in totals:
+            profile = profiles[row['user_id']]
+            profile.posts_count = row['posts']
+            profile.total_likes = row['likes'] or 0
+        UserProfile.objects.bulk_update(profiles.values(), ['posts_count', 'total_likes'], batch_size=self.chunk_size)
+
+        profile_stats.rebuild(self.touched_users, chunk_size=self.chunk_size)
+        search.rebuild_index(Post)
+        trending.rebuild_scores(chunk_size=self.chunk_size)
+        facets.rebuild_counts()
+        response_cache.bump('feed', 'trending', 'profiles')
+
+
+def import_lines(lines, chunk_size=CHUNK_SIZE):
+    """
+    Load NDJSON ``lines``; returns the number of rows created per kind, and
+    ``skipped_likes`` for repeated likes that were left out.
+    """
+    return Importer(chunk_size).load(lines)
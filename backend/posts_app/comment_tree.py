@@ -0,0 +1,88 @@
+"""
+Comment threads assembled in memory.
+
+A page of top-level comments is one keyset range scan; the replies shown
+under them (at any depth) are one more query on Comment.thread_root. Only
+what is rendered is loaded: each comment's first REPLY_PREVIEW direct
+replies, and at most THREAD_REPLY_LIMIT replies per thread, picked with
+ROW_NUMBER() windows, so a thread with thousands of replies costs no more
+than a small one. The tree is then linked up in Python: each node gets
+``reply_count`` (its direct replies, counted in SQL) and ``tree_replies``,
+which CommentSerializer renders without touching the database, with a
+``more_replies`` link where replies were left out.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.expressions import Window
+from django.db.models.functions import Coalesce, RowNumber
+
+from .models import Comment
+from .pagination import CommentPagination
+
+REPLY_PREVIEW = 3
+THREAD_REPLY_LIMIT = 200
+
+
+def with_authors(queryset):
+    # UserSerializer reads user.profile.avatar for every commenter, and
+    # CommentSerializer the number of direct replies.
+    children = (
+        Comment.objects.filter(parent_comment=OuterRef('pk'))
+        .order_by().values('parent_comment').annotate(total=Count('pk')).values('total')
+    )
+    return queryset.select_related('user__profile').annotate(reply_count=Coalesce(Subquery(children), 0))
+
+
+def attach_replies(nodes, replies, preview=REPLY_PREVIEW):
+    """Link ``replies`` under ``nodes`` (and each other); returns ``nodes``."""
+    by_id = {comment.pk: comment for comment in [*nodes, *replies]}
+    children = {pk: [] for pk in by_id}
+    for reply in sorted(replies, key=lambda comment: (comment.created_at, comment.pk)):
+        if reply.parent_comment_id in children:
+            children[reply.parent_comment_id].append(reply)
+    for pk, comment in by_id.items():
+        comment.tree_replies = children[pk][:preview]
+    return nodes
+
+
+def more_replies_cursor(comment):
+    """
+    (more, cursor): whether ``comment`` has replies beyond those attached,
+    and the CommentPagination cursor of its replies endpoint that continues
+    after them (None to start from the first).
+    """
+    shown = getattr(comment, 'tree_replies', [])
+    if getattr(comment, 'reply_count', 0) <= len(shown):
+        return False, None
+    return True, CommentPagination().encode_cursor(shown[-1]) if shown else None
+
+
+def thread_replies(root_ids, preview=REPLY_PREVIEW):
+    """The replies in threads ``root_ids`` that can be shown: see the module docstring."""
+    order = [F('created_at').asc(), F('pk').asc()]
+    replies = Comment.objects.filter(thread_root_id__in=root_ids).annotate(
+        sibling_rank=Window(RowNumber(), partition_by=[F('parent_comment')], order_by=order),
+        thread_rank=Window(RowNumber(), partition_by=[F('thread_root')], order_by=order),
+    ).filter(sibling_rank__lte=preview, thread_rank__lte=THREAD_REPLY_LIMIT)
+    return list(with_authors(replies))
+
+
+def build_threads(roots):
+    """Attach the shown replies of the given top-level comments."""
+    roots = list(roots)
+    return attach_replies(roots, thread_replies([root.pk for root in roots]))
+
+
+def build_subtrees(comments, root_id):
+    """Attach replies below ``comments``, which all belong to thread ``root_id``."""
+    comments = list(comments)
+    ids = {comment.pk for comment in comments}
+    replies = [reply for reply in thread_replies([root_id]) if reply.pk not in ids]
+    return attach_replies(comments, replies)
+
+
+def top_level(post):
+    return with_authors(Comment.objects.filter(post=post, parent_comment=None))
+
+
+def direct_replies(comment):
+    return with_authors(Comment.objects.filter(parent_comment=comment))
@@ -0,0 +1,154 @@
+"""
+ETag / Last-Modified support for post detail, comment threads and profiles.
+
+Each validator is computed from stored timestamps and counters in a single
+query, so a client polling an unchanged resource gets a 304 without the
+serializer (and its queries) ever running.
+"""
+from hashlib import sha1
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Exists, F, Max, OuterRef, Subquery, Sum
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from . import activity, response_cache
+from .models import Comment, Like, Post, ProblemSolveLog, UserProfile
+
+
+def _aggregate(queryset, group, expression):
+    return Subquery(queryset.order_by().values(group).annotate(value=expression).values('value')[:1])
+
+
+def _count(queryset, group):
+    return _aggregate(queryset, group, Count('pk'))
+
+
+def make_etag(*parts):
+    return quote_etag(sha1(repr(parts).encode('utf-8')).hexdigest())
+
+
+def conditional(request, etag, last_modified, build):
+    """
+    Answer 304 if the client's validators still match, otherwise call
+    ``build()`` and attach the validators to its response.
+    """
+    last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+    if not_modified is not None:
+        return not_modified
+
+    response = build()
+    if response.status_code == 200:
+        response['ETag'] = etag
+        if last_modified_ts is not None:
+            response['Last-Modified'] = http_date(last_modified_ts)
+    return response
+
+
+def post_validators(queryset, pk, request):
+    """
+    (etag, last_modified, author_id) for a post detail payload, or None if
+    ``pk`` is not in ``queryset`` (so the caller can fall through to its
+    usual 404).
+    """
+    timeline = Post.objects.filter(application=OuterRef('application'))
+    row = (
+        queryset.filter(pk=pk)
+        .annotate(
+            timeline_count=_count(timeline, 'application'),
+            timeline_updated=_aggregate(timeline, 'application', Max('updated_at')),
+        )
+        .values(
+            'user_id', 'updated_at', 'likes_count', 'comments_count', 'liked', 'timeline_count', 'timeline_updated',
+            # The author block.
+            'user__username', 'user__profile__avatar', 'user__profile__avatar_variants',
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    last_modified = max(filter(None, [row['updated_at'], row['timeline_updated']]))
+    user = request.user
+    etag = make_etag(
+        'post', pk, user.pk if user.is_authenticated else None,
+        sorted(request.query_params.lists()), sorted(row.items()),
+    )
+    return etag, last_modified, row['user_id']
+
+
+def comments_validators(post, query_params, parent_id=None):
+    """
+    (etag, last_modified) for a page of a post's comments. Comments are
+    never edited, but one can be deleted and another added, so the newest
+    comment goes in with the count; commenters' names and avatars are
+    covered by the ``profiles`` generation.
+    """
+    row = Comment.objects.filter(post=post).aggregate(last_pk=Max('pk'), last_created=Max('created_at'))
+    etag = make_etag(
+        'comments', post.pk, parent_id, post.comments_count, row['last_pk'],
+        response_cache.generation('profiles'), sorted(query_params.lists()),
+    )
+    return etag, max(filter(None, [post.updated_at, row['last_created']]))
+
+
+def profile_validators(user_id, viewer):
+    """(etag, None) for a profile payload, or None if there is no such profile."""
+    profiles = UserProfile.objects.filter(user_id=user_id)
+    fields = ['exp', 'avatar', 'avatar_variants', 'timezone', 'user__username', 'user__email', 'user__stats__version']
+    if viewer.is_authenticated:
+        # The payload's is_following flag.
+        through = UserProfile.followers.through
+        profiles = profiles.annotate(followed=Exists(through.objects.filter(
+            from_userprofile=OuterRef('pk'), to_userprofile__user=viewer,
+        )))
+        fields.append('followed')
+    row = profiles.values(*fields).first()
+    if row is None:
+        return None
+    is_self = viewer.is_authenticated and str(viewer.pk) == str(user_id)
+    # The commit heatmap is relative to the user's today, so the tag changes daily too.
+    etag = make_etag('profile', user_id, is_self, activity.today_in(row['timezone']), sorted(row.items()))
+    # Follows and exp have no timestamp, so profiles are validated by ETag only.
+    return etag, None
+
+
+def archive_validators(user):
+    """
+    (etag, last_modified) for a user's data archive (see archive.py). A
+    Range resume regenerates the archive and skips bytes, so the tag must
+    change whenever anything the archive writes does.
+    """
+    sources = (
+        ('posts', Post, 'updated_at'), ('comments', Comment, 'created_at'),
+        ('likes', Like, 'created_at'), ('solves', ProblemSolveLog, 'solved_at'),
+    )
+    aggregates = {}
+    for name, model, timestamp in sources:
+        rows = model.objects.filter(user=OuterRef('pk'))
+        aggregates[f'{name}_total'] = _count(rows, 'user')
+        aggregates[f'{name}_updated'] = _aggregate(rows, 'user', Max(timestamp))
+    posts = Post.objects.filter(user=OuterRef('pk'))
+    # View-counter flushes don't touch updated_at.
+    aggregates['posts_views'] = _aggregate(posts, 'user', Sum('views'))
+    # Liked posts' titles: an edit moves the post's updated_at.
+    likes = Like.objects.filter(user=OuterRef('pk'))
+    aggregates['liked_updated'] = _aggregate(likes, 'user', Max('post__updated_at'))
+    follows = UserProfile.followers.through.objects.filter(to_userprofile__user=OuterRef('pk'))
+    aggregates['following_total'] = _count(follows, 'to_userprofile__user')
+    aggregates['following_last'] = _aggregate(follows, 'to_userprofile__user', Max('pk'))
+    profile_fields = ('avatar', 'exp', 'posts_count', 'total_likes', 'total_post_views')
+    row = (
+        User.objects.filter(pk=user.pk)
+        .annotate(**aggregates, **{field: F(f'profile__{field}') for field in profile_fields})
+        .values('username', 'email', 'date_joined', *profile_fields, *aggregates)
+        .first()
+    )
+    # Solves are re-graded in place and problems have no timestamp, so hash
+    # the rows themselves; there is at most one per problem.
+    solves = list(
+        ProblemSolveLog.objects.filter(user=user).order_by('pk').values_list('problem_id', 'problem__title', 'passed')
+    )
+    # Comments and likes are never edited, so their newest timestamp and count cover them.
+    last_modified = max(filter(None, [row['date_joined'], *(row[f'{name}_updated'] for name, _, _ in sources)]))
+    return make_etag('archive', user.pk, sorted(row.items()), solves), last_modified
@@ -0,0 +1,154 @@
+"""
+Filter-sidebar facet counts kept in the FacetCount rollup table.
+
+Every write to a post or its interview round adjusts the affected
+(facet, value) rows by the difference between the post's facets before and
+after, so /posts/facets/ is a single read of a small table. Only public
+posts are counted. Round types live on InterviewPost and are maintained by
+its own receivers; a post's visibility change moves them too.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import response_cache
+from .models import FacetCount, InterviewPost, Post
+
+FACETS = ('company', 'position', 'post_type', 'round_type')
+POST_FACET_FIELDS = {'company', 'position', 'post_type', 'visibility'}
+
+
+def facets_of(visibility, round_type=None, **values):
+    """The (facet, value) pairs a post contributes, as a Counter."""
+    if visibility != 'public':
+        return Counter()
+    values['round_type'] = round_type
+    return Counter((facet, value) for facet, value in values.items() if value)
+
+
+def _stored_facets(post_id):
+    row = (
+        Post.objects.filter(pk=post_id)
+        .values('visibility', 'company', 'position', 'post_type', 'interview_details__round_type')
+        .first()
+    )
+    if row is None:
+        return Counter()
+    row['round_type'] = row.pop('interview_details__round_type')
+    return facets_of(**row)
+
+
+def _round_type_of(post_id):
+    return InterviewPost.objects.filter(post_id=post_id).values_list('round_type', flat=True).first()
+
+
+def apply(delta):
+    """Add ``delta`` ({(facet, value): change}) to the rollup table."""
+    changed = False
+    with transaction.atomic():
+        for (facet, value), change in delta.items():
+            if not change:
+                continue
+            FacetCount.objects.get_or_create(facet=facet, value=value)
+            if change > 0:
+                FacetCount.objects.filter(facet=facet, value=value).update(count=F('count') + change)
+            else:
+                FacetCount.objects.filter(facet=facet, value=value, count__gte=-change).update(
+                    count=F('count') + change
+                )
+            changed = True
+    if changed:
+        response_cache.bump('facets')
+
+
+def _difference(before, after):
+    delta = Counter(after)
+    delta.subtract(before)
+    return delta
+
+
+def facet_counts():
+    """{facet: [{'value', 'count'}, ...]} for every facet, most common first."""
+    result = {facet: [] for facet in FACETS}
+    rows = FacetCount.objects.filter(count__gt=0).order_by('facet', '-count', 'value')
+    for facet, value, count in rows.values_list('facet', 'value', 'count'):
+        result.setdefault(facet, []).append({'value': value, 'count': count})
+    return result
+
+
+def rebuild_counts():
+    """Recompute the rollup table from the posts themselves."""
+    public = Post.objects.filter(visibility='public')
+    rows = []
+    for facet in ('company', 'position', 'post_type'):
+        grouped = public.exclude(**{f'{facet}__isnull': True}).exclude(**{facet: ''})
+        for value, count in grouped.order_by().values_list(facet).annotate(total=Count('pk')):
+            rows.append(FacetCount(facet=facet, value=value, count=count))
+    rounds = InterviewPost.objects.filter(post__visibility='public').exclude(round_type='')
+    for value, count in rounds.order_by().values_list('round_type').annotate(total=Count('pk')):
+        rows.append(FacetCount(facet='round_type', value=value, count=count))
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create(rows)
+    response_cache.bump('facets')
+    return len(rows)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_facets(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not POST_FACET_FIELDS & set(update_fields):
+        return
+    instance._facets_before = _stored_facets(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def post_facets_changed(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = instance.__dict__.pop('_facets_before', None)
+    if before is None and not created:
+        return  # none of the faceted fields were saved
+    # A new post gets its round after it is saved; see round_saved.
+    round_type = None if created else _round_type_of(instance.pk)
+    after = facets_of(
+        instance.visibility, round_type,
+        company=instance.company, position=instance.position, post_type=instance.post_type,
+    )
+    apply(_difference(before or Counter(), after))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    # The cascade has already removed the interview round (and its facet).
+    before = facets_of(
+        instance.visibility, company=instance.company, position=instance.position, post_type=instance.post_type,
+    )
+    apply(_difference(before, Counter()))
+
+
+@receiver(pre_save, sender=InterviewPost)
+def remember_round_type(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._round_type_before = None if instance._state.adding else _round_type_of(instance.pk)
+
+
+@receiver(post_save, sender=InterviewPost)
+def round_saved(sender, instance, raw=False, **kwargs):
+    if raw or instance.post.visibility != 'public':
+        return
+    before = instance.__dict__.pop('_round_type_before', None)
+    apply(_difference(
+        facets_of('public', before), facets_of('public', instance.round_type),
+    ))
+
+
+@receiver(post_delete, sender=InterviewPost)
+def round_deleted(sender, instance, **kwargs):
+    visibility = Post.objects.filter(pk=instance.post_id).values_list('visibility', flat=True).first()
+    apply(_difference(facets_of(visibility, instance.round_type), Counter()))
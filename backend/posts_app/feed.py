@@ -0,0 +1,126 @@
+"""
+"Following" feed: fan-out on write with a fan-out-on-read fallback.
+
+When a public post is created its id is copied into a FeedItem row for
+every follower of the author, so reading the feed is one range scan over
+the reader's inbox. Authors with more than FEED_FANOUT_LIMIT followers are
+not fanned out; their posts are merged in at read time instead. Both
+sides go by the stored ProfileStats.followers_count, so they agree on who
+is fanned out and neither has to count followers.
+"""
+import heapq
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import FeedItem, Post, ProfileStats, UserProfile
+
+CHUNK_SIZE = 1000
+
+
+def fanout_limit():
+    return getattr(settings, 'FEED_FANOUT_LIMIT', 5000)
+
+
+def backfill_size():
+    return getattr(settings, 'FEED_BACKFILL_SIZE', 50)
+
+
+def is_fanned_out(author_profile):
+    followers = ProfileStats.objects.filter(user_id=author_profile.user_id).values_list('followers_count', flat=True)
+    return (followers.first() or 0) <= fanout_limit()
+
+
+def fan_out_post(post):
+    """Deliver a public post to its author's followers' inboxes."""
+    if post.visibility != 'public':
+        remove_post(post)
+        return
+    profile = UserProfile.objects.get(user_id=post.user_id)
+    if not is_fanned_out(profile):
+        return
+    follower_ids = profile.followers.values_list('user_id', flat=True)
+    items = []
+    for owner_id in follower_ids.iterator(chunk_size=CHUNK_SIZE):
+        items.append(FeedItem(owner_id=owner_id, post=post, author_id=post.user_id, created_at=post.created_at))
+        if len(items) >= CHUNK_SIZE:
+            FeedItem.objects.bulk_create(items, ignore_conflicts=True)
+            items = []
+    FeedItem.objects.bulk_create(items, ignore_conflicts=True)
+
+
+def remove_post(post):
+    FeedItem.objects.filter(post=post).delete()
+
+
+def follow(follower, author):
+    """Backfill the author's recent public posts into a new follower's inbox."""
+    if not is_fanned_out(author.profile):
+        return
+    recent = (
+        Post.objects.filter(user=author, visibility='public')
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:backfill_size()]
+    )
+    FeedItem.objects.bulk_create(
+        [FeedItem(owner=follower, post_id=post_id, author=author, created_at=created_at)
+         for post_id, created_at in recent],
+        ignore_conflicts=True,
+    )
+
+
+def unfollow(follower, author):
+    FeedItem.objects.filter(owner=follower, author=author).delete()
+
+
+def _fan_out_on_read_authors(user):
+    followed = UserProfile.objects.filter(followers__user=user).values('user_id')
+    return list(
+        ProfileStats.objects.filter(user_id__in=followed, followers_count__gt=fanout_limit())
+        .values_list('user_id', flat=True)
+    )
+
+
+def read_feed(user, paginator, position, limit):
+    """
+    Up to ``limit`` feed entries after ``position``, newest first. Entries
+    are FeedItem rows; posts by fan-out-on-read authors are returned as
+    unsaved FeedItems so both sources paginate with the same cursor.
+    """
+    def page_of(queryset):
+        queryset = queryset.order_by(*paginator.get_ordering())
+        if position is not None:
+            queryset = queryset.filter(paginator.position_filter(*position))
+        return list(queryset[:limit])
+
+    inbox = page_of(FeedItem.objects.filter(owner=user))
+
+    pulled_authors = _fan_out_on_read_authors(user)
+    if not pulled_authors:
+        return inbox
+    pulled = page_of(
+        Post.objects.filter(user_id__in=pulled_authors, visibility='public')
+        .annotate(post_id=F('id'))
+        .only('id', 'user_id', 'created_at')
+    )
+    pulled = [
+        FeedItem(owner=user, post_id=post.pk, author_id=post.user_id, created_at=post.created_at)
+        for post in pulled
+    ]
+    # An author who crossed the limit may have older posts in both sources.
+    merged, seen = [], set()
+    for item in heapq.merge(inbox, pulled, key=lambda item: (item.created_at, item.post_id), reverse=True):
+        if item.post_id not in seen:
+            seen.add(item.post_id)
+            merged.append(item)
+    return merged[:limit]
+
+
+@receiver(post_save, sender=Post)
+def sync_feed_items(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if created or update_fields is None or 'visibility' in update_fields:
+        fan_out_post(instance)
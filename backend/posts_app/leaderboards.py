@@ -0,0 +1,124 @@
+"""
+Leaderboards: users ranked by exp or by problems solved, all-time or over
+the last week, optionally among the applicants to one company.
+
+Each board is one grouped scan into an in-process sorted array, rebuilt
+once it is older than LEADERBOARD_TTL seconds, so a score change shows up
+within that long. Ranks are competition ranks (1, 2, 2, 4): a user's rank
+is one more than the number of users with a higher score, found by
+bisecting the sorted scores, and a page of the top N is a slice. Users
+with no score are not on a board.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import EXP_PER_POST, Application, Post, ProblemSolveLog, UserProfile
+
+METRICS = ('exp', 'solves')
+WINDOWS = {'all': None, 'week': timedelta(days=7)}
+
+
+def ttl():
+    return getattr(settings, 'LEADERBOARD_TTL', 60)
+
+
+class Board:
+    """(user_id, score) rows, best first with ties by user id; slices give (rank, user_id, score)."""
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: (-row[1], row[0]))
+        self.user_ids = array('q', [user_id for user_id, _ in rows])
+        self.keys = array('q', [-score for _, score in rows])  # ascending, for bisect
+        self.scores = dict(rows)
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("Boards are read a page at a time")
+        return [
+            (bisect_left(self.keys, self.keys[position]) + 1, self.user_ids[position], -self.keys[position])
+            for position in range(*index.indices(len(self)))
+        ]
+
+    def rank(self, user_id):
+        """(rank, score) of ``user_id``, with rank None if they are not on the board."""
+        score = self.scores.get(user_id)
+        if score is None:
+            return None, 0
+        return bisect_left(self.keys, -score) + 1, score
+
+
+def scores(metric, window, company_key=None):
+    """Queryset of (user_id, score) rows with a positive score."""
+    since = WINDOWS[window] and timezone.now() - WINDOWS[window]
+    if metric == 'exp' and since is None:
+        rows = UserProfile.objects.filter(exp__gt=0).values_list('user_id', 'exp')
+    elif metric == 'exp':
+        # exp only comes from writing posts, so the week's is what its posts earned.
+        rows = (
+            Post.objects.filter(created_at__gte=since).order_by()
+            .values('user').annotate(score=Count('pk') * EXP_PER_POST).values_list('user', 'score')
+        )
+    else:
+        solves = ProblemSolveLog.objects.filter(passed=True)
+        if since is not None:
+            solves = solves.filter(solved_at__gte=since)
+        rows = solves.order_by().values('user').annotate(score=Count('pk')).values_list('user', 'score')
+    if company_key:
+        rows = rows.filter(user__in=Application.objects.filter(company_key=company_key).values('user'))
+    return rows
+
+
+_boards = {}
+_boards_lock = threading.Lock()  # guards _boards and _build_locks, never held across a query
+_build_locks = {}
+
+
+def _fresh(key):
+    with _boards_lock:
+        cached = _boards.get(key)
+        if cached is not None and time.monotonic() - cached.built_at <= ttl():
+            return cached
+        return None
+
+
+def board(metric, window, company_key=None):
+    """
+    This process's Board for the arguments, rebuilt when older than ttl().
+    A rebuild holds only its own key's lock, so one slow board doesn't hold
+    up readers of the others, and concurrent readers of it wait for that
+    one build instead of each running the scan.
+    """
+    key = (metric, window, company_key)
+    cached = _fresh(key)
+    if cached is not None:
+        return cached
+    with _boards_lock:
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+    with build_lock:
+        cached = _fresh(key)  # built by whoever held the lock before us
+        if cached is not None:
+            return cached
+        built = Board(scores(metric, window, company_key))
+        with _boards_lock:
+            now = time.monotonic()
+            for stale in [name for name, old in _boards.items() if now - old.built_at > ttl()]:
+                del _boards[stale]
+            _boards[key] = built
+    return built
+
+
+def reset():
+    with _boards_lock:
+        _boards.clear()
+        _build_locks.clear()
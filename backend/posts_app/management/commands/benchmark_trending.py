@@ -0,0 +1,69 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from posts_app.models import Like, Post
+from posts_app.trending import WINDOW, rebuild_scores, top_posts
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the precomputed trending table with the old per-request Count('likes') query. "
+        "Seed data is created inside a transaction and rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--likes-per-post', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options['posts'], options['users'], options['likes_per_post'])
+
+            def aggregate():
+                cutoff = timezone.now() - WINDOW
+                queryset = Post.objects.filter(visibility='public', created_at__gte=cutoff)
+                return list(queryset.annotate(like_total=Count('likes')).order_by('-like_total')[:8])
+
+            def precomputed():
+                return list(top_posts(Post.objects.filter(visibility='public')))
+
+            for name, query in (('aggregate Count(likes)', aggregate), ('trending table', precomputed)):
+                query()
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    query()
+                elapsed = (time.perf_counter() - started) / options['repeat']
+                self.stdout.write(f"{name:>24}: {elapsed * 1000:8.2f} ms/request")
+
+            transaction.set_rollback(True)
+
+    def seed(self, post_count, user_count, likes_per_post):
+        self.stdout.write(f"Seeding {post_count} posts, {user_count} users, ~{likes_per_post} likes/post ...")
+        users = User.objects.bulk_create([
+            User(username=f'bench_trending_{i}') for i in range(user_count)
+        ])
+        now = timezone.now()
+        posts = Post.objects.bulk_create([
+            Post(user=random.choice(users), post_type='general', title=f'Post {i}', content='')
+            for i in range(post_count)
+        ])
+        # auto_now_add ignores values passed to bulk_create, so spread the dates afterwards.
+        for post in posts:
+            post.created_at = now - timedelta(minutes=random.randint(0, 60 * 24 * 60))
+        Post.objects.bulk_update(posts, ['created_at'], batch_size=1000)
+
+        likes = []
+        for post in posts:
+            for user in random.sample(users, min(random.randint(0, likes_per_post * 2), len(users))):
+                likes.append(Like(user=user, post=post))
+        Like.objects.bulk_create(likes, batch_size=1000)
+        rebuild_scores()
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts_app.unique_views import KEEP_DAYS, compact
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold daily unique-viewer sketches older than --keep-days into each post's and author's all-time sketch. "
+        "View-count flushes already do this for what they touch; this sweeps the rest."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=KEEP_DAYS)
+
+    def handle(self, *args, **options):
+        folded = compact(keep_days=options['keep_days'])
+        self.stdout.write(f"Folded {folded} daily sketches into all-time rows")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts_app.bulk_io import CHUNK_SIZE, export_lines
+
+
+class Command(BaseCommand):
+    help = "Stream users, posts, comments and likes as NDJSON to a file or stdout."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-', help="File to write, or - for stdout.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        lines = export_lines(options['chunk_size'])
+        if options['output'] == '-':
+            self.stdout.ending = ''  # each line already ends in a newline
+            for line in lines:
+                self.stdout.write(line)
+            return
+
+        written = 0
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            for line in lines:
+                output.write(line)
+                written += 1
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} records to {options['output']}"))
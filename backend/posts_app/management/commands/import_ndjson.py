@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts_app.bulk_io import CHUNK_SIZE, import_lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Load an NDJSON dump (see export_ndjson) with chunked bulk_create, then rebuild counters, "
+        "search, trending and facet tables once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="File to read, or - for stdin.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            if options['input'] == '-':
+                counts = import_lines(sys.stdin, options['chunk_size'])
+            else:
+                with open(options['input'], encoding='utf-8') as lines:
+                    counts = import_lines(lines, options['chunk_size'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        summary = ', '.join(f"{count} {kind.replace('_', ' ')}" for kind, count in counts.items()) or "nothing"
+        self.stdout.write(self.style.SUCCESS(f"Imported {summary}"))
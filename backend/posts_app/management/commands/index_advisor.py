@@ -0,0 +1,334 @@
+import random
+import re
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from posts_app import view_counter
+from posts_app.models import Comment, InterviewPost, Like, Post, UserProfile
+
+COMPANIES = ['Google', 'Meta', 'Amazon', 'Apple', 'Netflix', 'Stripe', 'Airbnb', 'Uber']
+POSITIONS = ['SWE', 'SRE', 'Data Engineer', 'Frontend Engineer']
+ROUND_TYPES = [value for value, _ in InterviewPost.ROUND_TYPE_CHOICES]
+
+# (label, method, path template, authenticated)
+REQUESTS = [
+    ('post list', 'get', '/posts/', False),
+    ('post list by company', 'get', '/posts/?company=Google', False),
+    ('post list by type', 'get', '/posts/?post_type=interview', False),
+    ('post list by round type', 'get', '/posts/?round_type=behavioral', True),
+    ('post list by company and type', 'get', '/posts/?company=Meta&post_type=interview', True),
+    ('post list by likes', 'get', '/posts/?ordering=-likes_count', False),
+    ('post list by comments', 'get', '/posts/?ordering=-comments_count', False),
+    ('post list by comments, signed in', 'get', '/posts/?ordering=-comments_count', True),
+    ('post list, cursor', 'get', '/posts/?pagination=cursor', True),
+    ('post search', 'get', '/posts/?search=system+design', False),
+    ('post detail', 'get', '/posts/{post}/', True),
+    ('comments', 'get', '/posts/{post}/comments/', False),
+    ('comment replies', 'get', '/posts/{post}/comments/{comment}/replies/', False),
+    ('like', 'post', '/posts/{post}/like/', True),
+    ('add comment', 'post', '/posts/{post}/add_comment/', True),
+    ('trending', 'get', '/posts/trending/', True),
+    ('facets', 'get', '/posts/facets/', False),
+    ('following feed', 'get', '/posts/following_feed/', True),
+    ('my posts', 'get', '/posts/my_posts/?post_type=interview', True),
+    ('my timeline', 'get', '/posts/my_timeline/?company=Google&position=SWE', True),
+    ('profile', 'get', '/users/{user}/', True),
+    ('user timeline', 'get', '/users/user_timeline/?company=Google&position=SWE&user_id={user}', True),
+]
+
+QUOTED_TABLE = re.compile(r'(?:FROM|JOIN) "(\w+)"(?: (U\d+))?')
+LITERAL = r"""(?:'[^']*'|-?\d[\d.]*|%s|\?|\("[\w]+"\."[\w]+"\))"""
+
+
+def strip_subqueries(sql):
+    """``sql`` with every parenthesized SELECT replaced by ``(...)``."""
+    out, stack = [], []
+    for char in sql:
+        if char == '(':
+            stack.append(len(out))
+        elif char == ')' and stack:
+            start = stack.pop()
+            if ''.join(out[start:]).lstrip('( ').upper().startswith('SELECT'):
+                del out[start:]
+                out.append('(...')
+        out.append(char)
+    return ''.join(out)
+
+
+def model_for(table):
+    return next((model for model in apps.get_models() if model._meta.db_table == table), None)
+
+
+def main_table(query):
+    match = QUOTED_TABLE.search(query)
+    return match.group(1) if match else None
+
+
+def clause(query, keyword, ends):
+    if f' {keyword} ' not in query:
+        return ''
+    body = query.split(f' {keyword} ', 1)[1]
+    for end in ends:
+        body = body.split(f' {end} ', 1)[0]
+    return body
+
+
+def filter_columns(query, names):
+    """(equality columns, range columns) of ``names`` in the WHERE clause, skipping OR-ed conditions."""
+    where = clause(query, 'WHERE', ('GROUP BY', 'ORDER BY', 'LIMIT'))
+    # Conditions inside an OR can't lead an index.
+    where = re.sub(r'\([^()]* OR [^()]*\)', '', where)
+    qualified = '|'.join(re.escape(name) for name in names)
+    equality, ranges = [], []
+    for column, operator in re.findall(rf'"?(?:{qualified})"?\."(\w+)" (= {LITERAL}|IN \(|IS NULL|[<>]=? )', where):
+        target = ranges if operator.strip() in ('<', '>', '<=', '>=') else equality
+        if column not in equality + ranges:
+            target.append(column)
+    return equality, ranges
+
+
+def order_columns(query, names):
+    """Leading ORDER BY columns of ``names``, up to the first term an index can't provide."""
+    qualified = '|'.join(re.escape(name) for name in names)
+    columns = []
+    for term in clause(query, 'ORDER BY', ('LIMIT',)).split(', '):
+        match = re.fullmatch(rf'"?(?:{qualified})"?\."(\w+)"(?: (ASC|DESC))?', term.strip())
+        if not match:
+            break
+        columns.append(('-' if match.group(2) == 'DESC' else '') + match.group(1))
+    return columns
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay representative API requests against seeded data, EXPLAIN every SQL statement they run "
+        "and suggest composite indexes for full scans and temp B-tree sorts. "
+        "Seed data is created inside a transaction and rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=3000)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--min-rows', type=int, default=500,
+                            help="Ignore full scans of tables smaller than this.")
+        parser.add_argument('--rows-per-key', type=int, default=50,
+                            help="Ignore sorts and extra filters after an index this selective.")
+        parser.add_argument('--show-plans', action='store_true', help="Print the plan of every flagged statement.")
+
+    def handle(self, *args, **options):
+        self.min_rows = options['min_rows']
+        self.rows_per_key_limit = options['rows_per_key']
+        isolated_cache = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                      'LOCATION': 'index-advisor'}}
+        # Views are flushed inside the transaction, not by a thread of their own.
+        settings_override = override_settings(
+            ALLOWED_HOSTS=['testserver'], CACHES=isolated_cache, VIEW_COUNT_FLUSH_THREAD=False,
+        )
+        with settings_override, transaction.atomic():
+            fixtures = self.seed(options['posts'], options['users'])
+            statements = self.replay(fixtures)
+            view_counter.flush()
+            findings = [finding for sql, labels in statements.items() if (finding := self.analyse(sql, labels))]
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Explained {len(statements)} distinct statements; {len(findings)} flagged.\n")
+        suggestions = OrderedDict()
+        for finding in findings:
+            self.stdout.write(f"[{', '.join(sorted(finding['labels']))}]")
+            for problem in finding['problems']:
+                self.stdout.write(f"  {problem}")
+            if options['show_plans']:
+                self.stdout.write(f"  SQL: {finding['sql']}")
+                for line in finding['plan']:
+                    self.stdout.write(f"    | {line}")
+            for suggestion in finding['suggestions']:
+                suggestions.setdefault(suggestion, set()).update(finding['labels'])
+
+        # A suggestion that is a prefix of another one is served by it.
+        for model, fields in list(suggestions):
+            longer = [other for other in suggestions if other[0] == model and len(other[1]) > len(fields)
+                      and other[1][:len(fields)] == fields]
+            if longer:
+                suggestions[longer[0]].update(suggestions.pop((model, fields)))
+
+        self.stdout.write("\nSuggested indexes:" if suggestions else "\nNo new indexes suggested.")
+        for (model, fields), labels in suggestions.items():
+            self.stdout.write(f"  {model}: models.Index(fields={list(fields)!r})  # {', '.join(sorted(labels))}")
+
+    def seed(self, post_count, user_count):
+        self.stdout.write(f"Seeding {post_count} posts and {user_count} users ...")
+        users = User.objects.bulk_create([User(username=f'index_advisor_{i}') for i in range(user_count)])
+        profiles = UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+        for profile in profiles:
+            profile.followers.add(*random.sample(profiles, 5))
+
+        now = timezone.now()
+        posts = []
+        for i in range(post_count):
+            interview = random.random() < 0.6
+            posts.append(Post(
+                user=random.choice(users), post_type='interview' if interview else 'general',
+                title=f'Post {i} system design', content='Seeded by index_advisor. ' * 20,
+                visibility='public' if random.random() < 0.9 else 'private',
+                company=random.choice(COMPANIES), position=random.choice(POSITIONS),
+                interview_date=(now - timedelta(days=random.randint(0, 365))).date() if interview else None,
+            ))
+        posts = Post.objects.bulk_create(posts, batch_size=500)
+        for post in posts:
+            post.created_at = now - timedelta(minutes=random.randint(0, 60 * 24 * 90))
+        Post.objects.bulk_update(posts, ['created_at'], batch_size=500)
+        InterviewPost.objects.bulk_create([
+            InterviewPost(post=post, round_number=random.randint(1, 5), round_type=random.choice(ROUND_TYPES))
+            for post in posts if post.post_type == 'interview'
+        ], batch_size=500)
+
+        Like.objects.bulk_create([
+            Like(user=user, post=post) for post in posts for user in random.sample(users, random.randint(0, 5))
+        ], batch_size=1000)
+        roots = Comment.objects.bulk_create([
+            Comment(post=post, user=random.choice(users), content='seed')
+            for post in posts for _ in range(random.randint(0, 3))
+        ], batch_size=1000)
+        Comment.objects.bulk_create([
+            Comment(post=root.post, user=random.choice(users), content='reply', parent_comment=root, thread_root=root)
+            for root in roots if random.random() < 0.5
+        ], batch_size=1000)
+
+        post = random.choice([p for p in posts if p.visibility == 'public'])
+        comment = Comment.objects.filter(post=post, parent_comment=None).first() or Comment.objects.create(
+            post=post, user=post.user, content='seed'
+        )
+        return {'post': post.pk, 'comment': comment.pk, 'user': post.user_id, 'viewer': users[0]}
+
+    def replay(self, fixtures):
+        """{sql: {request labels}} for every statement the requests ran."""
+        statements = OrderedDict()
+        for label, method, path, authenticated in REQUESTS:
+            client = APIClient()
+            if authenticated:
+                client.force_authenticate(fixtures['viewer'])
+            url = path.format(**fixtures)
+            data = {'content': 'advisor'} if method == 'post' else None
+            with CaptureQueriesContext(connection) as ctx:
+                response = getattr(client, method)(url, data)
+            if response.status_code >= 400:
+                self.stderr.write(f"{label}: {url} returned {response.status_code}")
+            for query in ctx.captured_queries:
+                sql = query['sql']
+                if sql.lstrip().upper().startswith('SELECT'):
+                    statements.setdefault(sql, set()).add(label)
+        return statements
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                return [row[3] for row in cursor.fetchall()]
+            cursor.execute(f'EXPLAIN {sql}')
+            return [row[0] for row in cursor.fetchall()]
+
+    def analyse(self, sql, labels):
+        try:
+            plan = self.explain(sql)
+        except Exception as exc:  # e.g. SQL that only runs with its original parameters
+            self.stderr.write(f"Could not explain ({exc}): {sql[:120]}")
+            return None
+
+        query = strip_subqueries(sql)
+        main = main_table(query)
+        aliases = {alias: table for table, alias in QUOTED_TABLE.findall(sql) if alias}
+        problems, tables = [], []
+        # Rows the main table's access path leaves to filter/sort; None for a full scan.
+        main_rows = None
+        for line in plan:
+            if connection.vendor == 'sqlite':
+                scan = re.match(r'\s*SCAN (\w+)$', line)
+                search = re.match(r'\s*SEARCH (\w+) USING (?:COVERING )?INDEX (\w+) \((.*)\)', line)
+                if scan:
+                    table = aliases.get(scan.group(1), scan.group(1))
+                    if self.rows_per_key(table, []) >= self.min_rows:
+                        problems.append(f"full scan of {table}")
+                        tables.append(table)
+                elif search and search.group(1) == main and model_for(main) is not None:
+                    used = re.findall(r'(\w+)=', search.group(3))
+                    main_rows = self.rows_per_key(main, used)
+                    unused = [column for column in filter_columns(query, [main])[0]
+                              if column not in used and column != model_for(main)._meta.pk.column]
+                    if unused and main_rows >= self.rows_per_key_limit:
+                        problems.append(
+                            f"{search.group(2)} narrows {main} to ~{main_rows:.0f} rows per "
+                            f"{', '.join(used)}; {', '.join(unused)} checked row by row"
+                        )
+                        tables.append(main)
+                elif 'USE TEMP B-TREE FOR' in line and 'ORDER BY' in line and 'ORDER BY' in query:
+                    rows = self.rows_per_key(main, []) if main_rows is None else main_rows
+                    if rows >= self.rows_per_key_limit:
+                        problems.append(f"temp B-tree for {line.split('FOR ')[-1]} of ~{rows:.0f} {main} rows")
+                        tables.append(main)
+            else:
+                scan = re.search(r'Seq Scan on (\w+)', line)
+                if scan and self.rows_per_key(scan.group(1), []) >= self.min_rows:
+                    problems.append(f"sequential scan of {scan.group(1)}")
+                    tables.append(scan.group(1))
+                elif re.match(r'\s*(->\s*)?Sort ', line):
+                    problems.append(f"sort of {main}")
+                    tables.append(main)
+
+        if not problems:
+            return None
+        suggestions = []
+        for table in dict.fromkeys(tables):
+            suggestion = self.suggest(query if table == main else sql, table, aliases)
+            if suggestion and suggestion not in suggestions:
+                suggestions.append(suggestion)
+        return {'sql': sql, 'labels': labels, 'plan': plan, 'problems': problems, 'suggestions': suggestions}
+
+    def rows_per_key(self, table, columns):
+        """Average number of ``table`` rows sharing a value of ``columns`` (all rows if none)."""
+        model = model_for(table)
+        if model is None:
+            return 0
+        by_column = {field.column: field.attname for field in model._meta.concrete_fields}
+        fields = [by_column[column] for column in columns if column in by_column]
+        total = model._default_manager.count()
+        if not fields:
+            return total
+        return total / max(model._default_manager.values(*fields).distinct().count(), 1)
+
+    def suggest(self, sql, table, aliases):
+        """(model label, fields): equality filters, then a range or the sort, if not already indexed."""
+        model = model_for(table)
+        if model is None or model._meta.app_label != 'posts_app':
+            return None
+        names = [table] + [alias for alias, aliased in aliases.items() if aliased == table]
+        equality, ranges = filter_columns(sql, names)
+        equality = [column for column in equality if column != model._meta.pk.column]
+        ordering = order_columns(sql, names)
+
+        columns = equality + ranges[:1]
+        for column in ordering:
+            if column.lstrip('-') not in columns:
+                columns.append(column)
+        by_column = {field.column: field.name for field in model._meta.concrete_fields}
+        fields = [('-' if c.startswith('-') else '') + by_column[c.lstrip('-')] for c in columns
+                  if c.lstrip('-') in by_column]
+        if not fields or self.covered(model, fields):
+            return None
+        return model._meta.label, tuple(fields)
+
+    def covered(self, model, fields):
+        """Whether an existing index already starts with ``fields`` (ignoring direction)."""
+        wanted = [name.lstrip('-') for name in fields]
+        existing = [[name.lstrip('-') for name in index.fields] for index in model._meta.indexes]
+        existing += [list(together) for together in model._meta.unique_together]
+        existing += [[field.name] for field in model._meta.concrete_fields if field.db_index or field.unique]
+        existing += [['id']]
+        return any(index[:len(wanted)] == wanted for index in existing)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts_app.avatars import make_variants
+from posts_app.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = "Make the thumbnails of every avatar that doesn't have them yet."
+
+    def handle(self, *args, **options):
+        made = 0
+        profiles = UserProfile.objects.exclude(avatar='').exclude(avatar=None).filter(avatar_variants={})
+        for profile_id, name in profiles.values_list('pk', 'avatar').iterator():
+            try:
+                made += make_variants(profile_id, name) is not None
+            except OSError as error:
+                self.stderr.write(f"Skipped {name}: {error}")
+        self.stdout.write(f"Made thumbnails for {made} avatars")
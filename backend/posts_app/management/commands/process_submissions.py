@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts_app import submissions
+
+
+class Command(BaseCommand):
+    help = "Run queued code submissions in the foreground."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty.")
+
+    def handle(self, *args, once=False, **options):
+        if not once:
+            submissions.dispatch()
+        ran = 0
+        while submissions.work_once() is not None:
+            ran += 1
+        self.stdout.write(f"Ran {ran} submissions")
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from posts_app.facets import rebuild_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute the facet count rollup from the public posts."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Rebuilt {rebuild_counts()} facet counts")
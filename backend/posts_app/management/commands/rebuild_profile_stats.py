@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from posts_app.profile_stats import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's profile stats row from their follows, posts, likes and solves."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Rebuilt profile stats for {rebuild()} users")
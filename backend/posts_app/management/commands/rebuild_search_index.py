@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts_app.search import SEARCH_INDEXES, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search tables for posts and problems (needed after bulk loads)."
+
+    def handle(self, *args, **options):
+        for model in SEARCH_INDEXES:
+            rebuild_index(model)
+            self.stdout.write(f"Rebuilt search index for {model._meta.label} ({model.objects.count()} rows)")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts_app.models import TrendingScore
+from posts_app.trending import rebuild_scores
+
+
+class Command(BaseCommand):
+    help = "Recompute every post's trending score from its likes, comments and views."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        rebuild_scores(chunk_size=options['chunk_size'])
+        self.stdout.write(f"Rebuilt {TrendingScore.objects.count()} trending scores")
@@ -0,0 +1,96 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts_app.models import Like, Post, UserProfile
+
+
+class Command(BaseCommand):
+    help = (
+        "Find and repair drift in Post.likes_count / Post.comments_count and UserProfile.total_likes, "
+        "one id range at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without fixing it.")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dry_run = options['dry_run']
+        action = "found" if dry_run else "repaired"
+
+        checked, drifted = self.reconcile_posts(chunk_size, dry_run)
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} posts, {action} {drifted} with drifted counters"))
+        checked, drifted = self.reconcile_profiles(chunk_size, dry_run)
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} profiles, {action} {drifted} with drifted total_likes"))
+
+    def reconcile_posts(self, chunk_size, dry_run):
+        checked = drifted = 0
+        last_id = 0
+
+        while True:
+            with transaction.atomic():
+                chunk = list(
+                    Post.objects.filter(pk__gt=last_id).order_by('pk')
+                    .with_actual_counts()
+                    .only('id', 'likes_count', 'comments_count')[:chunk_size]
+                )
+                if not chunk:
+                    break
+                last_id = chunk[-1].pk
+                checked += len(chunk)
+
+                stale = []
+                for post in chunk:
+                    if (post.likes_count, post.comments_count) == (post.actual_likes_count, post.actual_comments_count):
+                        continue
+                    self.stdout.write(
+                        f"Post {post.pk}: likes {post.likes_count} -> {post.actual_likes_count}, "
+                        f"comments {post.comments_count} -> {post.actual_comments_count}"
+                    )
+                    post.likes_count = post.actual_likes_count
+                    post.comments_count = post.actual_comments_count
+                    stale.append(post)
+
+                drifted += len(stale)
+                if stale and not dry_run:
+                    Post.objects.bulk_update(stale, ['likes_count', 'comments_count'])
+        return checked, drifted
+
+    def reconcile_profiles(self, chunk_size, dry_run):
+        # total_likes counts the likes on all of the user's posts.
+        likes = (
+            Like.objects.filter(post__user=OuterRef('user'))
+            .order_by().values('post__user').annotate(total=Count('pk')).values('total')
+        )
+        checked = drifted = 0
+        last_id = 0
+
+        while True:
+            with transaction.atomic():
+                chunk = list(
+                    UserProfile.objects.filter(pk__gt=last_id).order_by('pk')
+                    .annotate(actual_total_likes=Coalesce(Subquery(likes), 0))
+                    .only('id', 'user_id', 'total_likes')[:chunk_size]
+                )
+                if not chunk:
+                    break
+                last_id = chunk[-1].pk
+                checked += len(chunk)
+
+                stale = []
+                for profile in chunk:
+                    if profile.total_likes == profile.actual_total_likes:
+                        continue
+                    self.stdout.write(
+                        f"User {profile.user_id}: total_likes {profile.total_likes} -> {profile.actual_total_likes}"
+                    )
+                    profile.total_likes = profile.actual_total_likes
+                    stale.append(profile)
+
+                drifted += len(stale)
+                if stale and not dry_run:
+                    UserProfile.objects.bulk_update(stale, ['total_likes'])
+        return checked, drifted
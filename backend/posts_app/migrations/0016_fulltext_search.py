@@ -0,0 +1,47 @@
+from django.db import migrations
+
+# (fts table, source table, columns); mirrors posts_app.search.SEARCH_INDEXES
+INDEXES = [
+    ('posts_app_post_fts', 'posts_app_post', ('title', 'content', 'company')),
+    ('posts_app_problem_fts', 'posts_app_problem', ('title', 'description')),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for fts_table, source, columns in INDEXES:
+        if vendor == 'sqlite':
+            selected = ', '.join(f"coalesce({column}, '')" for column in columns)
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} "
+                f"USING fts5({', '.join(columns)}, tokenize='porter unicode61')"
+            )
+            schema_editor.execute(
+                f"INSERT INTO {fts_table} (rowid, {', '.join(columns)}) SELECT id, {selected} FROM {source}"
+            )
+        elif vendor == 'postgresql':
+            document = " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {fts_table}_idx ON {source} "
+                f"USING GIN (to_tsvector('english', {document}))"
+            )
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for fts_table, source, columns in INDEXES:
+        if vendor == 'sqlite':
+            schema_editor.execute(f"DROP TABLE IF EXISTS {fts_table}")
+        elif vendor == 'postgresql':
+            schema_editor.execute(f"DROP INDEX IF EXISTS {fts_table}_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts_app', '0015_post_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-17 12:15
+
+import math
+from datetime import datetime, timedelta, timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_scores(apps, schema_editor):
+    # posts_app.trending.rebuild_scores as of this migration, so trending has
+    # posts from the start instead of waiting for rebuild_trending.
+    Post = apps.get_model('posts_app', 'Post')
+    Like = apps.get_model('posts_app', 'Like')
+    Comment = apps.get_model('posts_app', 'Comment')
+    TrendingScore = apps.get_model('posts_app', 'TrendingScore')
+
+    decay_rate = math.log(2) / timedelta(hours=48).total_seconds()
+    epoch = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def event_score(weight, at):
+        return math.log(weight) + decay_rate * (at - epoch).total_seconds()
+
+    def log_add(a, b):
+        high, low = max(a, b), min(a, b)
+        return high + math.log1p(math.exp(low - high))
+
+    events = {}
+    for model, weight in ((Like, 3.0), (Comment, 2.0)):
+        for post_id, at in model.objects.values_list('post_id', 'created_at').iterator(chunk_size=1000):
+            events.setdefault(post_id, []).append(event_score(weight, at))
+
+    rows = []
+    for post_id, created_at, views in Post.objects.values_list('id', 'created_at', 'views').iterator(chunk_size=1000):
+        score = event_score(1.0, created_at)
+        for event in events.get(post_id, ()):
+            score = log_add(score, event)
+        if views:
+            # View times are not stored; count them at creation time.
+            score = log_add(score, event_score(0.1 * views, created_at))
+        rows.append(TrendingScore(post_id=post_id, score=score))
+    TrendingScore.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts_app', '0016_fulltext_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending_score', serialize=False, to='posts_app.post')),
+                ('score', models.FloatField(db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-17 12:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('posts_app', 'Post')
+    Like = apps.get_model('posts_app', 'Like')
+    Comment = apps.get_model('posts_app', 'Comment')
+
+    def count_of(model):
+        counted = (
+            model.objects.filter(post=OuterRef('pk'))
+            .order_by().values('post').annotate(total=Count('pk')).values('total')
+        )
+        return Coalesce(Subquery(counted), 0)
+
+    Post.objects.update(likes_count=count_of(Like), comments_count=count_of(Comment))
+
+    # The like toggle now moves the author's total_likes by deltas, so start
+    # it from the actual count (it used to hold the last liked post's likes).
+    UserProfile = apps.get_model('posts_app', 'UserProfile')
+    likes = (
+        Like.objects.filter(post__user=OuterRef('user'))
+        .order_by().values('post__user').annotate(total=Count('pk')).values('total')
+    )
+    UserProfile.objects.update(total_likes=Coalesce(Subquery(likes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts_app', '0017_trendingscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
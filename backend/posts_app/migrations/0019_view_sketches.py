@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-17 12:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts_app', '0018_post_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorViewSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(blank=True, null=True)),
+                ('registers', models.BinaryField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_sketches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('author', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PostViewSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(blank=True, null=True)),
+                ('registers', models.BinaryField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_sketches', to='posts_app.post')),
+            ],
+            options={
+                'unique_together': {('post', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-17 12:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_thread_roots(apps, schema_editor):
+    Comment = apps.get_model('posts_app', 'Comment')
+    # Parents are always created before their replies, so walking in id
+    # order sees every parent's root before its children.
+    root_of = {}
+    updates = []
+    for pk, parent_id in Comment.objects.order_by('pk').values_list('pk', 'parent_comment_id').iterator():
+        if parent_id is None:
+            continue
+        root_of[pk] = root_of.get(parent_id, parent_id)
+        updates.append(Comment(pk=pk, thread_root_id=root_of[pk]))
+    Comment.objects.bulk_update(updates, ['thread_root'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts_app', '0021_post_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='thread_root',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_replies', to='posts_app.comment'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['parent_comment', 'created_at', 'id'], name='comment_parent_created_id_idx'),
+        ),
+        migrations.RunPython(backfill_thread_roots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-17 12:37
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+def backfill_excerpts(apps, schema_editor):
+    Post = apps.get_model('posts_app', 'Post')
+    posts = []
+    for post in Post.objects.only('pk', 'content').iterator(chunk_size=1000):
+        post.excerpt = Truncator(' '.join(post.content.split())).chars(280)
+        posts.append(post)
+        if len(posts) >= 1000:
+            Post.objects.bulk_update(posts, ['excerpt'])
+            posts = []
+    Post.objects.bulk_update(posts, ['excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts_app', '0022_comment_thread_root'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=280),
+        ),
+        migrations.RunPython(backfill_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-17 12:40
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_facets(apps, schema_editor):
+    Post = apps.get_model('posts_app', 'Post')
+    InterviewPost = apps.get_model('posts_app', 'InterviewPost')
+    FacetCount = apps.get_model('posts_app', 'FacetCount')
+    public = Post.objects.filter(visibility='public')
+    rows = []
+    for facet in ('company', 'position', 'post_type'):
+        grouped = public.exclude(**{f'{facet}__isnull': True}).exclude(**{facet: ''})
+        for value, count in grouped.order_by().values_list(facet).annotate(total=Count('pk')):
+            rows.append(FacetCount(facet=facet, value=value, count=count))
+    rounds = InterviewPost.objects.filter(post__visibility='public').exclude(round_type='')
+    for value, count in rounds.order_by().values_list('round_type').annotate(total=Count('pk')):
+        rows.append(FacetCount(facet='round_type', value=value, count=count))
+    FacetCount.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts_app', '0023_post_excerpt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=20)),
+                ('value', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('facet', 'value')},
+            },
+        ),
+        migrations.RunPython(backfill_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2 on 2026-10-17 12:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_applications(apps, schema_editor):
+    Application = apps.get_model('posts_app', 'Application')
+    Post = apps.get_model('posts_app', 'Post')
+
+    def key(label):
+        return ' '.join((label or '').split()).casefold()
+
+    applications = {}
+    posts = []
+    interview_posts = Post.objects.filter(post_type='interview').order_by('created_at', 'id')
+    for post in interview_posts.only('id', 'user_id', 'company', 'position').iterator(chunk_size=1000):
+        labels = (post.user_id, key(post.company), key(post.position))
+        if not labels[1] or not labels[2]:
+            continue
+        if labels not in applications:
+            # The earliest post's spelling becomes the display name.
+            applications[labels], _ = Application.objects.get_or_create(
+                user_id=post.user_id, company_key=labels[1], position_key=labels[2],
+                defaults={'company': ' '.join(post.company.split()), 'position': ' '.join(post.position.split())},
+            )
+        post.application = applications[labels]
+        posts.append(post)
+    Post.objects.bulk_update(posts, ['application'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts_app', '0024_facetcount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Application',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('company', models.CharField(max_length=100)),
+                ('position', models.CharField(max_length=255)),
+                ('company_key', models.CharField(max_length=100)),
+                ('position_key', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='applications', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='application',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rounds', to='posts_app.application'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['application', 'interview_date', 'created_at', 'id'], name='post_app_timeline_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='application',
+            unique_together={('user', 'company_key', 'position_key')},
+        ),
+        migrations.RunPython(backfill_applications, migrations.RunPython.noop),
+    ]
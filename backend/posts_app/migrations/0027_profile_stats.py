@@ -0,0 +1,90 @@
+# Generated by Django 5.2 on 2026-10-17 12:58
+
+import django.db.models.deletion
+from django.conf import settings
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_profile_stats(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    UserProfile = apps.get_model('posts_app', 'UserProfile')
+    Post = apps.get_model('posts_app', 'Post')
+    Like = apps.get_model('posts_app', 'Like')
+    ProblemSolveLog = apps.get_model('posts_app', 'ProblemSolveLog')
+    ProfileStats = apps.get_model('posts_app', 'ProfileStats')
+    Follows = UserProfile.followers.through
+
+    rows = {pk: ProfileStats(user_id=pk) for pk in User.objects.values_list('pk', flat=True)}
+    for user_id, total in Follows.objects.values_list('from_userprofile__user').annotate(Count('pk')):
+        rows[user_id].followers_count = total
+    for user_id, total in Follows.objects.values_list('to_userprofile__user').annotate(Count('pk')):
+        rows[user_id].following_count = total
+    for user_id, visibility, total in Post.objects.order_by().values_list('user', 'visibility').annotate(Count('pk')):
+        rows[user_id].posts_count += total
+        if visibility == 'public':
+            rows[user_id].public_posts_count += total
+    for user_id, visibility, total in Like.objects.values_list('post__user', 'post__visibility').annotate(Count('pk')):
+        rows[user_id].likes_count += total
+        if visibility == 'public':
+            rows[user_id].public_likes_count += total
+    for user_id, difficulty, total in ProblemSolveLog.objects.values_list(
+        'user', 'problem__difficulty'
+    ).annotate(Count('pk')):
+        if difficulty in ('easy', 'medium', 'hard'):
+            setattr(rows[user_id], f'solved_{difficulty}', total)
+
+    start = timezone.localdate() - timedelta(days=99)
+    for model, field in ((Post, 'created_at'), (ProblemSolveLog, 'solved_at')):
+        days = (
+            model.objects.filter(**{f'{field}__date__gte': start}).order_by()
+            .annotate(day=TruncDate(field)).values_list('user', 'day').annotate(Count('pk'))
+        )
+        for user_id, day, total in days:
+            activity = rows[user_id].activity
+            activity[day.isoformat()] = activity.get(day.isoformat(), 0) + total
+
+    interview_posts = Post.objects.filter(post_type='interview').order_by('user', '-created_at', '-id')
+    for user_id, post_id, company, position, interview_date, visibility, round_number in interview_posts.values_list(
+        'user', 'id', 'company', 'position', 'interview_date', 'visibility', 'interview_details__round_number'
+    ):
+        rows[user_id].job_records.append({
+            'id': post_id, 'company': company, 'position': position,
+            'interview_date': interview_date.isoformat() if interview_date else None,
+            'round_number': round_number, 'public': visibility == 'public',
+        })
+    ProfileStats.objects.bulk_create(rows.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('posts_app', '0026_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('followers_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('public_posts_count', models.PositiveIntegerField(default=0)),
+                ('likes_count', models.PositiveIntegerField(default=0)),
+                ('public_likes_count', models.PositiveIntegerField(default=0)),
+                ('solved_easy', models.PositiveIntegerField(default=0)),
+                ('solved_medium', models.PositiveIntegerField(default=0)),
+                ('solved_hard', models.PositiveIntegerField(default=0)),
+                ('job_records', models.JSONField(default=list)),
+                ('activity', models.JSONField(default=dict)),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_profile_stats, migrations.RunPython.noop),
+    ]
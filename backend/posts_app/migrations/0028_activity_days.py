@@ -0,0 +1,93 @@
+# Generated by Django 5.2 on 2026-10-17 13:08
+
+import django.db.models.deletion
+from django.conf import settings
+from collections import Counter, defaultdict
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_activity_days(apps, schema_editor):
+    # Every profile starts out on UTC.
+    Post = apps.get_model('posts_app', 'Post')
+    ProblemSolveLog = apps.get_model('posts_app', 'ProblemSolveLog')
+    ActivityDay = apps.get_model('posts_app', 'ActivityDay')
+    ProfileStats = apps.get_model('posts_app', 'ProfileStats')
+    counts = Counter()
+    for model, field in ((Post, 'created_at'), (ProblemSolveLog, 'solved_at')):
+        days = (
+            model.objects.order_by().annotate(day=TruncDate(field, tzinfo=ZoneInfo('UTC')))
+            .values_list('user', 'day').annotate(Count('pk'))
+        )
+        for user_id, day, total in days:
+            counts[user_id, day] += total
+    ActivityDay.objects.bulk_create(
+        [ActivityDay(user_id=user_id, date=day, count=count) for (user_id, day), count in counts.items()],
+        batch_size=1000,
+    )
+
+    active = defaultdict(list)
+    for user_id, day in sorted(counts):
+        active[user_id].append(day)
+    rows = list(ProfileStats.objects.filter(user__in=list(active)))
+    for row in rows:
+        current = 0
+        previous = None
+        for day in active[row.user_id]:
+            current = current + 1 if previous == day - timedelta(days=1) else 1
+            row.longest_streak = max(row.longest_streak, current)
+            previous = day
+        row.current_streak, row.streak_end = current, previous
+    ProfileStats.objects.bulk_update(rows, ['current_streak', 'longest_streak', 'streak_end'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts_app', '0027_profile_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='profilestats',
+            name='activity',
+        ),
+        migrations.AddField(
+            model_name='profilestats',
+            name='current_streak',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profilestats',
+            name='longest_streak',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profilestats',
+            name='streak_end',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='timezone',
+            field=models.CharField(default='UTC', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='ActivityDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_days', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_activity_days, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-17 14:01
+
+from django.db import migrations, models
+
+
+def create_lock_row(apps, schema_editor):
+    apps.get_model('posts_app', 'SubmissionClaimLock').objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts_app', '0030_submissions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionClaimLock',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, editable=False, primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.RunPython(create_lock_row, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,9 @@
+import uuid
+
 from django.db import models
+from django.db.models import Count, Exists, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.text import Truncator
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -13,6 +18,11 @@ class UserProfile(models.Model):
     exp = models.PositiveIntegerField(default=0)
     followers = models.ManyToManyField('self', symmetrical=False, related_name='following', blank=True)
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    # {size: {format: storage name}} thumbnails of the current avatar, filled
+    # in by posts_app.avatars once they have been generated.
+    avatar_variants = models.JSONField(default=dict, blank=True)
+    # IANA name; the activity heatmap's days are in this timezone.
+    timezone = models.CharField(max_length=64, default='UTC')
 
 
     def __str__(self):
@@ -30,6 +40,138 @@ def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
 
+EXCERPT_LENGTH = 280
+# What writing a post earns its author (see PostViewSet.perform_create).
+EXP_PER_POST = 10
+
+
+def make_excerpt(content, length=EXCERPT_LENGTH):
+    """The feed-card preview of a post: whitespace collapsed, cut at ``length`` chars."""
+    return Truncator(' '.join(content.split())).chars(length)
+
+
+def normalize_label(label):
+    """Case- and whitespace-insensitive key for a company or position name."""
+    return ' '.join((label or '').split()).casefold()
+
+
+class ApplicationManager(models.Manager):
+    def for_labels(self, user_id, company, position):
+        """The user's application for this company/position, created on first use."""
+        company_key, position_key = normalize_label(company), normalize_label(position)
+        if not company_key or not position_key:
+            return None
+        application, _ = self.get_or_create(
+            user_id=user_id, company_key=company_key, position_key=position_key,
+            defaults={'company': ' '.join(company.split()), 'position': ' '.join(position.split())},
+        )
+        return application
+
+    def for_label_sets(self, labels):
+        """
+        for_labels() for many (user_id, company, position) at once, in a
+        fixed number of queries: {(user_id, company_key, position_key): application}.
+        The first spelling of each key in ``labels`` is the one stored.
+        """
+        spellings = {}
+        for user_id, company, position in labels:
+            key = (user_id, normalize_label(company), normalize_label(position))
+            if key[1] and key[2]:
+                spellings.setdefault(key, (' '.join(company.split()), ' '.join(position.split())))
+        if not spellings:
+            return {}
+
+        def fetch():
+            # One query over the key columns; pairs not in ``spellings`` are dropped here.
+            candidates = self.filter(
+                user_id__in={key[0] for key in spellings},
+                company_key__in={key[1] for key in spellings},
+                position_key__in={key[2] for key in spellings},
+            )
+            return {
+                key: application for application in candidates
+                if (key := (application.user_id, application.company_key, application.position_key)) in spellings
+            }
+
+        found = fetch()
+        missing = [
+            self.model(user_id=key[0], company_key=key[1], position_key=key[2], company=company, position=position)
+            for key, (company, position) in spellings.items() if key not in found
+        ]
+        if not missing:
+            return found
+        self.bulk_create(missing, ignore_conflicts=True)
+        return fetch()
+
+
+class Application(models.Model):
+    """
+    One user's application to a company/position: the interview round posts
+    that point to it make up its timeline (see posts_app.timeline).
+    ``company``/``position`` keep the first spelling used; the ``_key``
+    columns are what posts are matched on.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='applications')
+    company = models.CharField(max_length=100)
+    position = models.CharField(max_length=255)
+    company_key = models.CharField(max_length=100)
+    position_key = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ApplicationManager()
+
+    class Meta:
+        unique_together = ('user', 'company_key', 'position_key')
+
+    def __str__(self):
+        return f"{self.user.username}: {self.company} / {self.position}"
+
+
+class PostQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create skips save(), so fill in what save() would have.
+        objs = list(objs)
+        interviews = [post for post in objs if post.post_type == 'interview']
+        applications = Application.objects.for_label_sets(
+            (post.user_id, post.company, post.position) for post in interviews
+        )
+        for post in objs:
+            post.excerpt = make_excerpt(post.content)
+            post.application = None
+        for post in interviews:
+            key = (post.user_id, normalize_label(post.company), normalize_label(post.position))
+            post.application = applications.get(key)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def with_actual_counts(self):
+        """
+        Count likes/comments from the relations, for checking the stored
+        likes_count/comments_count columns. Correlated subqueries avoid the
+        likes x comments row fan-out of two Count() joins.
+        """
+        likes = (
+            Like.objects.filter(post=OuterRef('pk'))
+            .order_by().values('post').annotate(total=Count('pk')).values('total')
+        )
+        comments = (
+            Comment.objects.filter(post=OuterRef('pk'))
+            .order_by().values('post').annotate(total=Count('pk')).values('total')
+        )
+        return self.annotate(
+            actual_likes_count=Coalesce(Subquery(likes), 0),
+            actual_comments_count=Coalesce(Subquery(comments), 0),
+        )
+
+    def with_liked(self, user):
+        if user is None or not user.is_authenticated:
+            return self.annotate(liked=Value(False, output_field=models.BooleanField()))
+        return self.annotate(liked=Exists(Like.objects.filter(post=OuterRef('pk'), user=user)))
+
+    def for_feed(self, user):
+        """Everything PostListSerializer reads, in a single query."""
+        return self.select_related('user', 'interview_details').with_liked(user)
+
+
 class Post(models.Model):
     POST_TYPE_CHOICES = [
         ('interview', 'Interview Experience'),
@@ -48,20 +190,183 @@ class Post(models.Model):
     post_type = models.CharField(max_length=20, choices=POST_TYPE_CHOICES)
     title = models.CharField(max_length=255)
     content = models.TextField()
+    # Derived from content on every save; list payloads send this instead.
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True, editable=False)
     visibility = models.CharField(max_length=10, choices=VISIBILITY_CHOICES, default='public')
     company = models.CharField(max_length=100, null=True, blank=True)
     interview_date = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped by edits and by likes/comments; the Last-Modified of the detail page.
+    updated_at = models.DateTimeField(auto_now=True)
     views = models.PositiveIntegerField(default=0)
     position = models.CharField(max_length=255, blank=True, null=True)
+    # Denormalized counters, maintained with F() updates by the like and
+    # add_comment actions; reconcile_post_counters repairs any drift.
+    likes_count = models.PositiveIntegerField(default=0, db_index=True)
+    comments_count = models.PositiveIntegerField(default=0, db_index=True)
+    # Set on save for interview posts with a company and position.
+    application = models.ForeignKey(
+        Application, on_delete=models.SET_NULL, null=True, blank=True, related_name='rounds'
+    )
 
+    objects = PostQuerySet.as_manager()
 
-    
     def __str__(self):
         return self.title
+
+    def resolve_application(self):
+        if self.post_type != 'interview':
+            return None
+        return Application.objects.for_labels(self.user_id, self.company, self.position)
+
+    def save(self, *args, **kwargs):
+        deferred = self.get_deferred_fields()
+        update_fields = kwargs.get('update_fields')
+        if 'content' not in deferred:
+            self.excerpt = make_excerpt(self.content)
+        if update_fields is not None and 'content' in update_fields:
+            kwargs['update_fields'] = update_fields = {*update_fields, 'excerpt'}
+
+        application_fields = {'user', 'user_id', 'post_type', 'company', 'position'}
+        if not application_fields & deferred and (update_fields is None or application_fields & set(update_fields)):
+            self.application = self.resolve_application()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'application'}
+        super().save(*args, **kwargs)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination (see pagination.KeysetPagination) for the
+            # public feed and for a single author's posts.
+            models.Index(fields=['-created_at', '-id'], name='post_created_id_idx'),
+            models.Index(fields=['visibility', '-created_at', '-id'], name='post_vis_created_id_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='post_user_created_id_idx'),
+            # An application's rounds in timeline order (see timeline.py).
+            models.Index(fields=['application', 'interview_date', 'created_at', 'id'], name='post_app_timeline_idx'),
+            # Dashboard filters and sorts, as found by the index_advisor command.
+            models.Index(fields=['visibility', 'company', '-created_at', '-id'], name='post_vis_company_created_idx'),
+            models.Index(fields=['visibility', 'post_type', '-created_at', '-id'], name='post_vis_type_created_idx'),
+            models.Index(fields=['company', 'post_type', '-created_at'], name='post_company_type_created_idx'),
+            models.Index(fields=['visibility', '-likes_count'], name='post_vis_likes_idx'),
+            models.Index(fields=['visibility', '-comments_count'], name='post_vis_comments_idx'),
+        ]
+
+class TrendingScore(models.Model):
+    """
+    Time-decayed popularity of a post, maintained by posts_app.trending.
+
+    ``score`` is stored in log space relative to a fixed epoch, so older
+    rows never need rewriting as time passes and ordering by it is the
+    same as ordering by the decayed score.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='trending_score')
+    score = models.FloatField(db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.post.title}: {self.score:.3f}"
+
+class ViewSketch(models.Model):
+    """
+    HyperLogLog registers (posts_app.hyperloglog) of the distinct viewers
+    seen on ``day``. ``day`` is null for the all-time row that old daily
+    rows are folded into (see unique_views).
+    """
+    day = models.DateField(null=True, blank=True)
+    registers = models.BinaryField()
+
+    class Meta:
+        abstract = True
+
+class PostViewSketch(ViewSketch):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='view_sketches')
+
+    class Meta:
+        unique_together = ('post', 'day')
+
+class AuthorViewSketch(ViewSketch):
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='view_sketches')
+
+    class Meta:
+        unique_together = ('author', 'day')
+
+class FeedItem(models.Model):
+    """
+    A post delivered to a follower's inbox (fan-out on write, see feed.py).
+    ``created_at`` copies the post's so the inbox is ordered and paginated
+    without joining Post.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_items')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='feed_items')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='feeditem_owner_created_idx'),
+            models.Index(fields=['owner', 'author'], name='feeditem_owner_author_idx'),
+        ]
+
+class FacetCount(models.Model):
+    """
+    Number of public posts per filter value (company, position, post_type,
+    round_type), kept up to date by posts_app.facets.
+    """
+    facet = models.CharField(max_length=20)
+    value = models.CharField(max_length=255)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('facet', 'value')
+
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
+
+class ProfileStats(models.Model):
+    """
+    The figures on a user's profile page, kept up to date by
+    posts_app.profile_stats. Post and like counters come in pairs: the
+    ``public_`` one only covers public posts and is what other users see.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    posts_count = models.PositiveIntegerField(default=0)
+    public_posts_count = models.PositiveIntegerField(default=0)
+    likes_count = models.PositiveIntegerField(default=0)
+    public_likes_count = models.PositiveIntegerField(default=0)
+    solved_easy = models.PositiveIntegerField(default=0)
+    solved_medium = models.PositiveIntegerField(default=0)
+    solved_hard = models.PositiveIntegerField(default=0)
+    # Interview posts, newest first, each with a 'public' flag.
+    job_records = models.JSONField(default=list)
+    # The latest run of consecutive ActivityDay rows ends on ``streak_end``
+    # (see posts_app.activity).
+    current_streak = models.PositiveIntegerField(default=0)
+    longest_streak = models.PositiveIntegerField(default=0)
+    streak_end = models.DateField(null=True, blank=True)
+    # Bumped by every change; the profile ETag is built from it.
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Stats for {self.user.username}"
+
+class ActivityDay(models.Model):
+    """
+    Posts plus problem solves by a user on one day of their timezone, kept
+    up to date by posts_app.activity; the profile heatmap reads these.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_days')
+    date = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'date')
+
+    def __str__(self):
+        return f"{self.user.username} {self.date}: {self.count}"
 
 class InterviewPost(models.Model):
     STATUS_CHOICES = [
@@ -92,6 +397,9 @@ class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
     parent_comment = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    # Top-level comment of the thread (null for top-level comments), so a
+    # whole thread is fetched in one indexed query (see comment_tree.py).
+    thread_root = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='thread_replies')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -100,6 +408,10 @@ class Comment(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_id_idx'),
+            models.Index(fields=['parent_comment', 'created_at', 'id'], name='comment_parent_created_id_idx'),
+        ]
 
 class Like(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -139,4 +451,47 @@ class TestCase(models.Model):
     expected_output = models.JSONField() 
 
     def __str__(self):
-        return f"TestCase for {self.problem.title}"
\ No newline at end of file
+        return f"TestCase for {self.problem.title}"
+
+
+class Submission(models.Model):
+    """
+    A code_verification run: queued, then executed in the background by
+    posts_app.submissions.
+    """
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE, related_name='submissions')
+    # Who the job is scheduled fairly among: the user, or an anonymous client's address.
+    owner = models.CharField(max_length=64)
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE)
+    code = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # {'output', 'passed'} once done, {'error'} if it failed.
+    result = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The queue, oldest first (see submissions.claim).
+            models.Index(fields=['status', 'created_at'], name='submission_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner} {self.problem_id}: {self.status}"
+
+
+class SubmissionClaimLock(models.Model):
+    """
+    A single row that submissions._claim locks, so claims run one at a time
+    and the concurrency caps they check can't be passed by two at once.
+    """
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1, editable=False)
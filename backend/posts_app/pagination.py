@@ -0,0 +1,195 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on (time_field, tiebreak_field), by default
+    (created_at, id).
+
+    The cursor is the position of the last row on the page, so every page is
+    an index range scan with no COUNT(*) and no OFFSET, however deep the
+    client has scrolled. Only forward paging is supported.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    descending = True
+    time_field = 'created_at'
+    tiebreak_field = 'id'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, obj):
+        raw = f'{getattr(obj, self.time_field).isoformat()}|{getattr(obj, self.tiebreak_field)}'
+        return urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, pk = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            return datetime.fromisoformat(created_at), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_ordering(self):
+        if self.descending:
+            return (f'-{self.time_field}', f'-{self.tiebreak_field}')
+        return (self.time_field, self.tiebreak_field)
+
+    def position_filter(self, created_at, pk):
+        direction = 'lt' if self.descending else 'gt'
+        return (
+            Q(**{f'{self.time_field}__{direction}': created_at})
+            | Q(**{self.time_field: created_at, f'{self.tiebreak_field}__{direction}': pk})
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        def fetch(position, limit):
+            ordered = queryset.order_by(*self.get_ordering())
+            if position is not None:
+                ordered = ordered.filter(self.position_filter(*position))
+            return list(ordered[:limit])
+
+        return self.paginate_rows(fetch, request)
+
+    def paginate_rows(self, fetch, request):
+        """
+        Paginate any source ordered like this paginator. ``fetch(position,
+        limit)`` returns up to ``limit`` rows after ``position`` (None for the
+        first page).
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        rows = fetch(self.decode_cursor(request), page_size + 1)
+        page = rows[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if len(rows) > page_size else None
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
+
+
+class PostPagination(PageNumberPagination):
+    """
+    Page-number pagination by default; clients opt in to keyset paging per
+    request with ``?pagination=cursor`` (and then follow ``next``).
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    mode_query_param = 'pagination'
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def check_cursor_ordering(self, request, view):
+        """
+        Keyset pages are always newest first, so refuse (400) a request whose
+        ``ordering``, or search relevance, would put the rows in another order.
+        """
+        newest_first = KeysetPagination().get_ordering()
+        backends = getattr(view, 'filter_backends', [])
+        for backend in backends:
+            if issubclass(backend, OrderingFilter) and backend.ordering_param in request.query_params:
+                fields = [field.strip() for field in request.query_params[backend.ordering_param].split(',')]
+                if tuple(fields) != newest_first[:len(fields)]:
+                    raise ValidationError({
+                        backend.ordering_param: f"Cursor pagination only supports ordering={newest_first[0]}."
+                    })
+                return  # an explicit ordering also takes the place of search relevance
+        for backend in backends:
+            if issubclass(backend, SearchFilter) and request.query_params.get(backend.search_param, '').strip():
+                raise ValidationError({
+                    backend.search_param: f"Search results are ordered by relevance; cursor pagination "
+                                          f"needs ordering={newest_first[0]}.",
+                })
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_cursor(request):
+            self.check_cursor_ordering(request, view)
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class LeaderboardPagination(PageNumberPagination):
+    """Pages of a leaderboards.Board; the count is the board's length, so costs nothing."""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class CommentPagination(KeysetPagination):
+    """Oldest-first keyset pagination for comment threads."""
+    page_size = 20
+    descending = False
+
+
+class FeedPagination(KeysetPagination):
+    """Newest-first keyset pagination over FeedItem rows (see feed.py)."""
+    tiebreak_field = 'post_id'
+
+
+class FollowPagination(KeysetPagination):
+    """
+    Newest-first pagination of a follower or following list. Follows have
+    no timestamp, so the cursor is the id of the follow row alone.
+    """
+    page_size = 20
+
+    def encode_cursor(self, obj):
+        return urlsafe_b64encode(str(obj.pk).encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            return (int(urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')),)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_ordering(self):
+        return ('-pk',)
+
+    def position_filter(self, pk):
+        return Q(pk__lt=pk)
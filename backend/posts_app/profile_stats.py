@@ -0,0 +1,380 @@
+"""
+Profile page figures kept in the ProfileStats table.
+
+Follows, likes, posts and problem solves adjust the affected users' rows as
+they happen: counters with F() updates, the job records with a locked
+read-modify-write of the row's JSON. A profile is then one row read (plus
+the activity heatmap's range read, see activity.py) instead of a dozen
+aggregates over the user's posts, likes and solves. Comments don't feed any
+profile figure, so they have no receivers.
+
+Post and like counters are kept twice, for the owner and for everyone else
+(public posts only); job records carry a ``public`` flag and are filtered
+when read. rebuild() recomputes rows from the source tables, and builds the
+row of a user who has none yet (one created by bulk_io, say) on first read.
+"""
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import models, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import activity
+from .models import InterviewPost, Like, Post, Problem, ProblemSolveLog, ProfileStats, UserProfile
+
+CHUNK_SIZE = 500
+DIFFICULTIES = {'easy': 'solved_easy', 'medium': 'solved_medium', 'hard': 'solved_hard'}
+ROUND_NAMES = {
+    0: "Application",
+    1: "Online Assessment",
+    2: "Technical Interview",
+    3: "Behavioral Interview",
+    4: "System Design",
+    5: "HR Interview",
+    6: "Team Match",
+}
+# Post fields a job record is built from.
+JOB_FIELDS = ('post_type', 'company', 'position', 'interview_date', 'visibility')
+
+Follows = UserProfile.followers.through
+
+
+def adjust(user_id, **changes):
+    """Add ``changes`` ({counter: delta}) to a user's row, never taking a counter below zero."""
+    updates = {
+        field: F(field) + change if change > 0
+        else Greatest(F(field) + change, 0, output_field=models.PositiveIntegerField())
+        for field, change in changes.items() if change
+    }
+    if updates:
+        # A missing row is built, from data that already includes the change, on first read.
+        ProfileStats.objects.filter(user_id=user_id).update(**updates, version=F('version') + 1)
+
+
+def _edit(user_id, change):
+    """Apply ``change(stats)``, which replaces stats.job_records, under a row lock."""
+    with transaction.atomic():
+        stats = ProfileStats.objects.select_for_update().filter(user_id=user_id).only('job_records').first()
+        if stats is None:
+            return
+        records = stats.job_records
+        change(stats)
+        if stats.job_records != records:
+            ProfileStats.objects.filter(user_id=user_id).update(
+                job_records=stats.job_records, version=F('version') + 1
+            )
+
+
+def _job_record(post_id, company, position, interview_date, visibility, round_number=None):
+    return {
+        'id': post_id,
+        'company': company,
+        'position': position,
+        'interview_date': interview_date.isoformat() if interview_date else None,
+        'round_number': round_number,
+        'public': visibility == 'public',
+    }
+
+
+def _post_job_record(post, round_number=None):
+    return _job_record(post.pk, post.company, post.position, post.interview_date, post.visibility, round_number)
+
+
+def _job_records(user_id):
+    """A user's job records as rebuild() computes them (newest first)."""
+    posts = Post.objects.filter(user_id=user_id, post_type='interview').order_by('-created_at', '-id')
+    return [
+        _job_record(*row)
+        for row in posts.values_list(
+            'id', 'company', 'position', 'interview_date', 'visibility', 'interview_details__round_number'
+        )
+    ]
+
+
+def _add_job_record(stats, post):
+    stats.job_records = [_post_job_record(post), *stats.job_records]
+
+
+def _drop_job_record(stats, post_id):
+    stats.job_records = [record for record in stats.job_records if record['id'] != post_id]
+
+
+def _replace_job_record(stats, post):
+    records = stats.job_records
+    existing = next((record for record in records if record['id'] == post.pk), None)
+    if post.post_type != 'interview':
+        _drop_job_record(stats, post.pk)
+    elif existing is None:
+        # A post that just became an interview post: its place in the list
+        # depends on created_at, which the records don't keep.
+        stats.job_records = _job_records(post.user_id)
+    else:
+        updated = _post_job_record(post, existing['round_number'])
+        stats.job_records = [updated if record is existing else record for record in records]
+
+
+def _set_round_number(stats, post_id, round_number):
+    stats.job_records = [
+        {**record, 'round_number': round_number} if record['id'] == post_id else record
+        for record in stats.job_records
+    ]
+
+
+# Reading
+
+def for_user(user):
+    """The user's ProfileStats row, built first if there isn't one yet."""
+    try:
+        return user.stats
+    except ProfileStats.DoesNotExist:
+        rebuild([user.pk])
+        return ProfileStats.objects.get(user=user)
+
+
+def visible_job_records(stats, is_self):
+    return [record for record in stats.job_records if is_self or record['public']]
+
+
+def job_status(stats, is_self):
+    """[{'name', 'value'}] interview rounds reached, counted by round number."""
+    # Oldest first, the order the rounds were counted in before.
+    rounds = Counter(
+        record['round_number'] for record in reversed(visible_job_records(stats, is_self))
+        if record['round_number'] is not None
+    )
+    return [{'name': ROUND_NAMES.get(key, f"Round {key}"), 'value': value} for key, value in rounds.items()]
+
+
+def job_records(stats, is_self):
+    return [
+        {
+            'id': record['id'],
+            'company': record['company'],
+            'position': record['position'],
+            'interview_date': record['interview_date'],
+            'interview_details': {'round_number': record['round_number']},
+        }
+        for record in visible_job_records(stats, is_self)
+    ]
+
+
+def coding_status(stats):
+    return [
+        {'name': difficulty.capitalize(), 'value': getattr(stats, field)}
+        for difficulty, field in DIFFICULTIES.items()
+    ]
+
+
+# Rebuilding
+
+def rebuild(user_ids=None, chunk_size=CHUNK_SIZE):
+    """Recompute the rows of ``user_ids`` (default: every user) from the source tables."""
+    if user_ids is None:
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), chunk_size):
+        _rebuild_chunk(user_ids[start:start + chunk_size])
+    return len(user_ids)
+
+
+def _rebuild_chunk(user_ids):
+    rows = {pk: ProfileStats(user_id=pk) for pk in User.objects.filter(pk__in=user_ids).values_list('pk', flat=True)}
+    ids = list(rows)
+
+    follows = Follows.objects.order_by()
+    for user_id, total in follows.filter(from_userprofile__user__in=ids).values_list(
+        'from_userprofile__user'
+    ).annotate(Count('pk')):
+        rows[user_id].followers_count = total
+    for user_id, total in follows.filter(to_userprofile__user__in=ids).values_list(
+        'to_userprofile__user'
+    ).annotate(Count('pk')):
+        rows[user_id].following_count = total
+
+    for user_id, visibility, total in Post.objects.filter(user__in=ids).order_by().values_list(
+        'user', 'visibility'
+    ).annotate(Count('pk')):
+        rows[user_id].posts_count += total
+        if visibility == 'public':
+            rows[user_id].public_posts_count += total
+    for user_id, visibility, total in Like.objects.filter(post__user__in=ids).order_by().values_list(
+        'post__user', 'post__visibility'
+    ).annotate(Count('pk')):
+        rows[user_id].likes_count += total
+        if visibility == 'public':
+            rows[user_id].public_likes_count += total
+
+    for user_id, difficulty, total in ProblemSolveLog.objects.filter(user__in=ids).order_by().values_list(
+        'user', 'problem__difficulty'
+    ).annotate(Count('pk')):
+        if difficulty in DIFFICULTIES:
+            setattr(rows[user_id], DIFFICULTIES[difficulty], total)
+
+    interview_posts = Post.objects.filter(user__in=ids, post_type='interview').order_by('user', '-created_at', '-id')
+    for user_id, *fields in interview_posts.values_list(
+        'user', 'id', 'company', 'position', 'interview_date', 'visibility', 'interview_details__round_number'
+    ):
+        rows[user_id].job_records.append(_job_record(*fields))
+
+    # Keep versions increasing so no earlier ETag can match a rebuilt row.
+    versions = dict(ProfileStats.objects.filter(user__in=ids).values_list('user', 'version'))
+    for user_id, row in rows.items():
+        row.version = versions.get(user_id, 0) + 1
+    ProfileStats.objects.bulk_create(
+        rows.values(), update_conflicts=True, unique_fields=['user'],
+        update_fields=[
+            field.name for field in ProfileStats._meta.concrete_fields
+            if not field.primary_key and field.name not in activity.STREAK_FIELDS
+        ],
+    )
+    activity.rebuild(ids)
+
+
+# Receivers
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ProfileStats.objects.create(user=instance)
+
+
+def _pairs(follows):
+    return list(follows.values_list('from_userprofile', 'to_userprofile'))
+
+
+# Django sends no delete signals for the rows of an auto-created through
+# table, so removals are counted from m2m_changed and deleted profiles.
+@receiver(m2m_changed, sender=Follows)
+def follows_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # (followed, follower) profile pks: the forward side is ``followers``.
+    side, other = ('to_userprofile', 'from_userprofile') if reverse else ('from_userprofile', 'to_userprofile')
+    if action == 'post_add' and pk_set:
+        pairs = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+        _followed(pairs, 1)
+    elif action == 'pre_remove' and pk_set:
+        instance._follows_removed = _pairs(Follows.objects.filter(**{side: instance.pk, f'{other}__in': pk_set}))
+    elif action == 'pre_clear':
+        instance._follows_removed = _pairs(Follows.objects.filter(**{side: instance.pk}))
+    elif action in ('post_remove', 'post_clear'):
+        _followed(instance.__dict__.pop('_follows_removed', []), -1)
+
+
+@receiver(pre_delete, sender=UserProfile)
+def profile_deleted(sender, instance, **kwargs):
+    _followed(_pairs(Follows.objects.filter(Q(from_userprofile=instance) | Q(to_userprofile=instance))), -1)
+
+
+def _followed(pairs, change):
+    if not pairs:
+        return
+    users = dict(
+        UserProfile.objects.filter(pk__in={pk for pair in pairs for pk in pair}).values_list('pk', 'user_id')
+    )
+    for user_id, total in Counter(users.get(followed) for followed, _ in pairs).items():
+        if user_id is not None:
+            adjust(user_id, followers_count=change * total)
+    for user_id, total in Counter(users.get(follower) for _, follower in pairs).items():
+        if user_id is not None:
+            adjust(user_id, following_count=change * total)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_stats(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not set(JOB_FIELDS) & set(update_fields):
+        return
+    instance._stats_before = Post.objects.filter(pk=instance.pk).values(*JOB_FIELDS).first()
+
+
+@receiver(post_save, sender=Post)
+def post_stats_changed(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    public = instance.visibility == 'public'
+    if created:
+        adjust(instance.user_id, posts_count=1, public_posts_count=int(public))
+        if instance.post_type == 'interview':
+            # Its round is saved afterwards; see round_stats_changed.
+            _edit(instance.user_id, lambda stats: _add_job_record(stats, instance))
+        return
+
+    before = instance.__dict__.pop('_stats_before', None)
+    if before is None:
+        return
+    moved = int(public) - int(before['visibility'] == 'public')
+    if moved:
+        likes = Like.objects.filter(post=instance).count()
+        adjust(instance.user_id, public_posts_count=moved, public_likes_count=moved * likes)
+    if 'interview' in (before['post_type'], instance.post_type) and any(
+        before[field] != getattr(instance, field) for field in JOB_FIELDS
+    ):
+        _edit(instance.user_id, lambda stats: _replace_job_record(stats, instance))
+
+
+@receiver(post_delete, sender=Post)
+def post_stats_deleted(sender, instance, **kwargs):
+    # The cascade has already taken its likes off through like_deleted.
+    adjust(instance.user_id, posts_count=-1, public_posts_count=-int(instance.visibility == 'public'))
+    if instance.post_type == 'interview':
+        _edit(instance.user_id, lambda stats: _drop_job_record(stats, instance.pk))
+
+
+def _liked(like, change):
+    post = Post.objects.filter(pk=like.post_id).values('user_id', 'visibility').first()
+    if post is not None:
+        adjust(
+            post['user_id'], likes_count=change,
+            public_likes_count=change if post['visibility'] == 'public' else 0,
+        )
+
+
+@receiver(post_save, sender=Like)
+def like_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _liked(instance, 1)
+
+
+@receiver(post_delete, sender=Like)
+def like_deleted(sender, instance, **kwargs):
+    _liked(instance, -1)
+
+
+def _round_owner(post_id):
+    return Post.objects.filter(pk=post_id).values_list('user_id', flat=True).first()
+
+
+@receiver(post_save, sender=InterviewPost)
+def round_stats_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    user_id = _round_owner(instance.post_id)
+    if user_id is not None:
+        _edit(user_id, lambda stats: _set_round_number(stats, instance.post_id, instance.round_number))
+
+
+@receiver(post_delete, sender=InterviewPost)
+def round_stats_deleted(sender, instance, **kwargs):
+    user_id = _round_owner(instance.post_id)
+    if user_id is not None:
+        _edit(user_id, lambda stats: _set_round_number(stats, instance.post_id, None))
+
+
+def _solved(log, change):
+    difficulty = Problem.objects.filter(pk=log.problem_id).values_list('difficulty', flat=True).first()
+    if difficulty in DIFFICULTIES:
+        adjust(log.user_id, **{DIFFICULTIES[difficulty]: change})
+
+
+@receiver(post_save, sender=ProblemSolveLog)
+def solve_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _solved(instance, 1)
+
+
+@receiver(post_delete, sender=ProblemSolveLog)
+def solve_deleted(sender, instance, **kwargs):
+    _solved(instance, -1)
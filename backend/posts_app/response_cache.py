@@ -0,0 +1,136 @@
+"""
+Response cache for anonymous post list/trending/detail requests, and for
+the facet counts, which are the same for every user.
+
+Entries are keyed by the normalized query string plus generation counters
+that writes bump, so an entry is never served after something it depends
+on has changed and nothing relies on a TTL:
+
+- ``feed``: any post, interview round, like or comment write (lists,
+  trending).
+- ``trending``: each view-counter flush, which moves trending scores.
+- ``post:<id>``: writes to that post, its rounds, likes and comments.
+- ``author:<id>``: any post by that author (the detail timeline).
+- ``profiles``: user/profile writes (usernames and avatars in payloads).
+- ``facets``: any change to the FacetCount rollup (see facets.py).
+
+Hits and misses are counted per endpoint; see ``stats()``.
+"""
+from hashlib import sha1
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .models import Comment, InterviewPost, Like, Post, UserProfile
+
+CACHE_ALIAS = 'default'
+PREFIX = 'respcache'
+ENDPOINTS = ('list', 'trending', 'detail', 'facets')
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def bump(*generations):
+    cache = _cache()
+    for name in generations:
+        key = f'{PREFIX}:gen:{name}'
+        # add() is a no-op when the key exists; incr() then moves it on.
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def _generations(names):
+    keys = [f'{PREFIX}:gen:{name}' for name in names]
+    values = _cache().get_many(keys)
+    return '.'.join(str(values.get(key, 0)) for key in keys)
+
+
+def generation(name):
+    """The current value of generation ``name``, for validators that depend on it."""
+    return _generations([name])
+
+
+def _count(endpoint, outcome):
+    cache = _cache()
+    key = f'{PREFIX}:stats:{endpoint}:{outcome}'
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def stats():
+    cache = _cache()
+    keys = [f'{PREFIX}:stats:{endpoint}:{outcome}' for endpoint in ENDPOINTS for outcome in ('hit', 'miss')]
+    values = cache.get_many(keys)
+    result = {}
+    for endpoint in ENDPOINTS:
+        hits = values.get(f'{PREFIX}:stats:{endpoint}:hit', 0)
+        misses = values.get(f'{PREFIX}:stats:{endpoint}:miss', 0)
+        total = hits + misses
+        result[endpoint] = {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else None}
+    return result
+
+
+def is_cacheable(request, shared=False):
+    return request.method == 'GET' and (shared or not request.user.is_authenticated)
+
+
+def cached_response(request, endpoint, generations, build, shared=False):
+    """
+    Return the cached rendering of ``build()`` for an anonymous request, or
+    call it and cache the result if it was a 200. ``shared`` responses don't
+    depend on the user and are cached for everyone.
+    """
+    if not is_cacheable(request, shared):
+        return build()
+
+    params = sorted(request.query_params.lists())
+    digest = sha1(repr((request.get_host(), request.path, params)).encode('utf-8')).hexdigest()
+    key = f'{PREFIX}:{endpoint}:{_generations(generations)}:{digest}'
+
+    cache = _cache()
+    content = cache.get(key)
+    if content is not None:
+        _count(endpoint, 'hit')
+        return HttpResponse(content, content_type='application/json')
+
+    _count(endpoint, 'miss')
+    response = build()
+    if response.status_code == 200:
+        cache.set(key, JSONRenderer().render(response.data), timeout=None)
+    return response
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    bump('feed', f'post:{instance.pk}', f'author:{instance.user_id}')
+
+
+@receiver(post_save, sender=InterviewPost)
+@receiver(post_delete, sender=InterviewPost)
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def post_child_changed(sender, instance, **kwargs):
+    bump('feed', f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=UserProfile)
+def profile_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return  # logins don't change any cached payload
+    bump('profiles')
@@ -0,0 +1,361 @@
+"""
+Warm pool of code sandbox workers for code_verification.
+
+A cold ``docker run --rm code-sandbox`` per submission spends most of its
+time creating the container and starting Python. Instead each process keeps
+SANDBOX_POOL_SIZE workers started ahead of time: ``run_user_code.py
+--serve`` in a network-less, read-only container, answering one JSON job
+per line on stdin with one JSON result line on stdout. A worker forks a
+fresh child for every job, so jobs don't see each other's state, and is
+retired after SANDBOX_MAX_USES jobs.
+
+How workers are started is up to the SANDBOX_RUNNER class (a dotted path):
+DockerRunner in production, LocalRunner (a plain subprocess with no
+isolation at all) for tests and development. A maintenance thread replaces
+retired and dead workers, and pings idle ones every SANDBOX_HEALTH_INTERVAL
+seconds.
+"""
+import atexit
+import json
+import logging
+import os
+import select
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+START_TIMEOUT = 30
+PING_TIMEOUT = 5
+# Beyond the job timeout, how long a worker may take to answer before it is
+# presumed hung and destroyed.
+REPLY_GRACE = 5
+
+
+class SandboxError(Exception):
+    """No worker could run the job: it could not be started, or died or hung."""
+
+
+class SandboxTimeout(SandboxError):
+    """The job ran past SANDBOX_TIMEOUT and was killed; its worker lives on."""
+
+
+def job_timeout():
+    return getattr(settings, 'SANDBOX_TIMEOUT', 10)
+
+
+def pool_size():
+    return getattr(settings, 'SANDBOX_POOL_SIZE', 2)
+
+
+def max_uses():
+    return getattr(settings, 'SANDBOX_MAX_USES', 20)
+
+
+def health_interval():
+    return getattr(settings, 'SANDBOX_HEALTH_INTERVAL', 30)
+
+
+def acquire_timeout():
+    return getattr(settings, 'SANDBOX_ACQUIRE_TIMEOUT', 10)
+
+
+class Runner:
+    """Starts and destroys workers; a worker speaks the run_user_code.py --serve protocol."""
+
+    def command(self, name):
+        raise NotImplementedError
+
+    def destroy(self, name, process):
+        process.kill()
+
+
+class DockerRunner(Runner):
+    def command(self, name):
+        return [
+            'docker', 'run', '-i', '--rm', '--name', name,
+            '--network', 'none', '--memory', '128m', '--cpus', '0.5',
+            '--pids-limit', '64', '--read-only',
+            '--security-opt', 'no-new-privileges', '--user', '1000:1000',
+            getattr(settings, 'SANDBOX_IMAGE', 'code-sandbox'),
+            'python', 'run_user_code.py', '--serve', '--timeout', str(job_timeout()),
+        ]
+
+    def destroy(self, name, process):
+        # Killing the docker client would leave the container running.
+        subprocess.run(['docker', 'rm', '-f', name], capture_output=True, timeout=30)
+        process.kill()
+
+
+class LocalRunner(Runner):
+    """Workers as local processes. They are not isolated in any way: tests and development only."""
+
+    def command(self, name):
+        script = getattr(settings, 'SANDBOX_SCRIPT', os.path.join(settings.BASE_DIR, 'docker', 'run_user_code.py'))
+        return [sys.executable, script, '--serve', '--timeout', str(job_timeout())]
+
+
+class Worker:
+    def __init__(self, runner):
+        self.runner = runner
+        self.name = f'sandbox-{uuid.uuid4().hex[:12]}'
+        self.uses = 0
+        try:
+            self.process = subprocess.Popen(
+                runner.command(self.name), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL, text=True, bufsize=1,
+            )
+        except OSError as e:
+            raise SandboxError(f"Could not start a sandbox worker: {e}") from e
+        try:
+            if not self._receive(START_TIMEOUT).get('ready'):
+                raise SandboxError("Sandbox worker did not start")
+        except SandboxError:
+            self.destroy()
+            raise
+        self.checked_at = time.monotonic()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def _receive(self, timeout):
+        stdout = self.process.stdout
+        if not select.select([stdout], [], [], timeout)[0]:
+            raise SandboxError("Sandbox worker did not answer in time")
+        line = stdout.readline()
+        if not line:
+            raise SandboxError("Sandbox worker exited")
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            raise SandboxError("Sandbox worker sent a malformed reply") from e
+
+    def request(self, message, timeout):
+        try:
+            self.process.stdin.write(json.dumps(message) + '\n')
+            self.process.stdin.flush()
+        except (OSError, ValueError) as e:
+            raise SandboxError("Sandbox worker exited") from e
+        return self._receive(timeout)
+
+    def run(self, job):
+        self.uses += 1
+        reply = self.request(job, job_timeout() + REPLY_GRACE)
+        if reply.pop('timed_out', False):
+            raise SandboxTimeout(reply.get('error', "Code execution timed out"))
+        return reply
+
+    def healthy(self):
+        if self.process.poll() is not None:
+            return False
+        try:
+            alive = bool(self.request({'ping': True}, PING_TIMEOUT).get('pong'))
+        except SandboxError:
+            return False
+        self.checked_at = time.monotonic()
+        return alive
+
+    def destroy(self):
+        try:
+            self.runner.destroy(self.name, self.process)
+        except (OSError, subprocess.SubprocessError):
+            logger.exception("Destroying sandbox worker %s failed", self.name)
+        for pipe in (self.process.stdin, self.process.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+        self.process.wait()
+
+
+class Pool:
+    """
+    Up to ``size`` workers. run() takes an idle one, or starts one if the
+    pool is short, or waits for one to come back.
+    """
+
+    def __init__(self, runner, size, max_uses, health_interval):
+        self.runner = runner
+        self.size, self.max_uses, self.health_interval = size, max_uses, health_interval
+        self.idle = deque()
+        self.retiring = []
+        self.total = 0  # idle, busy and starting
+        self.started = self.retired = 0
+        self.closed = False
+        self.changed = threading.Condition()
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self._maintain, name='sandbox-pool', daemon=True)
+        self.thread.start()
+
+    def run(self, job, wait=None):
+        """The run_user_code.py result of ``job``; raises SandboxError and SandboxTimeout."""
+        worker = self._acquire(acquire_timeout() if wait is None else wait)
+        try:
+            result = worker.run(job)
+        except SandboxTimeout:
+            self._release(worker)
+            raise
+        except SandboxError:
+            self._retire(worker)
+            raise
+        self._release(worker)
+        return result
+
+    def resize(self, size):
+        with self.changed:
+            self.size = size
+        self.wake.set()
+
+    def stats(self):
+        with self.changed:
+            return {
+                'size': self.size, 'idle': len(self.idle), 'busy': self.total - len(self.idle),
+                'started': self.started, 'retired': self.retired,
+            }
+
+    def close(self):
+        with self.changed:
+            self.closed = True
+            workers, self.idle = list(self.idle), deque()
+            self.total -= len(workers)
+            self.changed.notify_all()
+        self.wake.set()
+        self.thread.join()
+        for worker in workers:
+            worker.destroy()
+
+    def _start(self):
+        """A new worker; the caller has already counted it in total."""
+        try:
+            worker = Worker(self.runner)
+        except SandboxError:
+            with self.changed:
+                self.total -= 1
+                self.changed.notify()
+            raise
+        with self.changed:
+            self.started += 1
+        return worker
+
+    def _acquire(self, wait):
+        deadline = time.monotonic() + wait
+        with self.changed:
+            while not self.idle:
+                if self.closed:
+                    raise SandboxError("The sandbox pool is closed")
+                if self.total < self.size:
+                    self.total += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise SandboxError("All sandbox workers are busy")
+                self.changed.wait(remaining)
+            else:
+                return self.idle.popleft()
+        return self._start()  # cold start: the pool is short of workers
+
+    def _release(self, worker):
+        with self.changed:
+            keep = (
+                not self.closed and worker.uses < self.max_uses
+                and self.total <= self.size and worker.process.poll() is None
+            )
+            if keep:
+                self.idle.append(worker)
+                self.changed.notify()
+                return
+        self._retire(worker)
+
+    def _retire(self, worker):
+        # Destroyed, and replaced, on the maintenance thread rather than the request's.
+        with self.changed:
+            self.total -= 1
+            self.retired += 1
+            closed = self.closed
+            if not closed:
+                self.retiring.append(worker)
+            self.changed.notify()
+        if closed:
+            worker.destroy()
+        self.wake.set()
+
+    def _maintain(self):
+        while True:
+            self.wake.wait(self.health_interval)
+            self.wake.clear()
+            with self.changed:
+                retiring, self.retiring = self.retiring, []
+            for worker in retiring:
+                worker.destroy()
+            if self.closed:
+                return
+            self._check_idle()
+            self._fill()
+
+    def _check_idle(self):
+        now = time.monotonic()
+        with self.changed:
+            due = [worker for worker in self.idle if now - worker.checked_at >= self.health_interval]
+            for worker in due:
+                self.idle.remove(worker)
+        for worker in due:
+            if worker.healthy():
+                with self.changed:
+                    self.idle.append(worker)
+                    self.changed.notify()
+            else:
+                logger.warning("Replacing unhealthy sandbox worker %s", worker.name)
+                self._retire(worker)
+
+    def _fill(self):
+        while True:
+            with self.changed:
+                if self.closed or self.total >= self.size:
+                    return
+                self.total += 1
+            try:
+                worker = self._start()
+            except SandboxError:
+                logger.exception("Starting a sandbox worker failed")
+                return
+            with self.changed:
+                self.idle.append(worker)
+                self.changed.notify()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    """This process's Pool, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = Pool(
+                import_string(getattr(settings, 'SANDBOX_RUNNER', 'posts_app.sandbox.DockerRunner'))(),
+                pool_size(), max_uses(), health_interval(),
+            )
+            _pool.wake.set()  # warm it up straight away
+        return _pool
+
+
+def run(job):
+    return pool().run(job)
+
+
+@atexit.register
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
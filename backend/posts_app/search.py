@@ -0,0 +1,136 @@
+"""
+Full-text search for posts and problems.
+
+SQLite keeps an FTS5 table per model (rowid = primary key) ranked with
+bm25(); PostgreSQL uses a GIN index over to_tsvector(...) ranked with
+ts_rank_cd(). Both are created in migration 0016 and kept in sync here on
+save/delete. Other backends fall back to DRF's icontains SearchFilter.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework import filters
+
+from .models import Post, Problem
+
+# model -> (fts table, indexed columns)
+SEARCH_INDEXES = {
+    Post: ('posts_app_post_fts', ('title', 'content', 'company')),
+    Problem: ('posts_app_problem_fts', ('title', 'description')),
+}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(text):
+    return TOKEN_RE.findall(text or '')
+
+
+def fts5_query(terms):
+    # Quote every term so user input can never be parsed as FTS5 syntax;
+    # the last term is a prefix match for search-as-you-type.
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def tsvector_sql(table, columns):
+    document = " || ' ' || ".join(f"coalesce({table}.{column}, '')" for column in columns)
+    return f"to_tsvector('english', {document})"
+
+
+def index_instance(instance):
+    if type(instance) not in SEARCH_INDEXES or connection.vendor != 'sqlite':
+        return
+    table, columns = SEARCH_INDEXES[type(instance)]
+    values = [getattr(instance, column) or '' for column in columns]
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [instance.pk])
+        cursor.execute(
+            f'INSERT INTO {table} (rowid, {", ".join(columns)}) VALUES (%s{", %s" * len(columns)})',
+            [instance.pk, *values],
+        )
+
+
+def unindex_instance(instance):
+    if type(instance) not in SEARCH_INDEXES or connection.vendor != 'sqlite':
+        return
+    table, _ = SEARCH_INDEXES[type(instance)]
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [instance.pk])
+
+
+def rebuild_index(model):
+    """Repopulate a model's FTS table from scratch (e.g. after bulk_create)."""
+    if connection.vendor != 'sqlite':
+        return
+    table, columns = SEARCH_INDEXES[model]
+    source = model._meta.db_table
+    selected = ', '.join(f"coalesce({column}, '')" for column in columns)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table}')
+        cursor.execute(f'INSERT INTO {table} (rowid, {", ".join(columns)}) SELECT id, {selected} FROM {source}')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Problem)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    _, columns = SEARCH_INDEXES[sender]
+    if update_fields is not None and not set(update_fields) & set(columns):
+        return
+    index_instance(instance)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Problem)
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_instance(instance)
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for SearchFilter backed by the full-text index.
+
+    Matching rows are ordered by relevance unless the client asked for an
+    explicit ``ordering``, so list it after OrderingFilter in
+    ``filter_backends``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = search_terms(request.query_params.get(self.search_param, ''))
+        if not terms or queryset.model not in SEARCH_INDEXES:
+            return super().filter_queryset(request, queryset, view)
+
+        vendor = connection.vendor
+        table, columns = SEARCH_INDEXES[queryset.model]
+        source = queryset.model._meta.db_table
+
+        if vendor == 'sqlite':
+            match = fts5_query(terms)
+            queryset = queryset.filter(
+                pk__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [match])
+            ).annotate(search_rank=RawSQL(
+                f'SELECT bm25({table}) FROM {table} WHERE {table} MATCH %s AND rowid = {source}.id',
+                [match], output_field=FloatField(),
+            ))
+            # bm25() is negative; more negative is more relevant.
+            rank_ordering = 'search_rank'
+        elif vendor == 'postgresql':
+            vector = tsvector_sql(source, columns)
+            text = ' '.join(terms)
+            queryset = queryset.filter(RawSQL(
+                f"{vector} @@ websearch_to_tsquery('english', %s)", [text], output_field=BooleanField(),
+            )).annotate(search_rank=RawSQL(
+                f"ts_rank_cd({vector}, websearch_to_tsquery('english', %s))", [text], output_field=FloatField(),
+            ))
+            rank_ordering = '-search_rank'
+        else:
+            return super().filter_queryset(request, queryset, view)
+
+        if request.query_params.get(filters.OrderingFilter.ordering_param):
+            return queryset
+        return queryset.order_by(rank_ordering, '-pk')
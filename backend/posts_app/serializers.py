@@ -1,13 +1,13 @@
 # backend/posts_app/serializers.py
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Problem, TestCase, UserProfile, Post, InterviewPost, Comment, Like, ProblemSolveLog, Post
-from collections import Counter
-from django.db import models
-from datetime import date, timedelta
-from django.db.models import Count
-from django.db.models.functions import TruncDate
-from collections import defaultdict
+from .models import Problem, TestCase, UserProfile, Post, InterviewPost, Comment, Like, Post
+from django.urls import reverse
+from . import activity, avatars, comment_tree, profile_stats, timeline
+from .pagination import CommentPagination
+
+# Thumbnail size (see avatars.SIZES) for users shown next to posts, comments and in lists.
+AVATAR_SIZE = 64
 
 class UserSerializer(serializers.ModelSerializer):
     avatar = serializers.SerializerMethodField()
@@ -17,14 +17,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'avatar']
 
     def get_avatar(self, obj):
-        request = self.context.get('request')
-        avatar = getattr(obj.profile, 'avatar', None)
-        if avatar:
-            avatar_url = avatar.url
-            if request is not None:
-                return request.build_absolute_uri(avatar_url)
-            return avatar_url
-        return None
+        return avatars.url(obj.profile, AVATAR_SIZE, self.context.get('request'))
 
 class UserProfileSerializer(serializers.ModelSerializer):
 
@@ -36,175 +29,143 @@ class UserProfileSerializer(serializers.ModelSerializer):
     job_status = serializers.SerializerMethodField()
     coding_status = serializers.SerializerMethodField()
     commit_records = serializers.SerializerMethodField()
+    streaks = serializers.SerializerMethodField()
     job_records = serializers.SerializerMethodField()
     likes_count = serializers.SerializerMethodField()
     posts_count = serializers.SerializerMethodField()
     exp = serializers.SerializerMethodField()
     avatar = serializers.SerializerMethodField()
+    avatar_urls = serializers.SerializerMethodField()
+    is_following = serializers.SerializerMethodField()
 
     class Meta:
         model = UserProfile
-        fields = ['user', 'exp', 'likes_count', 'posts_count', 'avatar', 
+        fields = ['user', 'exp', 'likes_count', 'posts_count', 'avatar', 'avatar_urls',
             'followers_count', 'following_count', 'round_type_mapping',
-            'job_status', 'coding_status', 'commit_records', 'job_records']
+            'job_status', 'coding_status', 'commit_records', 'streaks', 'job_records', 'is_following',
+            'timezone']
+
+    # Everything but the avatar, exp and heatmap comes from the user's
+    # ProfileStats row (see profile_stats.py); other users only see public
+    # posts. The heatmap is read from ActivityDay (see activity.py).
+    def stats(self, obj):
+        return profile_stats.for_user(obj.user)
+
+    def is_self(self, obj):
+        request = self.context.get('request')
+        return bool(request and request.user == obj.user)
 
     def get_followers_count(self, obj):
-        return obj.followers.count()
+        return self.stats(obj).followers_count
 
     def get_following_count(self, obj):
-        return obj.user.profile.following.count()
+        return self.stats(obj).following_count
     
     def get_likes_count(self, obj):
-        # return Like.objects.filter(user=obj.user).values_list('id', flat=True).count()
-        request = self.context.get('request')
-        is_self = request and request.user == obj.user
- 
-        posts = Post.objects.filter(user=obj.user)
- 
-        if not is_self:
-            posts = posts.filter(visibility='public')
- 
-        return Like.objects.filter(post__in=posts).count()
+        stats = self.stats(obj)
+        return stats.likes_count if self.is_self(obj) else stats.public_likes_count
     
     def get_posts_count(self, obj):
-        # return Post.objects.filter(user=obj.user).values_list('id', flat=True).count()
-         request = self.context.get('request')
-         is_self = request and request.user == obj.user
-         queryset = Post.objects.filter(user=obj.user)
-         if not is_self:
-             queryset = queryset.filter(visibility='public')
-         return queryset.count()
+        stats = self.stats(obj)
+        return stats.posts_count if self.is_self(obj) else stats.public_posts_count
     
     def get_exp(self, obj):
         return obj.exp
     
     def get_round_type_mapping(self, obj):
         return dict(InterviewPost.ROUND_TYPE_CHOICES)
-    
-    def get_coding_status(self, obj):
-        return []
-    
-    def get_coding_status(self, obj):
-        logs = ProblemSolveLog.objects.filter(user=obj.user).select_related('problem')
-        difficulty_count = {'Easy': 0, 'Medium': 0, 'Hard': 0}
-
-        for log in logs:
-            diff = log.problem.difficulty
-            if diff == 'easy':
-                difficulty_count['Easy'] += 1
-            elif diff == 'medium':
-                difficulty_count['Medium'] += 1
-            elif diff == 'hard':
-                difficulty_count['Hard'] += 1
-
-        return [{'name': k, 'value': v} for k, v in difficulty_count.items()]
 
+    def get_coding_status(self, obj):
+        return profile_stats.coding_status(self.stats(obj))
 
     def get_avatar(self, obj):
-        request = self.context.get("request")
-        if obj.avatar:
-            avatar_url = obj.avatar.url
-            if request is not None:
-                return request.build_absolute_uri(avatar_url)
-            return avatar_url
-        return None
-    
-    # def get_commit_records(self, obj):
-    #     return []
+        return avatars.url(obj, 256, self.context.get("request"))
 
-    def get_commit_records(self, obj):
+    def get_avatar_urls(self, obj):
+        return avatars.urls(obj, self.context.get("request"))
 
-        today = date.today()
-        start_date = today - timedelta(days=100)
-
-        solve_logs = (
-            ProblemSolveLog.objects.filter(user=obj.user, solved_at__date__gte=start_date)
-            .annotate(day=TruncDate('solved_at'))
-            .values('day')
-            .annotate(count=Count('id'))
-        )
+    def get_commit_records(self, obj):
+        return activity.heatmap(obj.user_id, obj.timezone)
 
-        post_logs = (
-            Post.objects.filter(user=obj.user, created_at__date__gte=start_date)
-            .annotate(day=TruncDate('created_at'))
-            .values('day')
-            .annotate(count=Count('id'))
-        )
-        combined_count = defaultdict(int)
-        for entry in solve_logs:
-            combined_count[entry['day']] += entry['count']
-        for entry in post_logs:
-            combined_count[entry['day']] += entry['count']
+    def get_streaks(self, obj):
+        return activity.streaks(self.stats(obj), obj.timezone)
 
-        result = []
-        for i in range(100):
-            d = today - timedelta(days=i)
-            result.append({
-                'date': d.isoformat(),
-                'count': combined_count.get(d, 0)
-            })
+    def get_job_status(self, obj):
+        return profile_stats.job_status(self.stats(obj), self.is_self(obj))
+    
+    def get_job_records(self, obj):
+        return profile_stats.job_records(self.stats(obj), self.is_self(obj))
 
-        return result[::-1] 
+    # Annotated on the user by the profile view, so it costs no query here.
+    def get_is_following(self, obj):
+        return bool(getattr(obj.user, 'followed_by_viewer', False))
 
 
+class ProfileCardSerializer(serializers.ModelSerializer):
+    """
+    A user in a follower/following list. Expects the profiles with
+    ``user__stats`` selected and ``context['followed']``, the set of their
+    profile ids the viewer follows (see followed_ids).
+    """
+    id = serializers.IntegerField(source='user_id', read_only=True)
+    username = serializers.CharField(source='user.username', read_only=True)
+    avatar = serializers.SerializerMethodField()
+    followers_count = serializers.SerializerMethodField()
+    is_following = serializers.SerializerMethodField()
 
-    def get_job_status(self, obj):
-        # Define a mapping from round_number to display name
-        round_number_map = {
-            0: "Application",
-            1: "Online Assessment",
-            2: "Technical Interview",
-            3: "Behavioral Interview",
-            4: "System Design",
-            5: "HR Interview",
-            6: "Team Match",
-        }
-
-        # Get all interview posts for this user
-        posts = Post.objects.filter(user=obj.user, post_type='interview')
-        interview_posts = InterviewPost.objects.filter(post__in=posts)
-        
-        # Count by round_number
-        counter = Counter([ip.round_number for ip in interview_posts])
-        
-        # Return data in the format expected by the frontend
-        return [
-            {"name": round_number_map.get(key, f"Round {key}"), "value": value}
-            for key, value in counter.items()
-        ]
-    
-    def get_job_records(self, obj):
-        posts = Post.objects.filter(user=obj.user, post_type='interview')
-        result = []
-        for post in posts:
-            interview = post.interview_details
-            result.append({
-                "id": post.id,
-                "company": post.company,
-                "position": post.position,
-                "interview_date": post.interview_date,
-                "interview_details": {
-                    "round_number": getattr(interview, "round_number", None),
-                }
-            })
-        return result
+    class Meta:
+        model = UserProfile
+        fields = ['id', 'username', 'avatar', 'exp', 'followers_count', 'is_following']
+
+    @staticmethod
+    def followed_ids(viewer, profiles):
+        """The ids of ``profiles`` that ``viewer`` follows, in one query."""
+        if not viewer.is_authenticated or not profiles:
+            return set()
+        return set(
+            UserProfile.followers.through.objects.filter(
+                to_userprofile__user=viewer, from_userprofile__in=[profile.pk for profile in profiles],
+            ).values_list('from_userprofile', flat=True)
+        )
 
+    def get_avatar(self, obj):
+        return avatars.url(obj, AVATAR_SIZE, self.context.get('request'))
 
+    def get_followers_count(self, obj):
+        return profile_stats.for_user(obj.user).followers_count
 
+    def get_is_following(self, obj):
+        return obj.pk in self.context.get('followed', ())
 
 
 class CommentSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     replies = serializers.SerializerMethodField()
+    reply_count = serializers.SerializerMethodField()
+    more_replies = serializers.SerializerMethodField()
     
     class Meta:
         model = Comment
-        fields = ['id', 'user', 'content', 'created_at', 'replies']
+        fields = ['id', 'user', 'content', 'created_at', 'replies', 'reply_count', 'more_replies']
     
+    # Filled in by comment_tree; a comment that didn't come through it (e.g.
+    # one just created) is rendered without replies.
     def get_replies(self, obj):
-        if not obj.replies.exists():
-            return []
-        return CommentSerializer(obj.replies.all(), many=True).data
+        return CommentSerializer(getattr(obj, 'tree_replies', []), many=True, context=self.context).data
+
+    def get_reply_count(self, obj):
+        return getattr(obj, 'reply_count', 0)
+
+    def get_more_replies(self, obj):
+        # Where the replies left out of ``replies`` continue, or None.
+        more, cursor = comment_tree.more_replies_cursor(obj)
+        if not more:
+            return None
+        url = reverse('posts-comment-replies', args=[obj.post_id, obj.pk])
+        request = self.context.get('request')
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        return f'{url}?cursor={cursor}' if cursor else url
 
 class InterviewPostSerializer(serializers.ModelSerializer):
     round_type_display = serializers.CharField(source='get_round_type_display', read_only=True)
@@ -218,10 +179,53 @@ class InterviewPostSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
-class PostListSerializer(serializers.ModelSerializer):
+def requested_fields(request):
+    """The ``?fields=`` and ``?exclude=`` names of a request, as (set or None, set)."""
+    def names(param):
+        # Writes always echo the full representation.
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None
+        value = request.query_params.get(param)
+        if value is None:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    return names('fields'), names('exclude') or set()
+
+
+class SparseFieldsMixin:
+    """
+    Lets clients trim a payload with ``?fields=id,title`` or
+    ``?exclude=content``. ``Meta.optional_fields`` are left out unless
+    named in ``fields``. Only applies to the top-level serializer of the
+    response, not to nested ones.
+    """
+    @classmethod
+    def keeps(cls, name, only, exclude):
+        if name in exclude:
+            return False
+        if only is not None:
+            return name in only
+        return name not in getattr(cls.Meta, 'optional_fields', ())
+
+    @classmethod
+    def defer_unused(cls, queryset, request):
+        """Defer the optional model columns this request won't render."""
+        only, exclude = requested_fields(request)
+        unused = [name for name in getattr(cls.Meta, 'optional_fields', ()) if not cls.keeps(name, only, exclude)]
+        return queryset.defer(*unused) if unused else queryset
+
+    def get_fields(self):
+        fields = super().get_fields()
+        top_level = self.parent is None or self.parent is self.root
+        only, exclude = requested_fields(self.context.get('request')) if top_level else (None, set())
+        return {name: field for name, field in fields.items() if self.keeps(name, only, exclude)}
+
+
+class PostListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
-    likes_count = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
+    likes_count = serializers.IntegerField(read_only=True)
+    comments_count = serializers.IntegerField(read_only=True)
     round_number = serializers.SerializerMethodField()  
     liked = serializers.SerializerMethodField() 
     
@@ -229,33 +233,34 @@ class PostListSerializer(serializers.ModelSerializer):
         model = Post
         fields = [
             'id', 'username', 'post_type', 'title', 
-            'content', 'company', 'position', 'interview_date', 'created_at',
+            'content', 'excerpt', 'company', 'position', 'interview_date', 'created_at',
             'likes_count', 'comments_count', 'round_number', 'liked' 
         ]
+        # Feed cards show the excerpt; the full text only on ?fields=...,content
+        optional_fields = ['content']
 
+    # Post.objects.for_feed annotates this; only fall back to a per-row
+    # query for posts that did not come through it.
     def get_liked(self, obj):
+        if hasattr(obj, 'liked'):
+            return obj.liked
         request = self.context.get('request')
         if request and request.user and request.user.is_authenticated:
             return obj.likes.filter(user=request.user).exists()
         return False
     
-    def get_likes_count(self, obj):
-        return obj.likes.count()
-    
-    def get_comments_count(self, obj):
-        return obj.comments.count()
-    
     def get_round_number(self, obj):
         try:
             return obj.interview_details.round_number
         except InterviewPost.DoesNotExist:
             return None
 
-class PostDetailSerializer(serializers.ModelSerializer):
+class PostDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     interview_details = InterviewPostSerializer(required=False)
     comments = serializers.SerializerMethodField()
-    likes_count = serializers.SerializerMethodField()
+    comments_next = serializers.SerializerMethodField()
+    likes_count = serializers.IntegerField(read_only=True)
     timeline = serializers.SerializerMethodField() 
     liked = serializers.SerializerMethodField() 
     
@@ -264,7 +269,7 @@ class PostDetailSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'user', 'post_type', 'title', 'content',
             'visibility', 'company', 'position', 'interview_date', 'created_at',
-            'interview_details', 'comments', 'likes_count', 'timeline', 'liked'
+            'interview_details', 'comments', 'comments_next', 'likes_count', 'timeline', 'liked'
         ]
 
     def get_liked(self, obj):
@@ -274,20 +279,32 @@ class PostDetailSerializer(serializers.ModelSerializer):
         return False
     
     def get_comments(self, obj):
-        # Only get top-level comments
-        comments = obj.comments.filter(parent_comment=None)
-        return CommentSerializer(comments, many=True).data
-    
-    def get_likes_count(self, obj):
-        return obj.likes.count()
+        # First page of top-level comments; the rest come from /posts/{id}/comments/
+        page_size = CommentPagination.page_size
+        roots = list(comment_tree.top_level(obj).order_by('created_at', 'id')[:page_size + 1])
+        self._comments_next = roots[page_size - 1] if len(roots) > page_size else None
+        comments = comment_tree.build_threads(roots[:page_size])
+        return CommentSerializer(comments, many=True, context=self.context).data
+
+    def get_comments_next(self, obj):
+        # Relies on get_comments having run first (it's earlier in Meta.fields).
+        last = getattr(self, '_comments_next', None)
+        if last is None:
+            return None
+        url = reverse('posts-comments', args=[obj.pk])
+        request = self.context.get('request')
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        return f'{url}?cursor={CommentPagination().encode_cursor(last)}'
     
     def update(self, instance, validated_data):
         interview_details_data = validated_data.pop('interview_details', None)
 
-        # Update Post fields
+        # Update Post fields; only write what changed so the like/comment
+        # counters maintained elsewhere are never overwritten.
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        instance.save(update_fields=[*validated_data, 'updated_at'])
 
         # Update InterviewPost fields if provided
         if interview_details_data and hasattr(instance, 'interview_details'):
@@ -301,42 +318,19 @@ class PostDetailSerializer(serializers.ModelSerializer):
 
     def get_timeline(self, obj):
         request = self.context.get('request')
-        if not obj.company or not obj.position:
-            return []  
-
-        related_posts = Post.objects.filter(
-            user=obj.user,
-            company=obj.company,
-            position=obj.position
-        ).order_by('interview_date', 'created_at')
-        if request and request.user != obj.user:
-            related_posts = related_posts.filter(visibility='public')
-
-        return [
-            {
-                'id': post.id,
-                'title': post.title,
-                'interview_date': post.interview_date,
-                'round_number': getattr(getattr(post, 'interview_details', None), 'round_number', None),
-                'round_type': getattr(getattr(post, 'interview_details', None), 'round_type', None),
-                'status': getattr(getattr(post, 'interview_details', None), 'status', 'pending'),
-
-            }
-            for post in related_posts
-        ]
-    
-    
-    
+        return timeline.for_post(obj, request.user if request else None)
+
+
 class PostCreateSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
-    likes_count = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
+    likes_count = serializers.IntegerField(read_only=True)
+    comments_count = serializers.IntegerField(read_only=True)
     interview_details = InterviewPostSerializer(write_only=True, required=False)
     class Meta:
         model = Post
         fields = [
             'id', 'username', 'post_type', 'title', 
-            'content', 'company', 'position', 'interview_date', 'created_at',
+            'content', 'excerpt', 'company', 'position', 'interview_date', 'created_at',
             'likes_count', 'comments_count', 'interview_details', 'visibility'
         ]
 
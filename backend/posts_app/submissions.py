@@ -0,0 +1,308 @@
+"""
+Background execution of code_verification submissions.
+
+submit() stores a Submission and returns straight away, so no request
+waits on the sandbox. A full queue (SUBMISSION_QUEUE_LIMIT jobs, or
+SUBMISSION_USER_QUEUE_LIMIT from one submitter) raises QueueFull with an
+estimate of when to retry instead.
+
+Jobs are run by `manage.py process_submissions`, or, with
+SUBMISSION_DISPATCH_IN_PROCESS on, by SUBMISSION_WORKERS dispatcher threads
+that each process starts from AppConfig.ready(). Claims take turns on a
+lock row and re-check the running counts as they claim, so several
+processes can share the queue and still run at most SUBMISSION_CONCURRENCY
+jobs at once across all of them, and at most SUBMISSION_USER_CONCURRENCY
+per submitter. The next job goes to the submitter with the fewest running
+jobs, oldest job first, so one busy user can't hold everyone else up.
+
+A job still running SANDBOX_TIMEOUT plus STALE_GRACE seconds after it
+started belonged to a process that died, and is queued again. Finished
+jobs are deleted after SUBMISSION_RETENTION seconds.
+"""
+import json
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import sandbox
+from .models import ProblemSolveLog, Submission, SubmissionClaimLock
+
+logger = logging.getLogger(__name__)
+
+STALE_GRACE = 30
+PRUNE_INTERVAL = 600
+# How long one events() stream may hold a (sync) server worker.
+STREAM_SECONDS = 5
+FINISHED = (Submission.DONE, Submission.FAILED)
+
+
+class QueueFull(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def dispatch_in_process():
+    return getattr(settings, 'SUBMISSION_DISPATCH_IN_PROCESS', False)
+
+
+def workers():
+    return getattr(settings, 'SUBMISSION_WORKERS', 2)
+
+
+def concurrency():
+    return getattr(settings, 'SUBMISSION_CONCURRENCY', 2)
+
+
+def user_concurrency():
+    return getattr(settings, 'SUBMISSION_USER_CONCURRENCY', 1)
+
+
+def queue_limit():
+    return getattr(settings, 'SUBMISSION_QUEUE_LIMIT', 100)
+
+
+def user_queue_limit():
+    return getattr(settings, 'SUBMISSION_USER_QUEUE_LIMIT', 5)
+
+
+def poll_interval():
+    return getattr(settings, 'SUBMISSION_POLL_INTERVAL', 1)
+
+
+def retention():
+    return getattr(settings, 'SUBMISSION_RETENTION', 24 * 60 * 60)
+
+
+def owner_of(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def retry_after(waiting):
+    """Seconds until ``waiting`` queued jobs have likely been worked off, going by recent run times."""
+    duration = ExpressionWrapper(F('finished_at') - F('started_at'), output_field=DurationField())
+    recent = (
+        Submission.objects.filter(status__in=FINISHED, started_at__isnull=False)
+        .order_by('-finished_at')[:50].aggregate(average=Avg(duration))['average']
+    )
+    seconds = recent.total_seconds() if recent else sandbox.job_timeout() / 2
+    return min(600, max(1, math.ceil(waiting * seconds / max(1, concurrency()))))
+
+
+def submit(owner, user, problem, code):
+    """Queue ``code`` against ``problem``; raises QueueFull."""
+    waiting = Submission.objects.filter(status=Submission.QUEUED).count()
+    if waiting >= queue_limit():
+        raise QueueFull("The submission queue is full, please try again later", retry_after(waiting))
+    mine = Submission.objects.filter(owner=owner, status__in=(Submission.QUEUED, Submission.RUNNING)).count()
+    if mine >= user_queue_limit():
+        raise QueueFull(f"You can have at most {user_queue_limit()} submissions waiting", retry_after(mine))
+    submission = Submission.objects.create(owner=owner, user=user, problem=problem, code=code)
+    transaction.on_commit(wake)
+    return submission
+
+
+def position(submission):
+    """1 + the queued jobs older than ``submission``: roughly, given fair scheduling."""
+    return Submission.objects.filter(status=Submission.QUEUED, created_at__lt=submission.created_at).count() + 1
+
+
+def payload(submission):
+    data = {
+        'job_id': str(submission.pk),
+        'status': submission.status,
+        'status_url': f'/code-verification/{submission.pk}/',
+    }
+    if submission.status == Submission.QUEUED:
+        data['position'] = position(submission)
+    data.update(submission.result or {})
+    return data
+
+
+def requeue_stale():
+    cutoff = timezone.now() - timedelta(seconds=sandbox.job_timeout() + sandbox.REPLY_GRACE + STALE_GRACE)
+    Submission.objects.filter(status=Submission.RUNNING, started_at__lt=cutoff).update(
+        status=Submission.QUEUED, started_at=None,
+    )
+
+
+def claim():
+    """Mark the next job to run (see the module docstring) running and return it, or None."""
+    requeue_stale()
+    running = Counter(Submission.objects.filter(status=Submission.RUNNING).values_list('owner', flat=True))
+    if sum(running.values()) >= concurrency():
+        return None
+    heads = {}  # each submitter's oldest job, oldest submitter first
+    queued = Submission.objects.filter(status=Submission.QUEUED).order_by('created_at').values_list('owner', 'pk')
+    for owner, pk in queued[:queue_limit()]:
+        heads.setdefault(owner, pk)
+    candidates = sorted(
+        (running[owner], age, pk) for age, (owner, pk) in enumerate(heads.items())
+        if running[owner] < user_concurrency()
+    )
+    for _, _, pk in candidates:
+        if _claim(pk):
+            return Submission.objects.select_related('problem').get(pk=pk)
+    return None
+
+
+def _running_count(**filters):
+    rows = Submission.objects.filter(status=Submission.RUNNING, **filters).order_by().values('status')
+    return Coalesce(Subquery(rows.annotate(total=Count('pk')).values('total')[:1]), 0)
+
+
+def _claim(pk):
+    """
+    Start queued job ``pk`` if the caps still allow. The counts claim() went
+    by are only a guide: another dispatcher may have claimed since. So the
+    claim runs holding the SubmissionClaimLock row, which makes claims take
+    turns on any database, and the UPDATE checks the caps again; a job
+    another claim has locked is skipped rather than waited for.
+    """
+    with transaction.atomic():
+        SubmissionClaimLock.objects.select_for_update().get_or_create(pk=1)
+        candidate = Submission.objects.select_for_update(skip_locked=True).filter(pk=pk, status=Submission.QUEUED)
+        if not candidate.values_list('pk', flat=True).first():
+            return 0
+        return Submission.objects.filter(pk=pk, status=Submission.QUEUED).alias(
+            running=_running_count(), mine=_running_count(owner=OuterRef('owner')),
+        ).filter(running__lt=concurrency(), mine__lt=user_concurrency()).update(
+            status=Submission.RUNNING, started_at=timezone.now(),
+        )
+
+
+def format_output(results):
+    output_lines = []
+    for i, res in enumerate(results, 1):
+        if res["status"] == "pass":
+            output_lines.append(f"Test case {i}: Passed")
+        elif res["status"] == "fail":
+            output_lines.append(f"Test case {i}: Failed\n  Input: {res['input']}\n  Expected: {res['expected']}\n  Got: {res['got']}")
+        elif res["status"] == "error":
+            output_lines.append(f"Test case {i}: Error\n  Message: {res['message']}")
+    return "\n\n".join(output_lines)
+
+
+def execute(submission):
+    problem = submission.problem
+    job = {
+        "code": submission.code,
+        "function_name": problem.function_name,
+        "test_cases": [
+            {"input": tc.input_data, "expected": tc.expected_output}
+            for tc in problem.test_cases.all()
+        ],
+    }
+    try:
+        result_data = sandbox.run(job)
+    except sandbox.SandboxTimeout:
+        status, result = Submission.FAILED, {'error': 'Code execution timed out'}
+    except sandbox.SandboxError as e:
+        logger.error("Code sandbox unavailable: %s", e)
+        status, result = Submission.FAILED, {'error': 'The code sandbox is unavailable, please try again'}
+    else:
+        status = Submission.DONE
+        if "results" in result_data:
+            passed_all = all(res["status"] == "pass" for res in result_data["results"])
+            if submission.user_id:
+                ProblemSolveLog.objects.update_or_create(
+                    user_id=submission.user_id, problem=problem, defaults={"passed": passed_all},
+                )
+            result = {'output': format_output(result_data["results"]), 'passed': passed_all}
+        else:
+            result = {'output': f"Execution error: {result_data.get('error')}", 'passed': False}
+    Submission.objects.filter(pk=submission.pk, status=Submission.RUNNING).update(
+        status=status, result=result, finished_at=timezone.now(),
+    )
+
+
+def work_once():
+    """Claim and run one job on this thread; returns it, or None if there was nothing to run."""
+    submission = claim()
+    if submission is not None:
+        execute(submission)
+    return submission
+
+
+def prune():
+    cutoff = timezone.now() - timedelta(seconds=retention())
+    return Submission.objects.filter(status__in=FINISHED, finished_at__lt=cutoff).delete()[0]
+
+
+def events(pk, timeout=None, interval=0.5):
+    """
+    Server-sent events: the job's payload each time it changes, until it
+    finishes or ``timeout`` passes. The stream holds a server worker, so it
+    is only a short long-poll; EventSource clients reconnect after ``retry``.
+    """
+    deadline = time.monotonic() + (STREAM_SECONDS if timeout is None else timeout)
+    last = None
+    yield "retry: 1000\n\n"
+    while True:
+        submission = Submission.objects.filter(pk=pk).first()
+        if submission is None:
+            return
+        data = payload(submission)
+        if data != last:
+            yield f"event: status\ndata: {json.dumps(data)}\n\n"
+            last = data
+        if submission.status in FINISHED or time.monotonic() >= deadline:
+            return
+        time.sleep(interval)
+
+
+_wake = threading.Event()
+_threads = []
+_threads_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def start():
+    """Start this process's dispatcher threads, if it has any and they aren't running yet."""
+    with _threads_lock:
+        if _threads:
+            return
+        for number in range(workers()):
+            thread = threading.Thread(target=dispatch, name=f'submissions-{number}', daemon=True)
+            thread.start()
+            _threads.append(thread)
+
+
+def wake():
+    """Have this process's dispatchers, if any, look for work now rather than at their next poll."""
+    _wake.set()
+
+
+def start_on_boot():
+    """Called from AppConfig.ready(): start the dispatchers if this process is to run jobs itself."""
+    if dispatch_in_process() and workers() > 0:
+        start()
+
+
+def dispatch():
+    """Run jobs until the process exits, waiting poll_interval() when there are none."""
+    global _last_prune
+    while True:
+        close_old_connections()
+        try:
+            ran = work_once()
+            if ran is None and time.monotonic() - _last_prune > PRUNE_INTERVAL:
+                _last_prune = time.monotonic()
+                prune()
+        except Exception:
+            logger.exception("Running a submission failed")
+            ran = None
+        if ran is None:
+            _wake.wait(poll_interval())
+            _wake.clear()
@@ -0,0 +1,233 @@
+"""
+"People you may know": follow suggestions from an in-memory graph index.
+
+FollowGraph packs three relations into CSR adjacency arrays (an offsets
+array and a targets array per direction, stdlib ``array`` of machine ints,
+so a million edges take a few MB rather than a list of Python ints each):
+
+- follows: user -> users they follow
+- companies: user <-> the companies of their applications
+- threads: user <-> the posts they commented on
+
+It is built from a few streamed ``values_list`` scans, kept per process and
+rebuilt once it is older than SUGGESTION_INDEX_TTL seconds. The viewer's own
+follows are read live, so only second-hop edges can be that stale.
+
+A candidate scores FOLLOW_WEIGHT per person the viewer follows who follows
+them, plus COMPANY_WEIGHT and THREAD_WEIGHT per shared company or thread,
+damped by how many users share it (a company everyone applies to says
+little). Rankings are cached per user until their follows change.
+"""
+import heapq
+import math
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from .models import Application, Comment, UserProfile
+
+FOLLOW_WEIGHT = 3.0
+COMPANY_WEIGHT = 2.0
+THREAD_WEIGHT = 1.0
+MAX_LIMIT = 50
+CHUNK_SIZE = 5000
+PREFIX = 'suggestions'
+
+Follows = UserProfile.followers.through
+
+
+def index_ttl():
+    return getattr(settings, 'SUGGESTION_INDEX_TTL', 900)
+
+
+class CSR:
+    """Adjacency lists of ``size`` source nodes packed into two arrays."""
+
+    def __init__(self, sources, targets, size):
+        # Counting sort by source: degrees, then prefix sums, then placement.
+        offsets = array('l', [0]) * (size + 1)
+        for source in sources:
+            offsets[source + 1] += 1
+        for node in range(size):
+            offsets[node + 1] += offsets[node]
+        free = array('l', offsets[:-1])
+        packed = array('i', [0]) * len(targets)
+        for source, target in zip(sources, targets):
+            packed[free[source]] = target
+            free[source] += 1
+        self.offsets, self.targets = offsets, packed
+
+    def neighbours(self, node):
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+
+class FollowGraph:
+    def __init__(self, user_ids, follows, user_companies, company_users, user_threads, thread_users):
+        self.user_ids = user_ids  # dense node -> user id
+        self.nodes = {user_id: node for node, user_id in enumerate(user_ids)}
+        self.follows = follows
+        self.user_companies, self.company_users = user_companies, company_users
+        self.user_threads, self.thread_users = user_threads, thread_users
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def build(cls):
+        users = {}
+
+        def edges(rows, right):
+            sources, targets = array('i'), array('i')
+            for left_id, right_id in rows:
+                sources.append(users.setdefault(left_id, len(users)))
+                targets.append(right.setdefault(right_id, len(right)))
+            return sources, targets
+
+        follows = edges(
+            Follows.objects.values_list('to_userprofile__user', 'from_userprofile__user').iterator(CHUNK_SIZE),
+            users,
+        )
+        companies = {}
+        memberships = edges(
+            Application.objects.order_by().values_list('user', 'company_key').distinct().iterator(CHUNK_SIZE),
+            companies,
+        )
+        threads = {}
+        participations = edges(
+            Comment.objects.order_by().values_list('user', 'post').distinct().iterator(CHUNK_SIZE), threads,
+        )
+
+        user_ids = array('l', [0]) * len(users)
+        for user_id, node in users.items():
+            user_ids[node] = user_id
+        return cls(
+            user_ids,
+            CSR(*follows, len(users)),
+            CSR(*memberships, len(users)), CSR(memberships[1], memberships[0], len(companies)),
+            CSR(*participations, len(users)), CSR(participations[1], participations[0], len(threads)),
+        )
+
+    def _shared(self, node, outward, inward, weight, scores, counts):
+        for middle in outward.neighbours(node):
+            peers = inward.neighbours(middle)
+            if len(peers) < 2:
+                continue
+            share = weight / math.log2(len(peers))
+            counts.update(peers)
+            for peer in peers:
+                scores[peer] += share
+
+    def suggest(self, user_id, following, limit):
+        """The ``limit`` best candidates for ``user_id``, who follows ``following`` (user ids)."""
+        scores = defaultdict(float)
+        mutual, companies, threads = Counter(), Counter(), Counter()
+        for followed in following:
+            node = self.nodes.get(followed)
+            if node is not None:
+                mutual.update(self.follows.neighbours(node))
+        for peer, count in mutual.items():
+            scores[peer] += FOLLOW_WEIGHT * count
+
+        me = self.nodes.get(user_id)
+        if me is not None:
+            self._shared(me, self.user_companies, self.company_users, COMPANY_WEIGHT, scores, companies)
+            self._shared(me, self.user_threads, self.thread_users, THREAD_WEIGHT, scores, threads)
+
+        excluded = {self.nodes[pk] for pk in (user_id, *following) if pk in self.nodes}
+        best = heapq.nlargest(
+            limit, (item for item in scores.items() if item[0] not in excluded),
+            key=lambda item: (item[1], -self.user_ids[item[0]]),
+        )
+        return [
+            {
+                'user_id': self.user_ids[node],
+                'score': round(score, 3),
+                'mutual_follows': mutual[node],
+                'shared_companies': companies[node],
+                'shared_threads': threads[node],
+            }
+            for node, score in best
+        ]
+
+
+_graph = None
+_graph_lock = threading.Lock()  # guards _graph, never held across a build
+_build_lock = threading.Lock()
+
+
+def _current():
+    """(graph, whether it is still fresh)"""
+    with _graph_lock:
+        return _graph, _graph is not None and time.monotonic() - _graph.built_at <= index_ttl()
+
+
+def graph():
+    """
+    This process's FollowGraph, rebuilt when older than index_ttl(). One
+    thread rebuilds it, outside _graph_lock; meanwhile the others keep using
+    the stale graph, and only wait when there is none yet.
+    """
+    global _graph
+    current, fresh = _current()
+    if fresh:
+        return current
+    if not _build_lock.acquire(blocking=current is None):
+        return current
+    try:
+        current, fresh = _current()  # built while we waited for the lock
+        if fresh:
+            return current
+        built = FollowGraph.build()
+        with _graph_lock:
+            _graph = built
+        return built
+    finally:
+        _build_lock.release()
+
+
+def reset_graph():
+    global _graph
+    with _graph_lock:
+        _graph = None
+
+
+def _generation_key(user_id):
+    return f'{PREFIX}:gen:{user_id}'
+
+
+def suggestions_for(user, limit):
+    """Ranked suggestion dicts (see FollowGraph.suggest) for ``user``."""
+    generation = cache.get(_generation_key(user.pk), 0)
+    key = f'{PREFIX}:{user.pk}:{generation}:{limit}'
+    ranked = cache.get(key)
+    if ranked is None:
+        following = set(
+            Follows.objects.filter(to_userprofile__user=user).values_list('from_userprofile__user', flat=True)
+        )
+        ranked = graph().suggest(user.pk, following, limit)
+        cache.set(key, ranked, timeout=index_ttl())
+    return ranked
+
+
+@receiver(m2m_changed, sender=Follows)
+def follows_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # The follower's suggestions changed; on the forward side they are pk_set.
+    if reverse:
+        user_ids = [instance.user_id]
+    elif pk_set:
+        user_ids = UserProfile.objects.filter(pk__in=pk_set).values_list('user_id', flat=True)
+    else:
+        return  # clearing someone's followers; their followers' rankings age out
+    for user_id in user_ids:
+        key = _generation_key(user_id)
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
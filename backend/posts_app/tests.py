@@ -1,3 +1,1605 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from array import array
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from .models import (
+    EXCERPT_LENGTH, ActivityDay, Application, Comment, FeedItem, InterviewPost, Like, Post, PostViewSketch, Problem,
+    ProblemSolveLog, ProfileStats, Submission, SubmissionClaimLock, TrendingScore, UserProfile,
+)
+from .trending import rebuild_scores
+from . import activity, avatars, comment_tree, leaderboards, profile_stats, response_cache, sandbox, submissions, suggestions, unique_views, view_counter
+from .hyperloglog import REGISTER_COUNT, HyperLogLog
+
+
+def make_posts(user, count, **extra):
+    posts = Post.objects.bulk_create([
+        Post(user=user, post_type='interview', title=f'Post {i}', content='body',
+             company='Google', position='SWE', **extra)
+        for i in range(count)
+    ])
+    InterviewPost.objects.bulk_create([
+        InterviewPost(post=post, round_number=1, round_type='technical_interview')
+        for post in posts
+    ])
+    return posts
+
+
+# Requests flush views themselves: a flusher thread would write on its own
+# connection, outside the test's transaction.
+@override_settings(VIEW_COUNT_FLUSH_THREAD=False)
+class PostsAppTestCase(TestCase):
+    def setUp(self):
+        # The response cache outlives each test's rolled-back database.
+        cache.clear()
+
+    def tearDown(self):
+        # Write buffered views while this test's database is still there.
+        view_counter.flush()
+
+
+class PostFeedQueryBudgetTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author', password='pw')
+        self.reader = User.objects.create_user('reader', password='pw')
+        posts = make_posts(self.author, 100)
+        Like.objects.bulk_create([Like(user=self.reader, post=post) for post in posts[::2]])
+        Comment.objects.bulk_create([Comment(user=self.reader, post=post, content='hi') for post in posts])
+        # bulk_create skips the counter updates the views make.
+        call_command('reconcile_post_counters', stdout=StringIO())
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def count_list_queries(self, page_size):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/posts/', {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_independent_of_page_size(self):
+        self.assertEqual(self.count_list_queries(10), self.count_list_queries(100))
+
+    def test_counters_and_flags_match_relations(self):
+        response = self.client.get('/posts/', {'page_size': 100})
+        for item in response.data['results']:
+            post = Post.objects.get(pk=item['id'])
+            self.assertEqual(item['likes_count'], post.likes.count())
+            self.assertEqual(item['comments_count'], post.comments.count())
+            self.assertEqual(item['liked'], post.likes.filter(user=self.reader).exists())
+            self.assertEqual(item['round_number'], 1)
+            self.assertEqual(item['username'], 'author')
+
+
+class KeysetPaginationTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author', password='pw')
+        self.other = User.objects.create_user('other', password='pw')
+        # bulk_create gives many posts the same created_at, exercising the id tie-break.
+        make_posts(self.author, 25)
+        make_posts(self.other, 5)
+        self.client = APIClient()
+
+    def walk(self, url, params):
+        seen = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                return seen
+            response = self.client.get(response.data['next'])
+
+    def test_cursor_walks_feed_without_gaps_or_duplicates(self):
+        seen = self.walk('/posts/', {'pagination': 'cursor', 'page_size': 7})
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_cursor_respects_filters(self):
+        seen = self.walk('/posts/', {'pagination': 'cursor', 'user': self.other.id, 'page_size': 2})
+        self.assertEqual(sorted(seen), sorted(Post.objects.filter(user=self.other).values_list('id', flat=True)))
+
+    def test_cursor_mode_skips_count(self):
+        response = self.client.get('/posts/', {'pagination': 'cursor'})
+        self.assertNotIn('count', response.data)
+
+    def test_cursor_mode_refuses_other_orders(self):
+        response = self.client.get('/posts/', {'pagination': 'cursor', 'ordering': 'likes_count'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ordering', response.data)
+        response = self.client.get('/posts/', {'pagination': 'cursor', 'search': 'body'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('search', response.data)
+
+        needles = [Post.objects.create(user=self.other, post_type='general', title='t', content=f'needle {i}').pk
+                   for i in range(3)]
+        seen = self.walk('/posts/', {'pagination': 'cursor', 'search': 'needle', 'ordering': '-created_at',
+                                     'page_size': 2})
+        self.assertEqual(seen, needles[::-1])
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get('/posts/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_comment_thread_is_paginated_oldest_first(self):
+        post = Post.objects.first()
+        Comment.objects.bulk_create([Comment(user=self.other, post=post, content=str(i)) for i in range(5)])
+        seen = self.walk(f'/posts/{post.id}/comments/', {'page_size': 2})
+        self.assertEqual(seen, list(post.comments.order_by('created_at', 'id').values_list('id', flat=True)))
+
+
+class FullTextSearchTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('author', password='pw')
+        self.client = APIClient()
+
+    def create_post(self, title, content, company=None):
+        return Post.objects.create(user=self.user, post_type='general', title=title,
+                                   content=content, company=company)
+
+    def search(self, term, url='/posts/'):
+        response = self.client.get(url, {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_matches_all_terms_ranked_by_relevance(self):
+        strong = self.create_post('System design at Google', 'system design round', 'Google')
+        weak = self.create_post('Google onsite', 'we talked about system design briefly', 'Google')
+        self.create_post('System design at Meta', 'system design round', 'Meta')
+        self.assertEqual(self.search('system design google'), [strong.id, weak.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        post = self.create_post('Amazon OA', 'two questions')
+        self.assertEqual(self.search('amazon'), [post.id])
+        post.title = 'Netflix OA'
+        post.save()
+        self.assertEqual(self.search('amazon'), [])
+        self.assertEqual(self.search('netflix'), [post.id])
+        post.delete()
+        self.assertEqual(self.search('netflix'), [])
+
+    def test_prefix_and_syntax_characters(self):
+        post = self.create_post('Behavioral questions', 'STAR method')
+        self.assertEqual(self.search('behav'), [post.id])
+        self.assertEqual(self.search('"star" -(method'), [post.id])
+
+    def test_problem_search(self):
+        problem = Problem.objects.create(title='Two Sum', description='find indices', function_name='two_sum')
+        Problem.objects.create(title='Valid Parentheses', description='brackets', function_name='is_valid')
+        self.assertEqual(self.search('indices', url='/problems/'), [problem.id])
+
+
+class TrendingTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author', password='pw')
+        self.fans = [User.objects.create_user(f'fan{i}', password='pw') for i in range(3)]
+        self.quiet = Post.objects.create(user=self.author, post_type='general', title='quiet', content='')
+        self.hot = Post.objects.create(user=self.author, post_type='general', title='hot', content='')
+        self.client = APIClient()
+
+    def trending_ids(self):
+        return [item['id'] for item in self.client.get('/posts/trending/').data]
+
+    def test_likes_and_comments_move_posts_up(self):
+        for fan in self.fans:
+            Like.objects.create(user=fan, post=self.quiet)
+        self.assertEqual(self.trending_ids()[0], self.quiet.id)
+        Comment.objects.create(user=self.fans[0], post=self.hot, content='!')
+        for fan in self.fans:
+            Like.objects.create(user=fan, post=self.hot)
+        self.assertEqual(self.trending_ids()[0], self.hot.id)
+
+    def test_unlike_takes_the_like_back(self):
+        before = TrendingScore.objects.get(post=self.hot).score
+        like = Like.objects.create(user=self.fans[0], post=self.hot)
+        self.assertGreater(TrendingScore.objects.get(post=self.hot).score, before)
+        like.delete()
+        self.assertAlmostEqual(TrendingScore.objects.get(post=self.hot).score, before)
+
+    def test_rebuild_matches_incremental_scores(self):
+        Like.objects.create(user=self.fans[0], post=self.hot)
+        Comment.objects.create(user=self.fans[1], post=self.quiet, content='!')
+        incremental = dict(TrendingScore.objects.values_list('post_id', 'score'))
+        rebuild_scores()
+        for post_id, score in TrendingScore.objects.values_list('post_id', 'score'):
+            self.assertAlmostEqual(score, incremental[post_id])
+
+    def test_migration_backfill_matches_rebuild(self):
+        Like.objects.create(user=self.fans[0], post=self.hot)
+        Comment.objects.create(user=self.fans[1], post=self.quiet, content='!')
+        Post.objects.filter(pk=self.quiet.pk).update(views=7)
+        rebuild_scores()
+        rebuilt = dict(TrendingScore.objects.values_list('post_id', 'score'))
+        TrendingScore.objects.all().delete()
+
+        from importlib import import_module
+        from django.apps import apps
+        import_module('posts_app.migrations.0017_trendingscore').backfill_scores(apps, None)
+        backfilled = dict(TrendingScore.objects.values_list('post_id', 'score'))
+        self.assertEqual(backfilled.keys(), rebuilt.keys())
+        for post_id, score in backfilled.items():
+            self.assertAlmostEqual(score, rebuilt[post_id])
+
+    def test_private_posts_are_not_trending(self):
+        self.hot.visibility = 'private'
+        self.hot.save()
+        self.assertEqual(self.trending_ids(), [self.quiet.id])
+
+
+@override_settings(VIEW_COUNT_FLUSH_THRESHOLD=1)
+class PostCounterTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author', password='pw')
+        self.reader = User.objects.create_user('reader', password='pw')
+        self.post = Post.objects.create(user=self.author, post_type='general', title='t', content='c')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def test_like_toggle_updates_counters(self):
+        response = self.client.post(f'/posts/{self.post.id}/like/')
+        self.assertEqual(response.data, {'liked': True, 'likes_count': 1})
+        self.author.profile.refresh_from_db()
+        self.assertEqual(self.author.profile.total_likes, 1)
+
+        response = self.client.post(f'/posts/{self.post.id}/like/')
+        self.assertEqual(response.data, {'liked': False, 'likes_count': 0})
+        self.author.profile.refresh_from_db()
+        self.assertEqual(self.author.profile.total_likes, 0)
+
+    def test_add_comment_updates_counter(self):
+        self.client.post(f'/posts/{self.post.id}/add_comment/', {'content': 'hello'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+    def test_views_do_not_clobber_counters(self):
+        self.client.post(f'/posts/{self.post.id}/like/')
+        self.client.get(f'/posts/{self.post.id}/')
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.views), (1, 1))
+
+    def test_reconcile_repairs_drift(self):
+        Like.objects.create(user=self.reader, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=5)
+
+        out = StringIO()
+        call_command('reconcile_post_counters', '--dry-run', stdout=out)
+        self.assertIn('found 1', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (0, 5))
+
+        call_command('reconcile_post_counters', '--chunk-size', '1', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 0))
+
+    def test_reconcile_repairs_total_likes(self):
+        Like.objects.create(user=self.reader, post=self.post)
+        UserProfile.objects.filter(user=self.reader).update(total_likes=3)
+        call_command('reconcile_post_counters', '--chunk-size', '1', stdout=StringIO())
+        self.assertEqual(
+            dict(UserProfile.objects.filter(user__in=[self.author, self.reader]).values_list('user', 'total_likes')),
+            {self.author.pk: 1, self.reader.pk: 0},
+        )
+
+    def test_migration_backfills_total_likes(self):
+        Like.objects.create(user=self.reader, post=self.post)
+        UserProfile.objects.update(total_likes=7)
+
+        from importlib import import_module
+        from django.apps import apps
+        import_module('posts_app.migrations.0018_post_counters').backfill_counters(apps, None)
+        self.author.profile.refresh_from_db()
+        self.assertEqual(self.author.profile.total_likes, 1)
+
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=3600, VIEW_COUNT_FLUSH_THRESHOLD=1000)
+class BufferedViewCountTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author', password='pw')
+        self.posts = make_posts(self.author, 3)
+        self.client = APIClient()
+
+    def test_retrieve_does_not_write(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(f'/posts/{self.posts[0].id}/')
+        writes = [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith('SELECT')]
+        self.assertEqual(writes, [])
+        self.assertEqual(view_counter.pending_views(self.posts[0].id), 1)
+
+    def test_flush_applies_batched_deltas(self):
+        for post, hits in zip(self.posts, (3, 3, 1)):
+            for _ in range(hits):
+                self.client.get(f'/posts/{post.id}/')
+        self.assertEqual(view_counter.flush(), 7)
+
+        self.assertEqual(
+            list(Post.objects.order_by('id').values_list('views', flat=True)), [3, 3, 1]
+        )
+        self.author.profile.refresh_from_db()
+        self.assertEqual(self.author.profile.total_post_views, 7)
+        self.assertEqual(view_counter.pending_views(self.posts[0].id), 0)
+
+    @override_settings(VIEW_COUNT_FLUSH_THRESHOLD=1)
+    def test_failed_flush_does_not_fail_the_request(self):
+        with mock.patch.object(view_counter, '_write', side_effect=DatabaseError('locked')), \
+                self.assertLogs('posts_app.view_counter', 'ERROR'):
+            response = self.client.get(f'/posts/{self.posts[0].id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(view_counter.pending_views(self.posts[0].id), 1)
+        with mock.patch.object(view_counter, '_write', side_effect=DatabaseError('locked')):
+            with self.assertRaises(DatabaseError):
+                view_counter.flush()
+        self.assertEqual(view_counter.flush(), 1)
+
+
+    @override_settings(VIEW_COUNT_FLUSH_THREAD=True, VIEW_COUNT_FLUSH_THRESHOLD=1)
+    def test_due_flush_is_left_to_the_flusher_thread(self):
+        with mock.patch.object(view_counter, '_start_flusher') as start_flusher, \
+                mock.patch.object(view_counter, '_flush_due') as flush_due:
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(f'/posts/{self.posts[0].id}/')
+        self.assertEqual([q['sql'] for q in ctx.captured_queries if not q['sql'].startswith('SELECT')], [])
+        start_flusher.assert_called_once_with()
+        flush_due.set.assert_called_once_with()
+        self.assertEqual(view_counter.pending_views(self.posts[0].id), 1)
+
+
+class HyperLogLogTests(TestCase):
+    def test_estimate_within_error_bounds(self):
+        sketch = HyperLogLog()
+        for i in range(20000):
+            sketch.add(f'user:{i}')
+            sketch.add(f'user:{i}')
+        self.assertAlmostEqual(sketch.count(), 20000, delta=20000 * 0.05)
+        self.assertEqual(len(sketch.to_bytes()), REGISTER_COUNT)
+
+    def test_merge_is_union(self):
+        a, b = HyperLogLog(), HyperLogLog()
+        for i in range(1000):
+            a.add(i)
+        for i in range(500, 1500):
+            b.add(i)
+        merged = HyperLogLog.from_bytes(a.to_bytes()).merge(b)
+        self.assertAlmostEqual(merged.count(), 1500, delta=1500 * 0.05)
+
+    def test_small_sketches_are_stored_sparse(self):
+        sketch = HyperLogLog()
+        for i in range(10):
+            sketch.add(i)
+        data = sketch.to_bytes()
+        self.assertLessEqual(len(data), 30)
+        self.assertEqual(HyperLogLog.from_bytes(data).registers, sketch.registers)
+        self.assertEqual(HyperLogLog.from_bytes(HyperLogLog().to_bytes()).count(), 0)
+
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=3600, VIEW_COUNT_FLUSH_THRESHOLD=1000)
+class UniqueViewerTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author', password='pw')
+        self.viewers = [User.objects.create_user(f'viewer{i}', password='pw') for i in range(3)]
+        self.posts = make_posts(self.author, 2)
+        self.client = APIClient()
+
+    def view(self, post, user):
+        self.client.force_authenticate(user)
+        self.client.get(f'/posts/{post.id}/')
+
+    def test_refreshes_count_once(self):
+        for _ in range(5):
+            self.view(self.posts[0], self.viewers[0])
+        self.view(self.posts[0], self.viewers[1])
+        view_counter.flush()
+
+        response = self.client.get(f'/posts/{self.posts[0].id}/unique_viewers/', {'period': 'week'})
+        self.assertEqual(response.data['unique_viewers'], 2)
+        self.posts[0].refresh_from_db()
+        self.assertEqual(self.posts[0].views, 6)
+
+    def test_author_rollup_spans_posts(self):
+        self.view(self.posts[0], self.viewers[0])
+        self.view(self.posts[1], self.viewers[0])
+        self.view(self.posts[1], self.viewers[2])
+        view_counter.flush()
+        response = self.client.get(f'/users/{self.author.id}/unique_viewers/')
+        self.assertEqual(response.data['unique_viewers'], 2)
+
+    def test_flush_folds_old_days_of_what_it_touches(self):
+        self.view(self.posts[0], self.viewers[0])
+        view_counter.flush()
+        PostViewSketch.objects.update(day=timezone.localdate() - timedelta(days=unique_views.KEEP_DAYS + 1))
+        self.view(self.posts[0], self.viewers[1])
+        view_counter.flush()
+        self.assertCountEqual(PostViewSketch.objects.values_list('day', flat=True), [None, timezone.localdate()])
+        self.assertEqual(unique_views.post_unique_viewers(self.posts[0].id, 'all'), 2)
+
+    def test_compact_keeps_all_time_estimate(self):
+        for viewer in self.viewers:
+            self.view(self.posts[0], viewer)
+        view_counter.flush()
+        PostViewSketch.objects.update(day=timezone.localdate() - timedelta(days=90))
+        unique_views.compact(keep_days=30)
+        self.assertEqual(PostViewSketch.objects.get().day, None)
+        self.assertEqual(unique_views.post_unique_viewers(self.posts[0].id, 'all'), 3)
+        self.assertEqual(unique_views.post_unique_viewers(self.posts[0].id, 'month'), 0)
+
+    def test_bad_period(self):
+        response = self.client.get(f'/posts/{self.posts[0].id}/unique_viewers/', {'period': 'year'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FollowingFeedTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.reader = User.objects.create_user('reader', password='pw')
+        self.author = User.objects.create_user('author', password='pw')
+        self.stranger = User.objects.create_user('stranger', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def create_post(self, user, title, visibility='public'):
+        return Post.objects.create(user=user, post_type='general', title=title, content='', visibility=visibility)
+
+    def feed_ids(self, **params):
+        response = self.client.get('/posts/following_feed/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_follow_backfills_and_new_posts_fan_out(self):
+        old = self.create_post(self.author, 'old')
+        self.create_post(self.author, 'hidden', visibility='private')
+        self.create_post(self.stranger, 'stranger')
+        self.client.post(f'/users/{self.author.id}/follow/')
+        new = self.create_post(self.author, 'new')
+        self.assertEqual(self.feed_ids(), [new.id, old.id])
+
+    def test_unfollow_and_privatize_remove_items(self):
+        self.client.post(f'/users/{self.author.id}/follow/')
+        post = self.create_post(self.author, 'post')
+        post.visibility = 'private'
+        post.save(update_fields=['visibility'])
+        self.assertEqual(self.feed_ids(), [])
+
+        self.create_post(self.author, 'again')
+        self.client.post(f'/users/{self.author.id}/follow/')  # toggles to unfollow
+        self.assertFalse(FeedItem.objects.filter(owner=self.reader).exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_large_authors_are_merged_on_read(self):
+        self.client.post(f'/users/{self.stranger.id}/follow/')
+        posts = [self.create_post(self.stranger, str(i)) for i in range(5)]
+        self.assertFalse(FeedItem.objects.exists())
+
+        seen = []
+        response = self.client.get('/posts/following_feed/', {'page_size': 2})
+        while True:
+            seen.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, [post.id for post in reversed(posts)])
+
+        # Who is merged on read comes from the stored follower counts.
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/posts/following_feed/')
+        self.assertFalse([query['sql'] for query in ctx.captured_queries if 'COUNT(' in query['sql']])
+
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=3600, VIEW_COUNT_FLUSH_THRESHOLD=1000)
+class ResponseCacheTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author', password='pw')
+        self.reader = User.objects.create_user('reader', password='pw')
+        self.post = Post.objects.create(user=self.author, post_type='general', title='t', content='c')
+        self.client = APIClient()
+
+    def get_counting_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_anonymous_list_is_served_from_cache_until_a_write(self):
+        first, _ = self.get_counting_queries('/posts/', {'company': '', 'page': 1})
+        # Same parameters in a different order hit the same entry without touching the database.
+        second, queries = self.get_counting_queries('/posts/', {'page': 1, 'company': ''})
+        self.assertEqual(queries, 0)
+        self.assertEqual(json.loads(second.content), json.loads(first.content))
+
+        Like.objects.create(user=self.reader, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(likes_count=1)
+        third, queries = self.get_counting_queries('/posts/', {'page': 1, 'company': ''})
+        self.assertGreater(queries, 0)
+        self.assertEqual(json.loads(third.content)['results'][0]['likes_count'], 1)
+
+    def test_detail_cache_counts_views_and_follows_comments(self):
+        url = f'/posts/{self.post.id}/'
+        self.get_counting_queries(url)
+        _, queries = self.get_counting_queries(url)
+        self.assertEqual(queries, 1)  # the validator lookup only
+        self.assertEqual(view_counter.pending_views(self.post.id), 2)
+
+        Comment.objects.create(user=self.reader, post=self.post, content='new')
+        response, _ = self.get_counting_queries(url)
+        self.assertEqual(len(json.loads(response.content)['comments']), 1)
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.client.force_authenticate(self.reader)
+        self.client.get('/posts/')
+        _, queries = self.get_counting_queries('/posts/')
+        self.assertGreater(queries, 0)
+
+    def test_stats(self):
+        self.client.get('/posts/trending/')
+        self.client.get('/posts/trending/')
+        self.assertEqual(response_cache.stats()['trending'], {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+        self.client.force_authenticate(self.reader)
+        self.assertEqual(self.client.get('/posts/cache_stats/').status_code, 403)
+
+
+class ConditionalGetTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author', password='pw')
+        self.reader = User.objects.create_user('reader', password='pw')
+        self.post = Post.objects.create(user=self.author, post_type='interview', title='t', content='c',
+                                        company='Google', position='SWE')
+        InterviewPost.objects.create(post=self.post, round_number=1, round_type='behavioral')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def revalidate(self, url, response):
+        with CaptureQueriesContext(connection) as ctx:
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        return again, len(ctx.captured_queries)
+
+    def test_unchanged_post_is_304_with_one_query(self):
+        url = f'/posts/{self.post.id}/'
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        again, queries = self.revalidate(url, response)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(queries, 1)
+
+    def test_likes_comments_and_timeline_change_the_etag(self):
+        url = f'/posts/{self.post.id}/'
+        response = self.client.get(url)
+        self.client.post(f'/posts/{self.post.id}/like/')
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+
+        response = self.client.get(url)
+        self.client.post(f'/posts/{self.post.id}/add_comment/', {'content': 'hi'})
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+
+        response = self.client.get(url)
+        Post.objects.create(user=self.author, post_type='interview', title='round 2', content='',
+                            company='Google', position='SWE')
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+
+    def test_etag_is_per_viewer(self):
+        url = f'/posts/{self.post.id}/'
+        response = self.client.get(url)
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+
+    def test_comment_thread(self):
+        url = f'/posts/{self.post.id}/comments/'
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 304)
+        self.client.post(f'/posts/{self.post.id}/add_comment/', {'content': 'hi'})
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+
+    def test_author_and_commenter_changes_change_the_etags(self):
+        url = f'/posts/{self.post.id}/'
+        response = self.client.get(url)
+        # As when the avatar's thumbnails land.
+        UserProfile.objects.filter(user=self.author).update(avatar_variants={'64': {'webp': 'a-64.webp'}})
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+
+        url = f'/posts/{self.post.id}/comments/'
+        comment = Comment.objects.create(post=self.post, user=self.reader, content='first')
+        response = self.client.get(url)
+        # One comment deleted and another added leaves the stored count as it was.
+        comment.delete()
+        Comment.objects.create(post=self.post, user=self.reader, content='second')
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+
+        response = self.client.get(url)
+        self.reader.username = 'renamed'
+        self.reader.save()
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+
+    def test_profile(self):
+        url = f'/users/{self.author.id}/'
+        response = self.client.get(url)
+        again, queries = self.revalidate(url, response)
+        self.assertEqual((again.status_code, queries), (304, 1))
+        self.client.post(f'/users/{self.author.id}/follow/')
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+
+
+class CommentTreeTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('commenter', password='pw')
+        self.post = Post.objects.create(user=self.user, post_type='general', title='t', content='c',
+                                        visibility='public')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def reply(self, content, parent=None):
+        data = {'content': content}
+        if parent is not None:
+            data['parent_comment_id'] = parent
+        return self.client.post(f'/posts/{self.post.id}/add_comment/', data).data['id']
+
+    def comment_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_thread_size(self):
+        url = f'/posts/{self.post.id}/comments/'
+        root = self.reply('root')
+        self.reply('a', root)
+        _, small = self.comment_queries(url)
+
+        parent = root
+        for i in range(15):
+            parent = self.reply(f'deep {i}', parent)
+        for i in range(5):
+            self.reply(f'top {i}')
+        _, large = self.comment_queries(url)
+        self.assertEqual(small, large)
+
+    def test_replies_are_previewed_and_counted(self):
+        root = self.reply('root')
+        children = [self.reply(f'child {i}', root) for i in range(5)]
+        self.reply('grandchild', children[0])
+
+        response = self.client.get(f'/posts/{self.post.id}/comments/')
+        thread = response.data['results'][0]
+        self.assertEqual(thread['reply_count'], 5)
+        self.assertEqual([c['id'] for c in thread['replies']], children[:3])
+        self.assertEqual(thread['replies'][0]['reply_count'], 1)
+        self.assertEqual(thread['replies'][0]['replies'][0]['content'], 'grandchild')
+        self.assertEqual(Comment.objects.get(pk=children[0]).thread_root_id, root)
+        self.assertIsNone(thread['replies'][0]['more_replies'])
+
+        rest = self.client.get(thread['more_replies']).data['results']
+        self.assertEqual([c['id'] for c in rest], children[3:])
+
+    def test_only_shown_replies_are_loaded(self):
+        root = self.reply('root')
+        children = [self.reply(f'child {i}', root) for i in range(6)]
+        for child in children:
+            self.reply('grandchild', child)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(f'/posts/{self.post.id}/comments/')
+        replies_query = next(q['sql'] for q in ctx.captured_queries if 'ROW_NUMBER' in q['sql'])
+        self.assertIn('thread_root_id', replies_query)
+        threads = comment_tree.build_threads(comment_tree.top_level(self.post))
+        # Three of the six children, and the first reply of each child.
+        self.assertEqual(len(comment_tree.thread_replies([root])), 3 + 6)
+        self.assertEqual(threads[0].reply_count, 6)
+        self.assertEqual([c.reply_count for c in threads[0].tree_replies], [1, 1, 1])
+
+    def test_load_more_replies(self):
+        root = self.reply('root')
+        children = [self.reply(f'child {i}', root) for i in range(5)]
+        self.reply('grandchild', children[4])
+
+        url = f'/posts/{self.post.id}/comments/{root}/replies/'
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual([c['id'] for c in response.data['results']], children[:2])
+        seen = [c['id'] for c in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen += [c['id'] for c in response.data['results']]
+        self.assertEqual(seen, children)
+        self.assertEqual(response.data['results'][-1]['replies'][0]['content'], 'grandchild')
+
+        self.assertEqual(self.client.get(f'/posts/{self.post.id}/comments/999999/replies/').status_code, 404)
+
+    def test_detail_embeds_first_page(self):
+        for i in range(25):
+            self.reply(f'top {i}')
+        response = self.client.get(f'/posts/{self.post.id}/')
+        self.assertEqual(len(response.data['comments']), 20)
+        rest = self.client.get(response.data['comments_next'])
+        self.assertEqual([c['content'] for c in rest.data['results']], [f'top {i}' for i in range(20, 25)])
+
+
+class SparseFieldsTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('writer', password='pw')
+        self.body = 'A long interview write-up.\n\n' * 100
+        self.post = Post.objects.create(user=self.user, post_type='general', title='t', content=self.body)
+        self.client = APIClient()
+
+    def test_excerpt_is_stored_and_kept_in_sync(self):
+        self.assertEqual(len(self.post.excerpt), EXCERPT_LENGTH)
+        self.assertTrue(self.post.excerpt.startswith('A long interview write-up. A long'))
+
+        self.client.force_authenticate(self.user)
+        self.client.patch(f'/posts/{self.post.id}/', {'content': 'Short now.'})
+        self.assertEqual(Post.objects.get(pk=self.post.pk).excerpt, 'Short now.')
+        self.assertTrue(all(p.excerpt for p in make_posts(self.user, 2)))
+
+    def test_list_sends_excerpt_and_defers_content(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/posts/')
+        result = response.data['results'][0]
+        self.assertNotIn('content', result)
+        self.assertEqual(result['excerpt'], self.post.excerpt)
+        self.assertFalse(any('"posts_app_post"."content"' in q['sql'] for q in ctx.captured_queries))
+
+    def test_fields_and_exclude(self):
+        result = self.client.get('/posts/', {'fields': 'id,title,content'}).data['results'][0]
+        self.assertEqual(set(result), {'id', 'title', 'content'})
+        self.assertEqual(result['content'], self.body)
+
+        result = self.client.get('/posts/', {'exclude': 'excerpt,liked'}).data['results'][0]
+        self.assertNotIn('excerpt', result)
+        self.assertIn('title', result)
+
+        result = self.client.get(f'/posts/{self.post.id}/', {'exclude': 'comments,timeline'}).data
+        self.assertNotIn('comments', result)
+        self.assertEqual(result['content'], self.body)
+
+
+class FacetCountTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('faceted', password='pw')
+        self.client = APIClient()
+
+    def counts(self):
+        return {
+            facet: {entry['value']: entry['count'] for entry in entries}
+            for facet, entries in self.client.get('/posts/facets/').data.items()
+        }
+
+    def interview(self, company, round_type, visibility='public'):
+        post = Post.objects.create(user=self.user, post_type='interview', title='r', content='',
+                                   company=company, position='SWE', visibility=visibility)
+        InterviewPost.objects.create(post=post, round_number=1, round_type=round_type)
+        return post
+
+    def test_counts_follow_writes(self):
+        google = self.interview('Google', 'system_design')
+        self.interview('Google', 'behavioral')
+        hidden = self.interview('Meta', 'behavioral', visibility='private')
+        counts = self.counts()
+        self.assertEqual(counts['company'], {'Google': 2})
+        self.assertEqual(counts['round_type'], {'system_design': 1, 'behavioral': 1})
+        self.assertEqual(counts['post_type'], {'interview': 2})
+
+        hidden.visibility = 'public'
+        hidden.save()
+        google.company = 'Alphabet'
+        google.save(update_fields=['company'])
+        counts = self.counts()
+        self.assertEqual(counts['company'], {'Google': 1, 'Alphabet': 1, 'Meta': 1})
+        self.assertEqual(counts['round_type'], {'system_design': 1, 'behavioral': 2})
+
+        details = hidden.interview_details
+        details.round_type = 'hr_interview'
+        details.save()
+        google.delete()
+        counts = self.counts()
+        self.assertEqual(counts['company'], {'Google': 1, 'Meta': 1})
+        self.assertEqual(counts['round_type'], {'behavioral': 1, 'hr_interview': 1})
+        self.assertEqual(counts['position'], {'SWE': 2})
+
+        incremental = counts
+        call_command('rebuild_facets', stdout=StringIO())
+        self.assertEqual(self.counts(), incremental)
+
+    def test_response_is_cached_for_everyone(self):
+        self.interview('Google', 'behavioral')
+        self.client.force_authenticate(self.user)
+        self.client.get('/posts/facets/')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/posts/facets/')
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(json.loads(response.content)['company'], [{'value': 'Google', 'count': 1}])
+
+        self.interview('Google', 'behavioral')
+        self.assertEqual(self.client.get('/posts/facets/').json()['company'], [{'value': 'Google', 'count': 2}])
+
+
+class ApplicationTimelineTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('candidate', password='pw')
+        self.other = User.objects.create_user('other', password='pw')
+        self.client = APIClient()
+
+    def round(self, company, number, visibility='public', **extra):
+        post = Post.objects.create(user=self.user, post_type='interview', title=f'round {number}', content='',
+                                   company=company, position='SWE', visibility=visibility, **extra)
+        InterviewPost.objects.create(post=post, round_number=number, round_type='behavioral', status='pass')
+        return post
+
+    def test_label_variants_share_one_application(self):
+        first = self.round('Google', 1)
+        second = self.round('google ', 2)
+        third = self.round('  GOOGLE', 3, visibility='private')
+        self.assertEqual(len({first.application_id, second.application_id, third.application_id}), 1)
+        self.assertEqual(first.application.company, 'Google')
+
+        second.company = 'Meta'
+        second.save(update_fields=['company'])
+        self.assertNotEqual(Post.objects.get(pk=second.pk).application_id, first.application_id)
+
+    def test_timelines_agree_and_take_one_query(self):
+        for number in range(1, 6):
+            self.round('Google' if number % 2 else 'google', number)
+        self.round('Google', 6, visibility='private')
+
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            mine = self.client.get('/posts/my_timeline/', {'company': 'GOOGLE', 'position': 'swe'}).data
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual([entry['round_number'] for entry in mine], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(mine[0]['status'], 'pass')
+
+        self.client.force_authenticate(self.other)
+        theirs = self.client.get(
+            '/users/user_timeline/', {'company': 'Google', 'position': 'SWE', 'user_id': self.user.id}
+        ).data
+        self.assertEqual(theirs, mine[:5])
+        detail = self.client.get(f'/posts/{mine[0]["id"]}/').data
+        self.assertEqual(detail['timeline'], theirs)
+
+    def test_bulk_create_resolves_applications_in_bulk(self):
+        existing = self.round('Google', 1).application
+        labels = ['google', 'Meta', ' META ', 'Google', '']
+        posts = [
+            Post(user=user, post_type='interview', title=str(i), content='', company=company, position='SWE')
+            for i, company in enumerate(labels) for user in (self.user, self.other)
+        ] + [Post(user=self.user, post_type='general', title='g', content='', company='Meta', position='SWE')]
+        with CaptureQueriesContext(connection) as ctx:
+            Post.objects.bulk_create(posts)
+        # Fetch, insert the missing ones, fetch again, insert the posts.
+        self.assertEqual(len(ctx.captured_queries), 4)
+
+        self.assertEqual(posts[0].application, existing)
+        groups = {}
+        for post in posts[:8]:
+            groups.setdefault((post.user_id, post.company.strip().lower()), set()).add(post.application_id)
+        self.assertTrue(all(len(ids) == 1 for ids in groups.values()))
+        self.assertEqual(len(set.union(*groups.values())), 4)
+        # The first spelling in the batch is kept, as save() keeps the first one saved.
+        self.assertEqual(posts[1].application.company, 'google')
+        self.assertIsNone(posts[-1].application)
+        self.assertIsNone(posts[-2].application)
+        self.assertEqual(Application.objects.count(), 4)
+
+    def test_migration_backfill_matches_save(self):
+        post = self.round('Google', 1)
+        Post.objects.filter(pk=post.pk).update(application=None)
+
+        from importlib import import_module
+        from django.apps import apps
+        import_module('posts_app.migrations.0025_application').backfill_applications(apps, None)
+        self.assertEqual(Post.objects.get(pk=post.pk).application_id, post.application_id)
+
+
+class IndexAdvisorTests(PostsAppTestCase):
+    def test_replays_requests_and_rolls_back(self):
+        out = StringIO()
+        call_command('index_advisor', posts=300, users=30, min_rows=1, rows_per_key=1, stdout=out, stderr=StringIO())
+        self.assertIn('distinct statements', out.getvalue())
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(User.objects.filter(username__startswith='index_advisor_').exists())
+
+
+class BulkExportImportTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.author = User.objects.create_user('author', password='pw')
+        self.fan = User.objects.create_user('fan', password='pw')
+        self.post = Post.objects.create(user=self.author, post_type='interview', title='Onsite', content='graphs',
+                                        company='Google', position='SWE')
+        InterviewPost.objects.create(post=self.post, round_number=2, round_type='system_design', status='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.fan)
+        self.client.post(f'/posts/{self.post.id}/like/')
+        root = self.client.post(f'/posts/{self.post.id}/add_comment/', {'content': 'nice'}).data['id']
+        self.client.post(f'/posts/{self.post.id}/add_comment/', {'content': 'thanks', 'parent_comment_id': root})
+
+    def export(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/posts/export/')
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_admin_only(self):
+        self.assertEqual(self.client.get('/posts/export/').status_code, 403)
+        self.assertEqual(self.client.post('/posts/import/', b'', content_type='application/x-ndjson').status_code, 403)
+
+    def test_round_trip_into_a_fresh_database(self):
+        dump = self.export()
+        records = [json.loads(line) for line in dump.splitlines()]
+        self.assertEqual([r['type'] for r in records], ['user', 'user', 'post', 'comment', 'comment', 'like'])
+        self.assertEqual(records[2]['interview']['round_type'], 'system_design')
+
+        Post.objects.all().delete()
+        User.objects.filter(username__in=['author', 'fan']).delete()
+        response = self.client.post('/posts/import/', dump, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'users': 2, 'posts': 1, 'comments': 2, 'likes': 1})
+
+        post = Post.objects.get()
+        self.assertEqual((post.title, post.likes_count, post.comments_count), ('Onsite', 1, 2))
+        self.assertEqual(post.created_at.isoformat(), records[2]['created_at'])
+        self.assertEqual(post.interview_details.status, 'pass')
+        self.assertEqual(post.user.profile.total_likes, 1)
+        self.assertEqual(post.user.profile.posts_count, 1)
+        reply = Comment.objects.get(content='thanks')
+        self.assertEqual(reply.thread_root_id, reply.parent_comment_id)
+        self.assertEqual(self.client.get('/posts/', {'search': 'graphs'}).data['count'], 1)
+        self.assertTrue(TrendingScore.objects.filter(post=post).exists())
+
+    def test_import_into_existing_data_remaps_ids(self):
+        dump = self.export()
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dump.ndjson')
+            call_command('export_ndjson', path, stdout=out)
+            self.assertIn('Wrote 6 records', out.getvalue())
+            call_command('import_ndjson', path, chunk_size=1, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.filter(content='thanks').values('parent_comment__post').distinct().count(), 2)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).likes_count, 1)
+        self.assertEqual(len(dump.splitlines()), 6)
+
+    def test_bad_input_is_rejected_atomically(self):
+        self.client.force_authenticate(self.admin)
+        dump = b'{"type": "post", "id": 1, "user": "nobody", "post_type": "general", "title": "t", "content": "c", ' \
+               b'"created_at": "2025-01-01T00:00:00Z", "updated_at": "2025-01-01T00:00:00Z"}\n'
+        response = self.client.post('/posts/import/', dump, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('nobody', response.data['error'])
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_duplicate_likes_are_skipped(self):
+        dump = self.export()
+        like = dump.splitlines()[-1]
+        response = self.client.post('/posts/import/', dump + like + b'\n', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['likes'], 1)
+        self.assertEqual(response.data['skipped_likes'], 1)
+        self.assertEqual(Post.objects.exclude(pk=self.post.pk).get().likes_count, 1)
+
+
+class DataArchiveTests(PostsAppTestCase):
+    url = '/users/me/archive/'
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('archivist', password='pw')
+        post = Post.objects.create(user=self.user, post_type='interview', title='Onsite', content='x' * 5000,
+                                   company='Google', position='SWE')
+        InterviewPost.objects.create(post=post, round_number=1, round_type='behavioral')
+        for i in range(50):
+            Comment.objects.create(post=post, user=self.user, content=f'comment {i} ' * 50)
+        Like.objects.create(post=post, user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, **headers):
+        response = self.client.get(self.url, **headers)
+        return response, b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_streams_a_zip_of_the_users_data(self):
+        from zipfile import ZipFile
+
+        response, body = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        archive = ZipFile(BytesIO(body))
+        self.assertEqual(
+            archive.namelist(),
+            ['profile.json', 'posts.ndjson', 'comments.ndjson', 'likes.ndjson', 'problem_solves.ndjson'],
+        )
+        post = json.loads(archive.read('posts.ndjson'))
+        self.assertEqual((post['title'], post['interview_details__round_type']), ('Onsite', 'behavioral'))
+        self.assertEqual(len(archive.read('comments.ndjson').splitlines()), 50)
+        self.assertEqual(json.loads(archive.read('profile.json'))['username'], 'archivist')
+
+        for name in ('zed', 'amy'):
+            self.user.profile.following.add(User.objects.create_user(name, password='pw').profile)
+        archive = ZipFile(BytesIO(self.download()[1]))
+        self.assertEqual(json.loads(archive.read('profile.json'))['following'], ['amy', 'zed'])
+
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_range_resumes_an_identical_archive(self):
+        response, body = self.download()
+        etag = response['ETag']
+
+        partial, rest = self.download(HTTP_RANGE='bytes=1000-', HTTP_IF_RANGE=etag)
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial['Content-Range'], f'bytes 1000-{len(body) - 1}/{len(body)}')
+        self.assertEqual(body[:1000] + rest, body)
+
+        middle = self.download(HTTP_RANGE='bytes=10-19')[1]
+        self.assertEqual(middle, body[10:20])
+        self.assertEqual(self.download(HTTP_RANGE=f'bytes={len(body)}-')[0].status_code, 416)
+
+        # A changed archive is sent whole rather than spliced onto the old bytes.
+        Like.objects.all().delete()
+        self.assertEqual(self.download(HTTP_RANGE='bytes=1000-', HTTP_IF_RANGE=etag)[0].status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=self.client.get(self.url)['ETag']).status_code, 304)
+
+    def test_etag_covers_fields_changed_in_place(self):
+        problem = Problem.objects.create(title='Two Sum', description='d', function_name='two_sum')
+        ProblemSolveLog.objects.create(user=self.user, problem=problem, passed=False)
+        fan = User.objects.create_user('followed', password='pw')
+        changes = [
+            lambda: Post.objects.filter(user=self.user).update(views=F('views') + 1),
+            lambda: UserProfile.objects.filter(user=self.user).update(total_post_views=7, total_likes=3, posts_count=9),
+            lambda: self.user.profile.following.add(fan.profile),
+            lambda: ProblemSolveLog.objects.filter(user=self.user).update(passed=True),
+            lambda: Problem.objects.filter(pk=problem.pk).update(title='Two Sum II'),
+            lambda: Post.objects.update(title='Renamed', updated_at=timezone.now() + timedelta(minutes=1)),
+        ]
+        etags = [self.client.get(self.url)['ETag']]
+        for change in changes:
+            change()
+            etags.append(self.client.get(self.url)['ETag'])
+        self.assertEqual(len(set(etags)), len(etags))
+
+
+class ProfileStatsTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('stats_author', password='pw')
+        self.fan = User.objects.create_user('stats_fan', password='pw')
+        self.client = APIClient()
+
+    def snapshot(self, user):
+        stats = ProfileStats.objects.get(user=user)
+        fields = {field.name: getattr(stats, field.name) for field in ProfileStats._meta.concrete_fields
+                  if field.name not in ('user', 'version')}
+        return fields, sorted(ActivityDay.objects.filter(user=user).values_list('date', 'count'))
+
+    def assert_matches_rebuild(self):
+        for user in (self.author, self.fan):
+            maintained = self.snapshot(user)
+            profile_stats.rebuild([user.pk])
+            self.assertEqual(maintained, self.snapshot(user))
+
+    def test_deltas_match_a_rebuild(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.post('/posts/', {
+            'post_type': 'interview', 'title': 'Onsite', 'content': 'c', 'company': 'Google', 'position': 'SWE',
+            'interview_date': '2026-01-05',
+            'interview_details': {'round_number': 2, 'round_type': 'technical_interview'},
+        }, format='json')
+        interview_id = response.data['id']
+        hidden = Post.objects.create(user=self.author, post_type='general', title='h', content='c',
+                                     visibility='private')
+        problem = Problem.objects.create(title='Two Sum', description='d', function_name='f', difficulty='medium')
+        ProblemSolveLog.objects.create(user=self.author, problem=problem, passed=True)
+
+        self.client.force_authenticate(self.fan)
+        self.client.post(f'/users/{self.author.id}/follow/')
+        self.client.post(f'/posts/{interview_id}/like/')
+        Like.objects.create(user=self.fan, post=hidden)  # from before it was made private
+        self.client.post(f'/posts/{interview_id}/add_comment/', {'content': 'nice'})
+        self.assert_matches_rebuild()
+
+        stats = ProfileStats.objects.get(user=self.author)
+        self.assertEqual((stats.posts_count, stats.public_posts_count), (2, 1))
+        self.assertEqual((stats.likes_count, stats.public_likes_count), (2, 1))
+        self.assertEqual((stats.followers_count, stats.solved_medium), (1, 1))
+        self.assertEqual(stats.job_records[0]['round_number'], 2)
+        self.assertEqual(sum(ActivityDay.objects.filter(user=self.author).values_list('count', flat=True)), 3)
+
+        hidden.visibility = 'public'
+        hidden.save()
+        Post.objects.filter(pk=interview_id).first().delete()
+        self.client.post(f'/users/{self.author.id}/follow/')  # toggles to unfollow
+        problem.delete()
+        self.assert_matches_rebuild()
+        self.assertEqual(ProfileStats.objects.get(user=self.author).public_likes_count, 1)
+
+        self.fan.profile.following.add(self.author.profile)
+        self.fan.delete()
+        self.assertEqual(self.snapshot(self.author)[0]['followers_count'], 0)
+        self.assertEqual(self.snapshot(self.author)[0]['likes_count'], 0)
+
+    def test_profile_is_one_query_and_hides_private_posts(self):
+        make_posts(self.author, 2)
+        make_posts(self.author, 1, visibility='private')
+        profile_stats.rebuild([self.author.pk])
+
+        self.client.force_authenticate(self.fan)
+        with CaptureQueriesContext(connection) as queries:
+            public = self.client.get(f'/users/{self.author.id}/').data
+        # The conditional-GET validators, the profile, and the heatmap.
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(public['posts_count'], 2)
+        self.assertEqual(len(public['job_records']), 2)
+        self.assertEqual(public['job_status'], [{'name': 'Online Assessment', 'value': 2}])
+
+        self.client.force_authenticate(self.author)
+        mine = self.client.get('/users/me/').data
+        self.assertEqual((mine['posts_count'], len(mine['job_records'])), (3, 3))
+        self.assertEqual(len(mine['commit_records']), activity.ACTIVITY_DAYS)
+        self.assertEqual(mine['commit_records'][-1]['count'], 3)
+
+    def test_missing_row_is_built_on_read(self):
+        make_posts(self.author, 1)
+        ProfileStats.objects.filter(user=self.author).delete()
+        self.client.force_authenticate(self.fan)
+        self.assertEqual(self.client.get(f'/users/{self.author.id}/').data['posts_count'], 1)
+        self.assertTrue(ProfileStats.objects.filter(user=self.author).exists())
+
+
+class FollowListTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.star = User.objects.create_user('star', password='pw')
+        self.viewer = User.objects.create_user('viewer', password='pw')
+        self.fans = [User.objects.create_user(f'fan{i}', password='pw') for i in range(25)]
+        for fan in self.fans:
+            fan.profile.following.add(self.star.profile)
+        self.viewer.profile.following.add(self.fans[-1].profile, self.fans[0].profile)
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def test_followers_are_cursor_paged_cards_in_fixed_queries(self):
+        url = f'/users/{self.star.id}/followers/'
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(url).data
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(len(first['results']), 20)
+        # Newest follows first.
+        self.assertEqual(first['results'][0]['username'], 'fan24')
+        self.assertEqual(
+            set(first['results'][0]), {'id', 'username', 'avatar', 'exp', 'followers_count', 'is_following'}
+        )
+        self.assertEqual([card['username'] for card in first['results'] if card['is_following']], ['fan24'])
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(first['next']).data
+        self.assertEqual(len(queries), 3)
+        self.assertEqual([card['username'] for card in second['results']], [f'fan{i}' for i in range(4, -1, -1)])
+        self.assertIsNone(second['next'])
+        self.assertTrue(second['results'][-1]['is_following'])
+
+    def test_following_and_profile_flag(self):
+        cards = self.client.get(f'/users/{self.fans[0].id}/following/').data['results']
+        self.assertEqual([(card['username'], card['followers_count']) for card in cards], [('star', 25)])
+        self.assertEqual(self.client.get(f'/users/{self.fans[0].id}/').data['is_following'], True)
+        self.assertEqual(self.client.get(f'/users/{self.star.id}/').data['is_following'], False)
+        self.assertEqual(self.client.get('/users/999999/followers/').status_code, 404)
+
+
+class ActivityDayTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('streaker', password='pw')
+        self.problem = Problem.objects.create(title='Two Sum', description='d', function_name='f')
+
+    def post_at(self, moment):
+        post = Post.objects.create(user=self.user, post_type='general', title='t', content='c')
+        Post.objects.filter(pk=post.pk).update(created_at=moment)
+        post.created_at = moment
+        return post
+
+    def streaks(self):
+        return activity.streaks(ProfileStats.objects.get(user=self.user), self.user.profile.timezone)
+
+    def test_days_and_streaks_follow_writes(self):
+        today = timezone.localdate()
+        Post.objects.create(user=self.user, post_type='general', title='t', content='c')
+        ProblemSolveLog.objects.create(user=self.user, problem=self.problem)
+        self.assertEqual(list(ActivityDay.objects.values_list('date', 'count')), [(today, 2)])
+        self.assertEqual(self.streaks(), {'current': 1, 'longest': 1})
+
+        # Days recorded out of order recompute the streaks.
+        for days_ago in (1, 2, 5):
+            activity.record(self.user.pk, timezone.now() - timedelta(days=days_ago), 1)
+        self.assertEqual(self.streaks(), {'current': 3, 'longest': 3})
+        activity.record(self.user.pk, timezone.now() - timedelta(days=1), -1)
+        self.assertEqual(self.streaks(), {'current': 1, 'longest': 1})
+
+        with CaptureQueriesContext(connection) as queries:
+            heatmap = activity.heatmap(self.user.pk, 'UTC')
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([day['count'] for day in heatmap[-3:]], [1, 0, 2])
+
+    def test_streak_lapses_when_a_day_is_missed(self):
+        self.post_at(timezone.now() - timedelta(days=3))
+        activity.rebuild([self.user.pk])
+        self.assertEqual(self.streaks(), {'current': 0, 'longest': 1})
+
+    def test_days_are_in_the_users_timezone(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        # 03:00 UTC is still the previous evening in New York.
+        moment = timezone.now().replace(hour=3, minute=0) - timedelta(days=1)
+        self.post_at(moment)
+        activity.rebuild([self.user.pk])
+        self.assertEqual(ActivityDay.objects.get().date, moment.date())
+
+        self.assertEqual(client.post('/users/me/timezone/', {'timezone': 'Mars/Olympus'}).status_code, 400)
+        self.assertEqual(client.post('/users/me/timezone/', {'timezone': 'America/New_York'}).status_code, 200)
+        self.assertEqual(ActivityDay.objects.get().date, moment.date() - timedelta(days=1))
+        profile = client.get('/users/me/').data
+        self.assertEqual(profile['timezone'], 'America/New_York')
+        self.assertEqual(sum(day['count'] for day in profile['commit_records']), 1)
+
+
+class FollowSuggestionTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        suggestions.reset_graph()
+        self.addCleanup(suggestions.reset_graph)
+        self.me, self.friend, self.fof, self.colleague, self.commenter, self.stranger = [
+            User.objects.create_user(name, password='pw')
+            for name in ('me', 'friend', 'fof', 'colleague', 'commenter', 'stranger')
+        ]
+        self.me.profile.following.add(self.friend.profile)
+        self.friend.profile.following.add(self.fof.profile, self.me.profile)
+        for user in (self.me, self.colleague):
+            Post.objects.create(user=user, post_type='interview', title='r', content='c',
+                                company='Stripe', position='SWE')
+        post = Post.objects.create(user=self.stranger, post_type='general', title='t', content='c')
+        for user in (self.me, self.commenter):
+            Comment.objects.create(post=post, user=user, content='hi')
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+
+    def test_ranks_friends_of_friends_colleagues_and_co_commenters(self):
+        response = self.client.get('/users/suggestions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([card['username'] for card in response.data], ['fof', 'colleague', 'commenter'])
+        self.assertEqual(response.data[0]['reasons'], {'mutual_follows': 1, 'shared_companies': 0, 'shared_threads': 0})
+        self.assertEqual(response.data[1]['reasons']['shared_companies'], 1)
+        self.assertEqual(self.client.get('/users/suggestions/', {'limit': 'x'}).status_code, 400)
+
+    def test_rankings_are_cached_until_the_user_follows_someone(self):
+        self.client.get('/users/suggestions/')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/users/suggestions/')
+        # Only the cards: the ranking came from the cache.
+        self.assertEqual(len(queries), 1)
+
+        self.client.post(f'/users/{self.fof.id}/follow/')
+        names = [card['username'] for card in self.client.get('/users/suggestions/').data]
+        self.assertEqual(names, ['colleague', 'commenter'])
+
+    def test_stale_graph_is_served_while_another_thread_rebuilds(self):
+        stale = suggestions.graph()
+        with override_settings(SUGGESTION_INDEX_TTL=-1), suggestions._build_lock:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertIs(suggestions.graph(), stale)
+            self.assertEqual(len(queries), 0)
+        with override_settings(SUGGESTION_INDEX_TTL=-1):
+            self.assertIsNot(suggestions.graph(), stale)
+
+    def test_csr_neighbours(self):
+        csr = suggestions.CSR(array('i', [2, 0, 2, 1]), array('i', [5, 6, 7, 8]), 3)
+        self.assertEqual([list(csr.neighbours(node)) for node in range(3)], [[6], [8], [5, 7]])
+
+
+def make_image(size, image_format='PNG', mode='RGB', name='me'):
+    buffer = BytesIO()
+    Image.new(mode, size, 'red').save(buffer, image_format)
+    return SimpleUploadedFile(f'{name}.{image_format.lower()}', buffer.getvalue())
+
+
+class AvatarTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name, AVATAR_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('avatar_owner', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/users/upload_avatar/', {'avatar': image}, format='multipart')
+
+    def test_upload_stores_the_original_and_makes_thumbnails(self):
+        response = self.upload(make_image((600, 400), mode='RGBA'))
+        self.assertEqual(response.status_code, 202)
+        profile = self.user.profile
+        profile.refresh_from_db()
+        self.assertEqual(sorted(profile.avatar_variants, key=int), ['32', '64', '256'])
+        with profile.avatar.storage.open(profile.avatar_variants['32']['webp']) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (32, 32))
+
+        data = self.client.get(f'/users/{self.user.id}/').data
+        self.assertTrue(data['avatar'].endswith('-256.webp'))
+        self.assertTrue(data['avatar_urls']['ready'])
+        self.assertTrue(data['avatar_urls']['64']['jpeg'].endswith('-64.jpeg'))
+        self.assertTrue(data['user']['avatar'].endswith('-64.webp'))
+
+    def test_session_upload_with_csrf_checks(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        client.get('/csrf/')
+        token = client.cookies['csrftoken'].value
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/users/upload_avatar/', {'avatar': make_image((50, 50))}, HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(response.status_code, 202)
+        with override_settings(AVATAR_MAX_BYTES=100):
+            response = client.post('/users/upload_avatar/', {'avatar': make_image((400, 400))}, HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(response.status_code, 400)
+
+    def test_original_is_served_until_the_thumbnails_exist(self):
+        profile = self.user.profile
+        profile.avatar.save('me.png', make_image((80, 80)))
+        self.assertEqual(avatars.url(profile, 64), profile.avatar.url)
+        self.assertFalse(avatars.urls(profile)['ready'])
+
+    def test_rejects_oversized_and_unsupported_uploads(self):
+        with override_settings(AVATAR_MAX_PIXELS=100 * 100):
+            response = self.upload(make_image((101, 100)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pixels', response.data['error'])
+        with override_settings(AVATAR_MAX_BYTES=100):
+            self.assertIn('MB', self.upload(make_image((400, 400))).data['error'])
+        not_an_image = SimpleUploadedFile('me.png', b'<svg></svg>')
+        self.assertEqual(self.upload(not_an_image).status_code, 400)
+        self.user.profile.refresh_from_db()
+        self.assertFalse(self.user.profile.avatar)
+
+    def test_replacing_an_avatar_deletes_the_old_files(self):
+        self.upload(make_image((100, 100)))
+        profile = self.user.profile
+        profile.refresh_from_db()
+        old = [profile.avatar.name, *avatars.variant_names(profile.avatar_variants)]
+
+        self.upload(make_image((120, 120), 'JPEG', name='new'))
+        storage = profile.avatar.storage
+        self.assertEqual([name for name in old if storage.exists(name)], [])
+        # A worker still busy with the old avatar doesn't overwrite the new thumbnails.
+        self.assertIsNone(avatars.make_variants(profile.pk, old[0]))
+
+
+class LeaderboardTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        leaderboards.reset()
+        self.addCleanup(leaderboards.reset)
+        self.users = [User.objects.create_user(f'ranked{i}', password='pw') for i in range(5)]
+        for user, exp in zip(self.users, (50, 80, 50, 10, 0)):
+            UserProfile.objects.filter(user=user).update(exp=exp)
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[2])
+
+    def test_a_board_being_built_does_not_block_the_others(self):
+        leaderboards.board('exp', 'all')  # builds it, creating its build lock
+        with leaderboards._build_locks[('exp', 'all', None)]:
+            self.assertEqual(leaderboards.board('solves', 'all').rank(self.users[0].pk), (None, 0))
+            # A fresh board is served without waiting for its key's lock either.
+            self.assertEqual(leaderboards.board('exp', 'all').rank(self.users[1].pk), (1, 80))
+
+    def test_all_time_exp_ranks_and_pages(self):
+        response = self.client.get('/users/leaderboard/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(
+            [(row['username'], row['rank'], row['score']) for row in response.data['results']],
+            [('ranked1', 1, 80), ('ranked0', 2, 50)],
+        )
+        second = self.client.get('/users/leaderboard/', {'page_size': 2, 'page': 2}).data
+        self.assertEqual([(row['username'], row['rank']) for row in second['results']], [('ranked2', 2), ('ranked3', 4)])
+        self.assertEqual(second['me'], {'rank': 2, 'score': 50})
+
+        self.client.force_authenticate(self.users[4])
+        self.assertEqual(self.client.get('/users/leaderboard/').data['me'], {'rank': None, 'score': 0})
+
+    def test_weekly_solves_among_a_company(self):
+        problem = Problem.objects.create(title='Two Sum', description='d', function_name='two_sum')
+        other = Problem.objects.create(title='Three Sum', description='d', function_name='three_sum')
+        for user, solved in ((self.users[0], [problem, other]), (self.users[1], [problem]), (self.users[3], [problem])):
+            for solved_problem in solved:
+                ProblemSolveLog.objects.create(user=user, problem=solved_problem, passed=True)
+        ProblemSolveLog.objects.filter(user=self.users[1]).update(solved_at=timezone.now() - timedelta(days=8))
+        for user in (self.users[0], self.users[1]):
+            Application.objects.for_labels(user.pk, 'Stripe', 'SWE')
+
+        week = self.client.get('/users/leaderboard/', {'metric': 'solves', 'window': 'week'}).data
+        self.assertEqual([(row['username'], row['score']) for row in week['results']], [('ranked0', 2), ('ranked3', 1)])
+        stripe = self.client.get('/users/leaderboard/', {'metric': 'solves', 'company': ' stripe '}).data
+        self.assertEqual([row['username'] for row in stripe['results']], ['ranked0', 'ranked1'])
+        self.assertEqual(self.client.get('/users/leaderboard/', {'metric': 'likes'}).status_code, 400)
+
+    def test_boards_are_kept_until_they_expire(self):
+        self.client.get('/users/leaderboard/')
+        UserProfile.objects.filter(user=self.users[3]).update(exp=100)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/users/leaderboard/').data['results'][0]['username'], 'ranked1')
+        # The page's profiles and the viewer's follows; the board was not rebuilt.
+        self.assertEqual(len(queries), 2)
+        with override_settings(LEADERBOARD_TTL=-1):
+            self.assertEqual(self.client.get('/users/leaderboard/').data['results'][0]['username'], 'ranked3')
+
+
+PASSING = 'def add(a, b):\n    print("noise")\n    return a + b\n'
+JOB = {'code': PASSING, 'function_name': 'add', 'test_cases': [
+    {'input': [1, 2], 'expected': 3}, {'input': [2, 2], 'expected': 5},
+]}
+
+
+@override_settings(SANDBOX_RUNNER='posts_app.sandbox.LocalRunner', SANDBOX_TIMEOUT=1)
+class SandboxPoolTests(PostsAppTestCase):
+    def make_pool(self, size=1, max_uses=2):
+        pool = sandbox.Pool(sandbox.LocalRunner(), size, max_uses, health_interval=3600)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_workers_are_reused_then_retired(self):
+        pool = self.make_pool()
+        result = pool.run(JOB)
+        self.assertEqual([row['status'] for row in result['results']], ['pass', 'fail'])
+        first = pool.idle[0].pid
+        pool.run(JOB)
+        self.assertEqual(pool.stats()['retired'], 1)
+        pool.run(JOB)
+        self.assertNotEqual(pool.idle[0].pid, first)
+        self.assertEqual(pool.stats()['started'], 2)
+
+    def test_jobs_are_isolated_and_timed_out(self):
+        pool = self.make_pool(max_uses=10)
+        leak = {'code': 'import builtins\nbuiltins.leaked = 1\ndef f():\n    return 1\n', 'function_name': 'f',
+                'test_cases': [{'input': [], 'expected': 1}]}
+        probe = {'code': 'import builtins\ndef f():\n    return hasattr(builtins, "leaked")\n', 'function_name': 'f',
+                 'test_cases': [{'input': [], 'expected': False}]}
+        pool.run(leak)
+        self.assertEqual(pool.run(probe)['results'], [{'status': 'pass'}])
+
+        looping = {'code': 'def f():\n    while True: pass\n', 'function_name': 'f', 'test_cases': [{'input': [], 'expected': 1}]}
+        with self.assertRaises(sandbox.SandboxTimeout):
+            pool.run(looping)
+        # The worker only lost the job's child.
+        self.assertEqual(pool.run(JOB)['results'][0], {'status': 'pass'})
+        self.assertEqual(pool.stats()['started'], 1)
+
+    def test_dead_workers_are_replaced(self):
+        pool = self.make_pool(max_uses=10)
+        pool.run(JOB)
+        worker = pool.idle[0]
+        worker.process.kill()
+        worker.process.wait()
+        self.assertFalse(worker.healthy())
+        with self.assertRaises(sandbox.SandboxError):
+            pool.run(JOB)
+        self.assertIn('results', pool.run(JOB))
+
+
+@override_settings(
+    SANDBOX_RUNNER='posts_app.sandbox.LocalRunner', SANDBOX_TIMEOUT=1, SUBMISSION_WORKERS=0,
+    SUBMISSION_CONCURRENCY=2, SUBMISSION_USER_CONCURRENCY=1,
+)
+class SubmissionQueueTests(PostsAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(sandbox.shutdown)
+        self.problem = Problem.objects.create(title='Add', description='d', function_name='add')
+        self.problem.test_cases.create(input_data=[1, 2], expected_output=3)
+        self.user = User.objects.create_user('submitter', password='pw')
+
+    def submit(self, code=PASSING):
+        return self.client.post('/code-verification/', {'code': code, 'question_id': self.problem.pk},
+                                content_type='application/json')
+
+    def test_submissions_are_queued_then_run(self):
+        self.client.force_login(self.user)
+        response = self.submit()
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+        self.assertEqual((job['status'], job['position']), ('queued', 1))
+
+        self.assertIsNotNone(submissions.work_once())
+        result = self.client.get(job['status_url']).json()
+        self.assertEqual(result['status'], 'done')
+        self.assertEqual(result['output'], 'Test case 1: Passed')
+        self.assertTrue(ProblemSolveLog.objects.get(user=self.user, problem=self.problem).passed)
+
+        events = b''.join(self.client.get(f"{job['status_url']}events/").streaming_content).decode()
+        self.assertIn('"status": "done"', events)
+        # Only the submitter can see the job.
+        self.client.logout()
+        self.assertEqual(self.client.get(job['status_url']).status_code, 404)
+        self.assertEqual(self.client.get(f"{job['status_url']}events/").status_code, 404)
+        self.assertIsNone(submissions.work_once())
+
+    def test_event_stream_of_a_waiting_job_is_a_short_long_poll(self):
+        job = submissions.submit('user:waiting', None, self.problem, PASSING)
+        started = time.monotonic()
+        events = list(submissions.events(job.pk, timeout=0.2, interval=0.05))
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(events[0], 'retry: 1000\n\n')
+        self.assertIn('"status": "queued"', events[1])
+
+    def test_jobs_are_scheduled_fairly(self):
+        for _ in range(3):
+            submissions.submit('user:busy', None, self.problem, PASSING)
+        other = submissions.submit('user:other', None, self.problem, PASSING)
+        # One running job per submitter, so the other user goes second.
+        self.assertEqual(submissions.claim().owner, 'user:busy')
+        self.assertEqual(submissions.claim().pk, other.pk)
+        self.assertIsNone(submissions.claim())
+
+    def test_claims_recheck_the_caps(self):
+        first = submissions.submit('user:a', None, self.problem, PASSING)
+        second = submissions.submit('user:b', None, self.problem, PASSING)
+        third = submissions.submit('user:a', None, self.problem, PASSING)
+        # As if another process had claimed the first job after this one counted.
+        Submission.objects.filter(pk=first.pk).update(status=Submission.RUNNING, started_at=timezone.now())
+        self.assertEqual(submissions._claim(third.pk), 0)  # user:a is at its cap
+        with override_settings(SUBMISSION_CONCURRENCY=1):
+            self.assertEqual(submissions._claim(second.pk), 0)
+        # Claims serialize on the lock row, which is recreated if it has gone.
+        SubmissionClaimLock.objects.all().delete()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(submissions._claim(second.pk), 1)
+        self.assertIn('submissionclaimlock', ctx.captured_queries[1]['sql'])
+        self.assertTrue(SubmissionClaimLock.objects.exists())
+
+    @override_settings(SUBMISSION_WORKERS=2)
+    def test_dispatchers_only_start_when_asked_to(self):
+        submissions.start_on_boot()
+        submissions.submit('user:a', None, self.problem, PASSING)
+        submissions.wake()
+        self.assertEqual(submissions._threads, [])
+
+    def test_full_queue_answers_429_with_retry_after(self):
+        with override_settings(SUBMISSION_QUEUE_LIMIT=1):
+            self.assertEqual(self.submit().status_code, 202)
+            response = self.submit()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = submissions.submit('user:gone', None, self.problem, 'def add(a, b):\n    while True: pass\n')
+        Submission.objects.filter(pk=job.pk).update(
+            status=Submission.RUNNING, started_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(submissions.work_once().pk, job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), ('failed', {'error': 'Code execution timed out'}))
+        # Retry-After now goes by that run's duration: a second or so per job, two at a time.
+        self.assertIn(submissions.retry_after(4), (2, 3))
@@ -0,0 +1,48 @@
+"""
+Interview timelines: the rounds of one Application, oldest first.
+
+Every call site (post detail, my_timeline, user_timeline) goes through
+``rounds()``, which reads the rounds and their InterviewPost details in one
+query over post_app_timeline_idx.
+"""
+from django.db.models import F
+
+from .models import Post, normalize_label
+
+
+def rounds(application_filter, owner_id, viewer):
+    """
+    Timeline entries of the application matching ``application_filter``
+    (lookups on Post). Viewers other than the owner see public rounds only.
+    """
+    queryset = Post.objects.filter(post_type='interview', **application_filter)
+    if viewer is None or viewer.pk != owner_id:
+        queryset = queryset.filter(visibility='public')
+    rows = queryset.order_by('interview_date', 'created_at', 'id').values(
+        'id', 'title', 'interview_date',
+        round_number=F('interview_details__round_number'),
+        round_type=F('interview_details__round_type'),
+        round_status=F('interview_details__status'),
+    )
+    return [
+        {**row, 'status': row.pop('round_status') or 'pending'}
+        for row in rows
+    ]
+
+
+def for_post(post, viewer):
+    if post.application_id is None:
+        return []
+    return rounds({'application_id': post.application_id}, post.user_id, viewer)
+
+
+def for_labels(user, company, position, viewer):
+    """The timeline of ``user``'s application, matched on normalized labels."""
+    return rounds(
+        {
+            'application__user': user,
+            'application__company_key': normalize_label(company),
+            'application__position_key': normalize_label(position),
+        },
+        user.pk, viewer,
+    )
@@ -0,0 +1,134 @@
+"""
+Incrementally maintained trending scores.
+
+Every event (post created, like, comment, view) adds ``weight * 2 ** (t / HALF_LIFE)``
+to the post's score, with ``t`` measured from a fixed epoch. Comparing two
+such sums at any moment gives the same order as comparing the decayed
+scores, so a row is only rewritten when its own post gets an event. Scores
+are kept as natural logs to stay within float range.
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Comment, Like, Post, TrendingScore
+
+HALF_LIFE = timedelta(hours=48)
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+WINDOW = timedelta(days=30)
+
+POST_WEIGHT = 1.0
+LIKE_WEIGHT = 3.0
+COMMENT_WEIGHT = 2.0
+VIEW_WEIGHT = 0.1
+
+_DECAY_RATE = math.log(2) / HALF_LIFE.total_seconds()
+
+
+def event_score(weight, at):
+    return math.log(weight) + _DECAY_RATE * (at - EPOCH).total_seconds()
+
+
+def _log_add(a, b):
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def _log_sub(a, b):
+    if b >= a:
+        return None
+    return a + math.log1p(-math.exp(b - a))
+
+
+def record_event(post, weight, at=None, remove=False):
+    """Add (or, with ``remove``, take back) one weighted event for ``post``."""
+    at = at or timezone.now()
+    delta = event_score(weight, at)
+    base = event_score(POST_WEIGHT, post.created_at)
+
+    with transaction.atomic():
+        row = TrendingScore.objects.select_for_update().filter(post_id=post.pk).first()
+        if row is None:
+            if remove:
+                # Nothing to take back (or the post is being cascade-deleted).
+                return
+            row = TrendingScore(post_id=post.pk, score=base)
+        if remove:
+            # The creation event is never removed, so the score cannot drop below it.
+            remaining = _log_sub(row.score, delta)
+            row.score = base if remaining is None else max(remaining, base)
+        else:
+            row.score = _log_add(row.score, delta)
+        row.save()
+
+
+def top_posts(queryset, limit=8):
+    """``queryset`` restricted to the trending window, hottest first."""
+    cutoff = timezone.now() - WINDOW
+    return (
+        queryset.filter(created_at__gte=cutoff, trending_score__isnull=False)
+        .order_by('-trending_score__score')[:limit]
+    )
+
+
+def rebuild_scores(chunk_size=500):
+    """Recompute every score from the stored posts, likes and comments."""
+    likes = _timestamps_by_post(Like.objects.values_list('post_id', 'created_at'))
+    comments = _timestamps_by_post(Comment.objects.values_list('post_id', 'created_at'))
+
+    rows = []
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        posts = Post.objects.values_list('id', 'created_at', 'views').iterator(chunk_size=chunk_size)
+        for post_id, created_at, views in posts:
+            score = event_score(POST_WEIGHT, created_at)
+            for liked_at in likes.get(post_id, ()):
+                score = _log_add(score, event_score(LIKE_WEIGHT, liked_at))
+            for commented_at in comments.get(post_id, ()):
+                score = _log_add(score, event_score(COMMENT_WEIGHT, commented_at))
+            if views:
+                # View times are not stored; count them at creation time.
+                score = _log_add(score, event_score(VIEW_WEIGHT * views, created_at))
+            rows.append(TrendingScore(post_id=post_id, score=score))
+            if len(rows) >= chunk_size:
+                TrendingScore.objects.bulk_create(rows)
+                rows = []
+        TrendingScore.objects.bulk_create(rows)
+
+
+def _timestamps_by_post(pairs):
+    result = {}
+    for post_id, at in pairs.iterator():
+        result.setdefault(post_id, []).append(at)
+    return result
+
+
+@receiver(post_save, sender=Post)
+def seed_trending_score(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        TrendingScore.objects.get_or_create(
+            post_id=instance.pk, defaults={'score': event_score(POST_WEIGHT, instance.created_at)}
+        )
+
+
+@receiver(post_save, sender=Like)
+def trending_like_added(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_event(instance.post, LIKE_WEIGHT, instance.created_at)
+
+
+@receiver(post_delete, sender=Like)
+def trending_like_removed(sender, instance, **kwargs):
+    post = Post.objects.filter(pk=instance.post_id).first()
+    if post is not None:
+        record_event(post, LIKE_WEIGHT, instance.created_at, remove=True)
+
+
+@receiver(post_save, sender=Comment)
+def trending_comment_added(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_event(instance.post, COMMENT_WEIGHT, instance.created_at)
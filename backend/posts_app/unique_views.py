@@ -0,0 +1,114 @@
+"""
+Distinct-viewer estimates for posts and authors.
+
+Viewers are added to an in-memory HyperLogLog per (post, day) by
+view_counter and merged into PostViewSketch / AuthorViewSketch rows when it
+flushes. Each flush also folds the daily rows of the posts and authors it
+touched that are older than KEEP_DAYS (the longest period but 'all') into
+their all-time row, so there are at most KEEP_DAYS + 1 rows per post; a
+row is a few bytes per distinct viewer up to 4 KB (see hyperloglog).
+"""
+from datetime import timedelta
+from hashlib import sha256
+
+from django.db import transaction
+from django.utils import timezone
+
+from .hyperloglog import HyperLogLog
+from .models import AuthorViewSketch, PostViewSketch
+
+PERIOD_DAYS = {'day': 1, 'week': 7, 'month': 30}
+KEEP_DAYS = max(PERIOD_DAYS.values())
+
+
+def viewer_key(request):
+    """Stable identity for a viewer: the user id, else a hashed IP + user agent."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    fingerprint = '|'.join([
+        request.META.get('REMOTE_ADDR', ''),
+        request.META.get('HTTP_USER_AGENT', ''),
+    ])
+    return 'anon:' + sha256(fingerprint.encode('utf-8')).hexdigest()[:32]
+
+
+def merge_sketch(model, lookup, day, sketch):
+    with transaction.atomic():
+        # get_or_create retries the lookup if a concurrent flush inserts the
+        # row first; only an existing row can be locked and merged into.
+        row, created = model.objects.get_or_create(day=day, **lookup, defaults={'registers': sketch.to_bytes()})
+        if created:
+            return
+        row = model.objects.select_for_update().get(pk=row.pk)
+        row.registers = HyperLogLog.from_bytes(row.registers).merge(sketch).to_bytes()
+        row.save(update_fields=['registers'])
+
+
+def save_viewers(viewers_by_post_day, author_of):
+    """
+    Merge buffered viewer sketches into the database.
+
+    ``viewers_by_post_day`` maps (post_id, day) to a HyperLogLog and
+    ``author_of`` maps post ids to their author's user id.
+    """
+    by_author_day = {}
+    for (post_id, day), sketch in viewers_by_post_day.items():
+        if post_id not in author_of:
+            continue  # deleted since it was viewed
+        merge_sketch(PostViewSketch, {'post_id': post_id}, day, sketch)
+        key = (author_of[post_id], day)
+        by_author_day.setdefault(key, HyperLogLog()).merge(sketch)
+    for (author_id, day), sketch in by_author_day.items():
+        merge_sketch(AuthorViewSketch, {'author_id': author_id}, day, sketch)
+    cutoff = _cutoff(KEEP_DAYS)
+    _fold(PostViewSketch, 'post_id', {post_id for post_id, _ in viewers_by_post_day if post_id in author_of}, cutoff)
+    _fold(AuthorViewSketch, 'author_id', {author_id for author_id, _ in by_author_day}, cutoff)
+
+
+def _sketch_rows(queryset, period):
+    if period == 'all':
+        return queryset
+    start = timezone.localdate() - timedelta(days=PERIOD_DAYS[period] - 1)
+    return queryset.filter(day__gte=start)
+
+
+def estimate(queryset, period):
+    rows = _sketch_rows(queryset, period).values_list('registers', flat=True)
+    return HyperLogLog.union(HyperLogLog.from_bytes(registers) for registers in rows.iterator()).count()
+
+
+def post_unique_viewers(post_id, period='all'):
+    return estimate(PostViewSketch.objects.filter(post_id=post_id), period)
+
+
+def author_unique_viewers(user_id, period='all'):
+    return estimate(AuthorViewSketch.objects.filter(author_id=user_id), period)
+
+
+def _cutoff(keep_days):
+    return timezone.localdate() - timedelta(days=keep_days)
+
+
+def _fold(model, owner, owner_ids, cutoff):
+    """Fold the daily rows before ``cutoff`` of ``owner_ids`` (all owners if None) into their all-time rows."""
+    old_rows = model.objects.filter(day__lt=cutoff)
+    if owner_ids is not None:
+        old_rows = old_rows.filter(**{f'{owner}__in': owner_ids})
+    folded = 0
+    for owner_id in list(old_rows.order_by(owner).values_list(owner, flat=True).distinct()):
+        with transaction.atomic():
+            rows = model.objects.select_for_update().filter(day__lt=cutoff, **{owner: owner_id})
+            sketch = HyperLogLog.union(HyperLogLog.from_bytes(row.registers) for row in rows)
+            folded += rows.delete()[0]
+            merge_sketch(model, {owner: owner_id}, None, sketch)
+    return folded
+
+
+def compact(keep_days=KEEP_DAYS):
+    """Fold every daily row older than ``keep_days`` into its owner's all-time row."""
+    cutoff = _cutoff(keep_days)
+    return sum(
+        _fold(model, owner, None, cutoff)
+        for model, owner in ((PostViewSketch, 'post_id'), (AuthorViewSketch, 'author_id'))
+    )
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PostViewSet, ProblemViewSet, UserProfileViewSet, get_csrf_token, google_login, code_verification, ask_for_hint_solution_feedback
+from .views import PostViewSet, ProblemViewSet, UserProfileViewSet, get_csrf_token, google_login, code_verification, submission_status, submission_events, ask_for_hint_solution_feedback
 from django.http import JsonResponse
 from django.conf import settings
 from django.conf.urls.static import static
@@ -21,6 +21,8 @@ urlpatterns = [
     path('auth/google/', google_login),
     path('csrf/', get_csrf_token),
     path('code-verification/', code_verification),
+    path('code-verification/<uuid:submission_id>/', submission_status),
+    path('code-verification/<uuid:submission_id>/events/', submission_events),
     path('test/', test_api),
     path('ask/', ask_for_hint_solution_feedback, name='ask_for_hint_solution_feedback'),  
 ]
@@ -0,0 +1,154 @@
+"""
+Write-behind buffer for post view counts.
+
+PostViewSet.retrieve only bumps an in-process counter; pending counts are
+written out in one transaction of batched ``F('views') + n`` updates by a
+background thread, every VIEW_COUNT_FLUSH_INTERVAL seconds and as soon as
+VIEW_COUNT_FLUSH_THRESHOLD views are pending, and a last time when the
+process exits. No request waits for a flush. With VIEW_COUNT_FLUSH_THREAD
+off, the request that finds a flush due runs it instead. Authors'
+total_post_views and the trending scores are moved by the same deltas, and
+the buffered distinct-viewer sketches are merged (see unique_views).
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import response_cache, trending, unique_views
+from .hyperloglog import HyperLogLog
+from .models import Post, UserProfile
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = Counter()
+_pending_viewers = {}  # (post_id, day) -> HyperLogLog
+_last_flush = time.monotonic()
+
+
+def flush_interval():
+    return getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 10)
+
+
+def flush_threshold():
+    return getattr(settings, 'VIEW_COUNT_FLUSH_THRESHOLD', 100)
+
+
+def flush_thread():
+    return getattr(settings, 'VIEW_COUNT_FLUSH_THREAD', True)
+
+
+def record_view(post_id, viewer=None):
+    """Count one view of ``post_id``; ``viewer`` (see unique_views.viewer_key) feeds the distinct-viewer sketches."""
+    with _lock:
+        _pending[post_id] += 1
+        if viewer is not None:
+            key = (post_id, timezone.localdate())
+            _pending_viewers.setdefault(key, HyperLogLog()).add(viewer)
+        due = (
+            sum(_pending.values()) >= flush_threshold()
+            or time.monotonic() - _last_flush >= flush_interval()
+        )
+    if flush_thread():
+        _start_flusher()
+        if due:
+            _flush_due.set()
+    elif due:
+        # A failed write must not fail the page view; the counts stay buffered.
+        flush(raise_errors=False)
+
+
+def pending_views(post_id):
+    with _lock:
+        return _pending[post_id]
+
+
+def flush(raise_errors=True):
+    """
+    Write all buffered views to the database; returns the number written.
+    If the write fails the views are kept for the next flush, and the error
+    is raised, or only logged with ``raise_errors=False``.
+    """
+    global _last_flush
+    with _lock:
+        batch = dict(_pending)
+        viewers = dict(_pending_viewers)
+        _pending.clear()
+        _pending_viewers.clear()
+        _last_flush = time.monotonic()
+    if not batch:
+        return 0
+
+    try:
+        _write(batch, viewers)
+    except Exception:
+        # Put the counts back so the next flush retries them.
+        with _lock:
+            _pending.update(batch)
+            for key, sketch in viewers.items():
+                _pending_viewers.setdefault(key, HyperLogLog()).merge(sketch)
+        if raise_errors:
+            raise
+        logger.exception("Writing buffered post views failed; retrying on the next flush")
+        return 0
+    return sum(batch.values())
+
+
+def _write(batch, viewers):
+    posts = list(Post.objects.filter(pk__in=batch).only('id', 'user_id', 'created_at'))
+
+    # Posts (and authors) with the same delta share one UPDATE.
+    posts_by_delta = defaultdict(list)
+    author_deltas = Counter()
+    for post in posts:
+        posts_by_delta[batch[post.pk]].append(post.pk)
+        author_deltas[post.user_id] += batch[post.pk]
+    authors_by_delta = defaultdict(list)
+    for user_id, delta in author_deltas.items():
+        authors_by_delta[delta].append(user_id)
+
+    with transaction.atomic():
+        for delta, post_ids in posts_by_delta.items():
+            Post.objects.filter(pk__in=post_ids).update(views=F('views') + delta)
+        for delta, user_ids in authors_by_delta.items():
+            UserProfile.objects.filter(user_id__in=user_ids).update(total_post_views=F('total_post_views') + delta)
+        for post in posts:
+            trending.record_event(post, trending.VIEW_WEIGHT * batch[post.pk])
+        unique_views.save_viewers(viewers, {post.pk: post.user_id for post in posts})
+    response_cache.bump('trending')
+
+
+_flush_due = threading.Event()
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _start_flusher():
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_periodically, name='view-counter', daemon=True)
+            _flusher.start()
+
+
+def _flush_periodically():
+    while True:
+        _flush_due.wait(flush_interval())
+        _flush_due.clear()
+        close_old_connections()
+        flush(raise_errors=False)
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception("Dropping buffered post views at exit")
@@ -5,22 +5,23 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.views.decorators.csrf import csrf_exempt
-from .serializers import PostListSerializer, PostDetailSerializer, CommentSerializer, PostCreateSerializer, ProblemSerializer, UserProfileSerializer
+from .serializers import PostListSerializer, PostDetailSerializer, CommentSerializer, PostCreateSerializer, ProblemSerializer, ProfileCardSerializer, UserProfileSerializer
 from django.contrib.auth.models import User
+from django.utils import timezone
 from rest_framework.decorators import api_view
 from rest_framework.authtoken.models import Token
-from django.utils import timezone
 from rest_framework.decorators import permission_classes
-from datetime import timedelta
-from django.db.models import Count
-from .models import Like, UserProfile, Post, InterviewPost, Comment, Problem, TestCase, ProblemSolveLog
+from .search import FullTextSearchFilter
+from . import activity, archive, avatars, bulk_io, comment_tree, conditional, facets, feed, leaderboards, response_cache, submissions, suggestions, timeline, trending, unique_views, view_counter
+from .pagination import CommentPagination, FeedPagination, FollowPagination, LeaderboardPagination, PostPagination
+from .models import EXP_PER_POST, Like, UserProfile, Post, InterviewPost, Comment, Problem, TestCase, ProblemSolveLog, Submission, normalize_label
 from django.views.decorators.csrf import ensure_csrf_cookie
-from django.http import JsonResponse
-from django.db import models
-import subprocess
-import uuid
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef
 from rest_framework.parsers import MultiPartParser
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 import os
 import traceback
 import json
@@ -41,26 +42,70 @@ CONVERSATION_STORE = {}
 
 
 class UserProfileViewSet(viewsets.ViewSet):
+    def initialize_request(self, request, *args, **kwargs):
+        request = super().initialize_request(request, *args, **kwargs)
+        if self.action == 'upload_avatar':
+            # Before authentication: SessionAuthentication's CSRF check reads
+            # request.POST, which parses the upload with whatever handlers are set.
+            self.avatar_upload = avatars.AvatarUploadHandler(request._request)
+            request._request.upload_handlers = [self.avatar_upload]
+        return request
+
     def retrieve(self, request, pk=None):
-        try:
-            user = User.objects.get(pk=pk)
-            profile = user.profile
-            serializer = UserProfileSerializer(profile, context={'request': request})
-            return Response(serializer.data)
-        except User.DoesNotExist:
-            return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+        def build():
+            try:
+                # One query: the profile and stats rows come with the user.
+                users = User.objects.select_related('profile', 'stats')
+                if request.user.is_authenticated:
+                    users = users.annotate(followed_by_viewer=Exists(UserProfile.followers.through.objects.filter(
+                        from_userprofile__user=OuterRef('pk'), to_userprofile__user=request.user,
+                    )))
+                user = users.get(pk=pk)
+                profile = user.profile
+                serializer = UserProfileSerializer(profile, context={'request': request})
+                return Response(serializer.data)
+            except User.DoesNotExist:
+                return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        validators = str(pk).isdigit() and conditional.profile_validators(pk, request.user)
+        if not validators:
+            return build()
+        etag, last_modified = validators
+        return conditional.conditional(request, etag, last_modified, build)
 
     @action(detail=False, methods=['get'])
     @permission_classes([IsAuthenticated])
     def me(self, request):
         try:
-            profile = request.user.profile
+            profile = UserProfile.objects.select_related('user__stats').get(user=request.user)
         except UserProfile.DoesNotExist:
             return Response({"error": "User profile does not exist"}, status=status.HTTP_404_NOT_FOUND)
 
         serializer = UserProfileSerializer(profile, context={'request': request})
         return Response(serializer.data)
     
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated], url_path='me/timezone')
+    def set_timezone(self, request):
+        name = request.data.get('timezone')
+        if not activity.is_valid_zone(name):
+            return Response({"error": "timezone must be an IANA name such as Europe/Berlin"}, status=400)
+        profile = request.user.profile
+        if profile.timezone != name:
+            profile.timezone = name
+            profile.save(update_fields=['timezone'])
+            # Past activity moves to the days it fell on in the new timezone.
+            activity.rebuild([request.user.pk])
+        return Response({"timezone": name})
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated], url_path='me/archive')
+    def data_archive(self, request):
+        # Everything the user has created, as a zip streamed while it is built (see archive.py)
+        user = request.user
+        etag, last_modified = conditional.archive_validators(user)
+        return conditional.conditional(
+            request, etag, last_modified, lambda: archive.response(request, user, etag, last_modified)
+        )
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def follow(self, request, pk=None):
         try:
@@ -73,45 +118,127 @@ class UserProfileViewSet(viewsets.ViewSet):
 
             if profile.following.filter(pk=target_profile.pk).exists():
                 profile.following.remove(target_profile)
+                feed.unfollow(request.user, target_user)
                 return Response({"message": "Unfollowed successfully."})
             else:
                 profile.following.add(target_profile)
+                feed.follow(request.user, target_user)
                 return Response({"message": "Followed successfully."})
         except User.DoesNotExist:
             return Response({"error": "User not found."}, status=404)
 
 
     @action(detail=True, methods=['get'])
-    def followers(self, request, pk=None):
-        try:
-            user = User.objects.get(pk=pk)
-            followers = user.profile.followers.all()
-            serializer = UserProfileSerializer(followers, many=True, context={"request": request})
-            return Response(serializer.data)
-        except User.DoesNotExist:
+    def unique_viewers(self, request, pk=None):
+        if not User.objects.filter(pk=pk).exists():
+            return Response({"error": "User not found"}, status=404)
+        period = request.query_params.get('period', 'all')
+        if period != 'all' and period not in unique_views.PERIOD_DAYS:
+            return Response({"error": "period must be one of day, week, month, all"}, status=400)
+        return Response({'period': period, 'unique_viewers': unique_views.author_unique_viewers(pk, period)})
+
+    def follow_list(self, request, pk, owner, listed):
+        """
+        A page of profile cards from the follow rows whose ``owner`` side is
+        user ``pk``'s profile; ``listed`` is the side shown. Three queries
+        per page: the profile, the page, and the viewer's follow flags.
+        """
+        profile_id = UserProfile.objects.filter(user_id=pk).values_list('pk', flat=True).first()
+        if profile_id is None:
             return Response({"error": "User not found"}, status=404)
+        follows = UserProfile.followers.through.objects.filter(**{owner: profile_id}).select_related(
+            f'{listed}__user__stats'
+        )
+        paginator = FollowPagination()
+        profiles = [getattr(row, listed) for row in paginator.paginate_queryset(follows, request, view=self)]
+        serializer = ProfileCardSerializer(profiles, many=True, context={
+            'request': request, 'followed': ProfileCardSerializer.followed_ids(request.user, profiles),
+        })
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated], url_path='suggestions')
+    def people_you_may_know(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), suggestions.MAX_LIMIT)
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=400)
+        if limit <= 0:
+            return Response({"error": "limit must be positive"}, status=400)
+        ranked = suggestions.suggestions_for(request.user, limit)
+        profiles = UserProfile.objects.filter(user_id__in=[row['user_id'] for row in ranked]).select_related('user__stats')
+        by_user = {profile.user_id: profile for profile in profiles}
+        ranked = [row for row in ranked if row['user_id'] in by_user]
+        cards = ProfileCardSerializer([by_user[row['user_id']] for row in ranked], many=True, context={'request': request}).data
+        return Response([
+            {**card, 'score': row['score'], 'reasons': {
+                'mutual_follows': row['mutual_follows'],
+                'shared_companies': row['shared_companies'],
+                'shared_threads': row['shared_threads'],
+            }}
+            for card, row in zip(cards, ranked)
+        ])
+
+    @action(detail=False, methods=['get'])
+    def leaderboard(self, request):
+        """
+        A page of ``?metric=exp|solves`` ranks over ``?window=all|week``,
+        among applicants to ``?company=`` if given, plus the viewer's own
+        rank as ``me``.
+        """
+        metric = request.query_params.get('metric', 'exp')
+        window = request.query_params.get('window', 'all')
+        if metric not in leaderboards.METRICS:
+            return Response({"error": f"metric must be one of {', '.join(leaderboards.METRICS)}"}, status=400)
+        if window not in leaderboards.WINDOWS:
+            return Response({"error": f"window must be one of {', '.join(leaderboards.WINDOWS)}"}, status=400)
+        board = leaderboards.board(metric, window, normalize_label(request.query_params.get('company', '')) or None)
+
+        paginator = LeaderboardPagination()
+        entries = paginator.paginate_queryset(board, request, view=self)
+        profiles = UserProfile.objects.filter(user_id__in=[user_id for _, user_id, _ in entries]).select_related('user__stats')
+        by_user = {profile.user_id: profile for profile in profiles}
+        entries = [entry for entry in entries if entry[1] in by_user]
+        cards = ProfileCardSerializer([by_user[user_id] for _, user_id, _ in entries], many=True, context={
+            'request': request, 'followed': ProfileCardSerializer.followed_ids(request.user, list(by_user.values())),
+        }).data
+        response = paginator.get_paginated_response([
+            {**card, 'rank': rank, 'score': score} for card, (rank, _, score) in zip(cards, entries)
+        ])
+        if request.user.is_authenticated:
+            rank, score = board.rank(request.user.pk)
+            response.data['me'] = {'rank': rank, 'score': score}
+        return response
+
+    @action(detail=True, methods=['get'])
+    def followers(self, request, pk=None):
+        return self.follow_list(request, pk, 'from_userprofile', 'to_userprofile')
 
     @action(detail=True, methods=['get'])
     def following(self, request, pk=None):
-        try:
-            user = User.objects.get(pk=pk)
-            following = user.profile.following.all()
-            serializer = UserProfileSerializer(following, many=True, context={"request": request})
-            return Response(serializer.data)
-        except User.DoesNotExist:
-            return Response({"error": "User not found"}, status=404)
+        return self.follow_list(request, pk, 'to_userprofile', 'from_userprofile')
         
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated], parser_classes=[MultiPartParser])
     def upload_avatar(self, request):
-        user_profile = request.user.profile
+        # Checked while it streams in (see initialize_request) rather than
+        # after it is all on disk; the thumbnails are made after the response.
+        handler = self.avatar_upload
         avatar_file = request.FILES.get('avatar')
 
+        if handler.error:
+            return Response({"error": handler.error}, status=400)
         if not avatar_file:
             return Response({"error": "No file uploaded"}, status=400)
 
-        user_profile.avatar.save(avatar_file.name, avatar_file)
-        user_profile.save()
-        return Response({"message": "Avatar uploaded successfully", "avatar_url": user_profile.avatar.url})
+        user_profile = request.user.profile
+        avatars.store(user_profile, avatar_file)
+        return Response(
+            {
+                "message": "Avatar uploaded successfully",
+                "avatar_url": user_profile.avatar.url,
+                "avatar_urls": avatars.urls(user_profile, request),
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def user_timeline(self, request):
@@ -130,30 +257,7 @@ class UserProfileViewSet(viewsets.ViewSet):
          except User.DoesNotExist:
              return Response({"error": "User not found"}, status=404)
  
-         queryset = Post.objects.filter(
-             user=user,
-             post_type='interview',
-             company=company,
-             position=position
-         )
- 
-         if user != request.user:
-             queryset = queryset.filter(visibility='public')
- 
-         queryset = queryset.order_by('interview_date', 'created_at')
- 
-         data = [
-             {
-                 'id': post.id,
-                 'title': post.title,
-                 'interview_date': post.interview_date,
-                 'round_number': getattr(getattr(post, 'interview_details', None), 'round_number', None),
-                 'round_type': getattr(getattr(post, 'interview_details', None), 'round_type', None),
-                 'status': getattr(getattr(post, 'interview_details', None), 'status', 'pending'),
-             }
-             for post in queryset
-         ]
- 
+         data = timeline.for_labels(user, company, position, request.user)
          return Response(data)
 
 
@@ -161,10 +265,11 @@ class UserProfileViewSet(viewsets.ViewSet):
 
 class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.filter(visibility='public')
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['company', 'post_type']
     search_fields = ['title', 'content', 'company']
     ordering_fields = ['created_at', 'title', 'likes_count', 'comments_count']
+    pagination_class = PostPagination
 
     ordering = ['-created_at']
 
@@ -197,12 +302,9 @@ class PostViewSet(viewsets.ModelViewSet):
         if user_id:
             queryset = queryset.filter(user__id=user_id)
 
-        queryset = queryset.annotate(
-            likes_count=Count('likes'),
-            comments_count=Count('comments')
-        )
-
-        return queryset
+        if self.action == 'list':
+            queryset = PostListSerializer.defer_unused(queryset, self.request)
+        return queryset.for_feed(user)
 
 
 
@@ -212,7 +314,7 @@ class PostViewSet(viewsets.ModelViewSet):
         user_profile = post.user.profile
         user_profile.posts_count += 1
         user_profile.activity_count += 1  # Add this line
-        user_profile.exp += 10
+        user_profile.exp += EXP_PER_POST
         user_profile.save()
         return post
 
@@ -227,24 +329,55 @@ class PostViewSet(viewsets.ModelViewSet):
         return Response(output_serializer.data, status=status.HTTP_201_CREATED)
 
 
-    def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
+    def list(self, request, *args, **kwargs):
+        return response_cache.cached_response(
+            request, 'list', ['feed', 'profiles'], lambda: super(PostViewSet, self).list(request, *args, **kwargs)
+        )
 
-        # Increase post views
-        instance.views = getattr(instance, 'views', 0) + 1
-        instance.save()
+    def retrieve(self, request, *args, **kwargs):
+        pk = str(kwargs.get('pk', ''))
+        validators = pk.isdigit() and conditional.post_validators(self.get_queryset(), pk, request)
+        if not validators:
+            return self.detail_response(request, pk)
+
+        # Unchanged posts answer 304 before any serialization (and aren't counted as views).
+        etag, last_modified, author_id = validators
+        return conditional.conditional(
+            request, etag, last_modified, lambda: self.detail_response(request, pk, author_id)
+        )
 
-        # Update user's total post views
-        user_profile = instance.user.profile
-        user_profile.total_post_views = Post.objects.filter(user=instance.user).aggregate(
-            total=models.Sum('views')
-        )['total'] or 0
-        user_profile.save()
+    def detail_response(self, request, pk, author_id=None):
+        def build():
+            instance = self.get_object()
+            # Buffered; the post, author's total_post_views and trending score
+            # are updated in batches by view_counter.flush()
+            view_counter.record_view(instance.pk, unique_views.viewer_key(request))
+            serializer = PostDetailSerializer(instance, context = {'request': request})
+            return Response(serializer.data)
 
-        serializer = PostDetailSerializer(instance, context = {'request': request})
-        return Response(serializer.data)
+        if not response_cache.is_cacheable(request) or not pk.isdigit():
+            return build()
 
+        if author_id is None:
+            # One indexed lookup for the author, whose generation covers the timeline.
+            author_id = Post.objects.filter(pk=pk, visibility='public').values_list('user_id', flat=True).first()
+        if author_id is None:
+            return build()
+        response = response_cache.cached_response(
+            request, 'detail', [f'post:{pk}', f'author:{author_id}', 'profiles'], build
+        )
+        if not isinstance(response, Response):
+            # Served from the cache, so build() did not count the view.
+            view_counter.record_view(int(pk), unique_views.viewer_key(request))
+        return response
 
+    @action(detail=True, methods=['get'])
+    def unique_viewers(self, request, pk=None):
+        post = self.get_object()
+        period = request.query_params.get('period', 'all')
+        if period != 'all' and period not in unique_views.PERIOD_DAYS:
+            return Response({"error": "period must be one of day, week, month, all"}, status=400)
+        return Response({'period': period, 'unique_viewers': unique_views.post_unique_viewers(post.pk, period)})
 
     @action(detail=True, methods=['post'])
     def add_comment(self, request, pk=None):
@@ -266,27 +399,86 @@ class PostViewSet(viewsets.ModelViewSet):
             return Response({"error": "Authentication required."}, status=status.HTTP_401_UNAUTHORIZED)
 
 
-        comment = Comment.objects.create(
-            post=post,
-            user=user,
-            parent_comment=parent_comment,
-            content=request.data.get('content', '')
-        )
+        with transaction.atomic():
+            comment = Comment.objects.create(
+                post=post,
+                user=user,
+                parent_comment=parent_comment,
+                thread_root_id=parent_comment and (parent_comment.thread_root_id or parent_comment.pk),
+                content=request.data.get('content', '')
+            )
+            Post.objects.filter(pk=post.pk).update(comments_count=F('comments_count') + 1, updated_at=timezone.now())
 
         serializer = CommentSerializer(comment)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=True, methods=['get'])
+    def comments(self, request, pk=None):
+        post = self.get_object()
+
+        def build():
+            paginator = CommentPagination()
+            page = paginator.paginate_queryset(comment_tree.top_level(post), request, view=self)
+            page = comment_tree.build_threads(page)
+            serializer = CommentSerializer(page, many=True, context={'request': request})
+            return paginator.get_paginated_response(serializer.data)
+
+        etag, last_modified = conditional.comments_validators(post, request.query_params)
+        return conditional.conditional(request, etag, last_modified, build)
+
+    @action(detail=True, methods=['get'], url_path=r'comments/(?P<comment_id>[0-9]+)/replies')
+    def comment_replies(self, request, pk=None, comment_id=None):
+        # "Load more" for a comment whose replies were cut off at the preview
+        post = self.get_object()
+        comment = get_object_or_404(Comment, pk=comment_id, post=post)
+
+        def build():
+            paginator = CommentPagination()
+            page = paginator.paginate_queryset(comment_tree.direct_replies(comment), request, view=self)
+            page = comment_tree.build_subtrees(page, comment.thread_root_id or comment.pk)
+            serializer = CommentSerializer(page, many=True, context={'request': request})
+            return paginator.get_paginated_response(serializer.data)
+
+        etag, last_modified = conditional.comments_validators(post, request.query_params, comment.pk)
+        return conditional.conditional(request, etag, last_modified, build)
+
     @action(detail=False, methods=['get'])
     def trending(self, request):
-        # Only include public posts from the last 7 days
-        last_week = timezone.now() - timedelta(days=30)
-        queryset = Post.objects.filter(visibility='public', created_at__gte=last_week)
+        def build():
+            # Public posts from the trending window, hottest decayed score first
+            queryset = Post.objects.filter(visibility='public').for_feed(request.user)
+            queryset = trending.top_posts(PostListSerializer.defer_unused(queryset, request))
+            serializer = PostListSerializer(queryset, many=True, context={'request': request})
+            return Response(serializer.data)
 
-        # Annotate with likes_count and order by it
-        queryset = queryset.annotate(likes_count=Count('likes')).order_by('-likes_count')[:8]
+        return response_cache.cached_response(request, 'trending', ['feed', 'trending', 'profiles'], build)
 
-        serializer = PostListSerializer(queryset, many=True)
-        return Response(serializer.data)
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        # Post counts behind each dashboard filter option, from the rollup table
+        return response_cache.cached_response(
+            request, 'facets', ['facets'], lambda: Response(facets.facet_counts()), shared=True
+        )
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        # Users, posts, comments and likes as NDJSON, streamed in constant memory (see bulk_io.py)
+        response = StreamingHttpResponse(bulk_io.export_lines(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="posts.ndjson"'
+        return response
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser], url_path='import')
+    def import_ndjson(self, request):
+        # The body is read line by line, never parsed as a whole.
+        try:
+            counts = bulk_io.import_lines(request._request)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(counts, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        return Response(response_cache.stats())
 
     @action(detail=True, methods=['post'])
     def like(self, request, pk=None):
@@ -301,19 +493,42 @@ class PostViewSet(viewsets.ModelViewSet):
             user.set_password('temp_password')
             user.save()
 
-        like, created = Like.objects.get_or_create(user=user, post=post)
+        with transaction.atomic():
+            like, created = Like.objects.get_or_create(user=user, post=post)
 
-        if not created:
-            like.delete()
-            liked = False
-        else:
-            liked = True
+            if not created:
+                like.delete()
+                liked = False
+                # Guard the decrement so a drifted counter never goes negative.
+                Post.objects.filter(pk=post.pk, likes_count__gt=0).update(
+                    likes_count=F('likes_count') - 1, updated_at=timezone.now()
+                )
+                UserProfile.objects.filter(user_id=post.user_id, total_likes__gt=0).update(
+                    total_likes=F('total_likes') - 1
+                )
+            else:
+                liked = True
+                Post.objects.filter(pk=post.pk).update(likes_count=F('likes_count') + 1, updated_at=timezone.now())
+                UserProfile.objects.filter(user_id=post.user_id).update(total_likes=F('total_likes') + 1)
+
+        post.refresh_from_db(fields=['likes_count'])
+        return Response({'liked': liked, 'likes_count': post.likes_count})
 
-        post_author_profile = post.user.profile
-        post_author_profile.total_likes = post.likes.count()
-        post_author_profile.save()
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def following_feed(self, request):
+        paginator = FeedPagination()
+        entries = paginator.paginate_rows(
+            lambda position, limit: feed.read_feed(request.user, paginator, position, limit), request
+        )
+        post_ids = [entry.post_id for entry in entries]
+        posts = PostListSerializer.defer_unused(Post.objects.filter(pk__in=post_ids), request)
+        posts = posts.for_feed(request.user).in_bulk()
 
-        return Response({'liked': liked, 'likes_count': post.likes.count()})
+        serializer = PostListSerializer(
+            [posts[post_id] for post_id in post_ids if post_id in posts],
+            many=True, context={'request': request},
+        )
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def my_posts(self, request):
@@ -333,10 +548,7 @@ class PostViewSet(viewsets.ModelViewSet):
         if position:
             queryset = queryset.filter(position=position)
 
-        queryset = queryset.annotate(
-            likes_count=Count('likes'),
-            comments_count=Count('comments')
-        )
+        queryset = PostListSerializer.defer_unused(queryset, request).for_feed(request.user)
 
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -354,26 +566,7 @@ class PostViewSet(viewsets.ModelViewSet):
          if not company or not position:
              return Response({"error": "company and position are required"}, status=400)
  
-         user = request.user
-         posts = Post.objects.filter(
-             user=user,
-             post_type='interview',
-             company=company,
-             position=position
-         ).order_by('interview_date', 'created_at')
- 
-         data = [
-             {
-                 'id': post.id,
-                 'title': post.title,
-                 'interview_date': post.interview_date,
-                 'round_number': getattr(getattr(post, 'interview_details', None), 'round_number', None),
-                 'round_type': getattr(getattr(post, 'interview_details', None), 'round_type', None),
-                 'status': getattr(getattr(post, 'interview_details', None), 'status', 'pending'),
-             }
-             for post in posts
-         ]
- 
+         data = timeline.for_labels(request.user, company, position, request.user)
          return Response(data)
 
 
@@ -422,7 +615,7 @@ def get_csrf_token(request):
 class ProblemViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Problem.objects.all()
     serializer_class = ProblemSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [filters.OrderingFilter, FullTextSearchFilter]
     search_fields = ['title', 'description']
     ordering_fields = ['id', 'title']
     ordering = ['id']
@@ -430,6 +623,8 @@ class ProblemViewSet(viewsets.ReadOnlyModelViewSet):
 
 @csrf_exempt
 def code_verification(request):
+    # Queued and run in the background (see submissions.py); clients poll
+    # or stream the job's status_url for the result.
     if request.method != "POST":
         return JsonResponse({'error': 'Only POST method allowed'}, status=405)
 
@@ -442,75 +637,34 @@ def code_verification(request):
             return JsonResponse({'error': 'Missing code or question_id'}, status=400)
 
         problem = Problem.objects.get(id=problem_id)
-        test_cases = TestCase.objects.filter(problem=problem)
-
-        test_data = {
-            "code": code,
-            "function_name": problem.function_name,
-            "test_cases": [
-                {"input": tc.input_data, "expected": tc.expected_output}
-                for tc in test_cases
-            ]
-        }
-
-        temp_dir = f"/tmp/code_runner_{uuid.uuid4()}"
-        os.makedirs(temp_dir, exist_ok=True)
-
-        input_path = os.path.join(temp_dir, "input.json")
-        output_path = os.path.join(temp_dir, "output.json")
-
-        with open(input_path, "w") as f:
-            json.dump(test_data, f)
-
-        subprocess.run([
-            "docker", "run", "--rm",
-            "--network", "none", "--memory", "128m", "--cpus", "0.5",
-            "--pids-limit", "64", "--read-only",
-            "-v", f"{temp_dir}:/app/data",
-            "--security-opt", "no-new-privileges", "--user", "1000:1000",
-            "code-sandbox"
-        ], timeout=10)
-
-        with open(output_path, "r") as f:
-            result_data = json.load(f)
-
-
-        subprocess.run(["rm", "-rf", temp_dir])
-
-        if "results" in result_data:
-            passed_all = all(res["status"] == "pass" for res in result_data["results"])
-
-
-            if request.user and request.user.is_authenticated:
-                ProblemSolveLog.objects.update_or_create(
-                    user=request.user,
-                    problem=problem,
-                    defaults={"passed": passed_all}
-                )
-
-            output_lines = []
-            for i, res in enumerate(result_data["results"], 1):
-                if res["status"] == "pass":
-                    output_lines.append(f"Test case {i}: Passed")
-                elif res["status"] == "fail":
-                    output_lines.append(f"Test case {i}: Failed\n  Input: {res['input']}\n  Expected: {res['expected']}\n  Got: {res['got']}")
-                elif res["status"] == "error":
-                    output_lines.append(f"Test case {i}: Error\n  Message: {res['message']}")
-
-            return JsonResponse({"output": "\n\n".join(output_lines)})
-
-        elif "error" in result_data:
-            return JsonResponse({"output": f"Execution error: {result_data['error']}"})
+        user = request.user if request.user.is_authenticated else None
+        submission = submissions.submit(submissions.owner_of(request), user, problem, code)
+        return JsonResponse(submissions.payload(submission), status=202)
 
     except Problem.DoesNotExist:
         return JsonResponse({'error': 'Problem not found'}, status=404)
-    except subprocess.TimeoutExpired:
-        return JsonResponse({'error': 'Code execution timed out'}, status=408)
+    except submissions.QueueFull as e:
+        response = JsonResponse({'error': str(e)}, status=429)
+        response['Retry-After'] = str(e.retry_after)
+        return response
     except Exception as e:
         error_message = f"{str(e)}\n\n{traceback.format_exc()}"
         return JsonResponse({'error': error_message}, status=500)
 
 
+def submission_status(request, submission_id):
+    submission = get_object_or_404(Submission, pk=submission_id, owner=submissions.owner_of(request))
+    return JsonResponse(submissions.payload(submission))
+
+
+def submission_events(request, submission_id):
+    get_object_or_404(Submission, pk=submission_id, owner=submissions.owner_of(request))
+    response = StreamingHttpResponse(submissions.events(submission_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # Check if conversation exists for the given question_id
 def initialize_conversation(question_id):
     if question_id not in CONVERSATION_STORE:
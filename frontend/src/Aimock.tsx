@@ -75,8 +75,23 @@ function Aimock() {
         }),
       });
 
-      const data = await response.json();
-      setOutput(data.output || "No output received.");
+      let data = await response.json();
+      if (response.status === 429) {
+        const retryAfter = response.headers.get("Retry-After");
+        setOutput(`${data.error || "Too many submissions."} Try again in ${retryAfter || "a few"} seconds.`);
+        return;
+      }
+      // Submissions are queued; poll the job until it has run.
+      if (response.status === 202) {
+        setOutput(`Queued (position ${data.position ?? 1})...`);
+        while (data.status === "queued" || data.status === "running") {
+          await new Promise((resolve) => setTimeout(resolve, 500));
+          const poll = await fetch(`${backendUrl}${data.status_url}`, { credentials: 'include' });
+          data = await poll.json();
+          if (data.status === "running") setOutput("Running...");
+        }
+      }
+      setOutput(data.output || data.error || "No output received.");
     } catch (error) {
       console.error("Error submitting code:", error);
       setOutput("Error occurred while submitting code.");
@@ -43,6 +43,7 @@ export default function UserProfile() {
   const [isDialogOpen, setIsDialogOpen] = useState(false);
   const [dialogType, setDialogType] = useState<"followers" | "following" | null>(null);
   const [followList, setFollowList] = useState<any[]>([]);
+  const [followListNext, setFollowListNext] = useState<string | null>(null);
   const [currentUser, setCurrentUser] = useState<any>(null);
   const [isFollowing, setIsFollowing] = useState<boolean>(false);
 
@@ -81,12 +82,13 @@ export default function UserProfile() {
         credentials: 'include',
       });
 
-      if (!res.ok) throw new Error("Upload failed");
       const data = await res.json();
+      if (!res.ok) throw new Error(data.error || "Upload failed");
+      // Thumbnails are made in the background; the original shows until then.
       toast("Upload success");
       setIsDialogOpen(false);
     } catch (err) {
-      toast("Upload failed");
+      toast(err instanceof Error ? err.message : "Upload failed");
       console.error(err);
     }
   };
@@ -135,27 +137,36 @@ export default function UserProfile() {
   }, []);
 
   useEffect(() => {
-    if (!currentUser || !id) return;
-  
-    const fetchFollowStatus = async () => {
+    setIsFollowing(Boolean(userInfo?.is_following));
+  }, [userInfo?.is_following]);
+
+  // Heatmap days are bucketed in the profile's timezone; keep it in step with the browser's.
+  useEffect(() => {
+    const browserTimezone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+    if (!isSelf || !userInfo?.timezone || !browserTimezone || userInfo.timezone === browserTimezone) return;
+
+    const updateTimezone = async () => {
       const token = sessionStorage.getItem("token");
       if (!token) return;
-  
-      const res = await fetch(`${backendUrl}/users/${id}/followers/`, {
+      const res = await fetch(`${backendUrl}/users/me/timezone/`, {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          Authorization: `Token ${token}`,
+          'X-CSRFToken': getCookie('csrftoken') || '',
+        },
+        credentials: 'include',
+        body: JSON.stringify({ timezone: browserTimezone }),
+      });
+      if (!res.ok) return;
+      const profile = await fetch(`${backendUrl}/users/me/`, {
         headers: { Authorization: `Token ${token}` },
       });
-  
-      const followers: { user: { id: number } }[] = await res.json();
-      const currentUserId = currentUser.id;
-
-      setIsFollowing(followers.some((f) => f.user.id === currentUserId));
-
+      setUserInfo(await profile.json());
     };
-  
-    if (!isSelf) {
-      fetchFollowStatus();
-    }
-  }, [id, currentUser, isSelf]);
+
+    updateTimezone();
+  }, [isSelf, userInfo?.timezone]);
   
 
   useEffect(() => {
@@ -236,16 +247,18 @@ export default function UserProfile() {
     return data
   }, [searchTerm, groupedRecords, filterBy])
 
-  const fetchFollowList = async (type: "followers" | "following") => {
+  // Pages of { id, username, avatar, exp, followers_count, is_following } cards.
+  const fetchFollowList = async (type: "followers" | "following", url?: string) => {
     if (!userInfo?.user?.id) return;
     const token = sessionStorage.getItem("token");
-    const res = await fetch(`${backendUrl}/users/${userInfo.user.id}/${type}/`, {
+    const res = await fetch(url ?? `${backendUrl}/users/${userInfo.user.id}/${type}/`, {
       headers: {
         Authorization: `Token ${token}`,
       },
     });
     const data = await res.json();
-    setFollowList(data);
+    setFollowList(prev => url ? [...prev, ...data.results] : data.results);
+    setFollowListNext(data.next);
     setDialogType(type);
   };
   
@@ -581,6 +594,11 @@ export default function UserProfile() {
             <Card>
               <CardContent className="h-52 overflow-x-auto whitespace-nowrap flex flex-col items-center justify-center">
                 <h2 className="text-lg font-semibold mb-2">Commit Record</h2>
+                {userInfo?.streaks && (
+                  <p className="text-sm text-gray-400 mb-2">
+                    Current streak: {userInfo.streaks.current} days · Longest: {userInfo.streaks.longest} days
+                  </p>
+                )}
                 <div className="w-full overflow-x-auto">
                   <CalendarHeatmap
                     startDate={subDays(new Date(), 100)}
@@ -671,23 +689,29 @@ export default function UserProfile() {
 
           <div className="space-y-4 max-h-[300px] overflow-y-auto">
             {followList.map(user => (
-              <div key={user.user.id} className="flex items-center gap-3">
+              <div key={user.id} className="flex items-center gap-3">
                 <Avatar className="w-8 h-8">
-                  <AvatarImage src={user.avatar || "/default-avatar.png"} alt={user.user.username} />
-                  <AvatarFallback>{user.user.username?.[0]?.toUpperCase()}</AvatarFallback>
+                  <AvatarImage src={user.avatar || "/default-avatar.png"} alt={user.username} />
+                  <AvatarFallback>{user.username?.[0]?.toUpperCase()}</AvatarFallback>
                 </Avatar>
                 <Button
                   variant="link"
                   className="text-sm px-0"
                   onClick={() => {
                     setDialogType(null);
-                    window.location.href = `/users/${user.user.id}`;
+                    window.location.href = `/users/${user.id}`;
                   }}
                 >
-                  {user.user.username}
+                  {user.username}
                 </Button>
+                {user.is_following && <span className="text-xs text-gray-400">Following</span>}
               </div>
             ))}
+            {followListNext && dialogType && (
+              <Button variant="ghost" size="sm" onClick={() => fetchFollowList(dialogType, followListNext)}>
+                Load more
+              </Button>
+            )}
           </div>
         </DialogContent>
       </Dialog>
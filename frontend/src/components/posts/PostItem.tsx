@@ -64,9 +64,7 @@ const PostItem: React.FC<PostItemProps> = ({ post, onLike }) => {
       <CardContent className="p-4 pt-2">
         <h2 className="text-xl font-semibold mb-2">{post.title}</h2>
         <p className="text-sm text-muted-foreground">
-          {post.content.length > 200
-            ? `${post.content.substring(0, 200)}...`
-            : post.content}
+          {post.excerpt ?? post.content}
         </p>
       </CardContent>
 
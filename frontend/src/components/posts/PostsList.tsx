@@ -58,7 +58,7 @@ const StyledPostItem: React.FC<{
           </div>
         </CardHeader>
         <CardContent className="pb-2">
-          <p className="line-clamp-2 text-sm text-muted-foreground">{post.content}</p>
+          <p className="line-clamp-2 text-sm text-muted-foreground">{post.excerpt ?? post.content}</p>
         </CardContent>
       </div>
       <CardFooter className="pt-0 flex items-center justify-between">
@@ -204,7 +204,7 @@ const PostsList: React.FC = () => {
     }
     if (filters.searchQuery) {
       const query = filters.searchQuery.toLowerCase();
-      result = result.filter(post => post.title.toLowerCase().includes(query) || post.content.toLowerCase().includes(query));
+      result = result.filter(post => post.title.toLowerCase().includes(query) || (post.excerpt ?? post.content).toLowerCase().includes(query));
     }
     setFilteredPosts(result);
   };
@@ -35,7 +35,9 @@ export interface User {
   username: string;
   user_avatar?: string;
   title: string;
+  // List endpoints send the excerpt and leave content out unless asked for.
   content: string;
+  excerpt?: string;
   company?: string;
   position?: string;
   post_type: 'general' | 'interview';